@@ -0,0 +1,79 @@
+"""
+Compares rendering a /project/list page through the pydantic response model
+and the default json encoder with the column serializer and orjson.
+
+    python benchmarks/project_list.py --rows 1000 10000 --runs 5
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timezone
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from deployment_server.models import Project, SecretsProvider
+from deployment_server.packages.utils import converters, serializers
+
+
+ProjectModel = converters.sqlalchemy_to_pydantic(Project, "ProjectModel")
+project_serializer = serializers.Serializer(Project)
+
+
+def make_projects(rows: int) -> list[Project]:
+    created_at = datetime.now(timezone.utc)
+    return [
+        Project(
+            rid=f"{i:016d}",
+            name=f"project {i}",
+            code=f"project-{i}",
+            git_url=f"git://github.com/some/project-{i}.git",
+            pip_package_name=f"project-{i}",
+            pip_index_url="https://pypi.example.com/",
+            secrets_provider=SecretsProvider.LOCAL,
+            created_at=created_at,
+        )
+        for i in range(rows)
+    ]
+
+
+def render_model(projects: list[Project]) -> bytes:
+    # what fastapi does with a response_model
+    items = [ProjectModel.model_validate(p) for p in projects]
+    return JSONResponse(jsonable_encoder(items)).body
+
+
+def render_serializer(projects: list[Project]) -> bytes:
+    return serializers.FastJSONResponse(project_serializer.dump_many(projects)).body
+
+
+def measure(fn, projects: list[Project], runs: int) -> list[float]:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(projects)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(name: str, durations: list[float]):
+    print(
+        f"{name:<20} median {statistics.median(durations) * 1000:9.2f}ms "
+        f"min {min(durations) * 1000:9.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        projects = make_projects(rows)
+        print(f"{rows} rows")
+        report("model + json", measure(render_model, projects, args.runs))
+        report("serializer + orjson", measure(render_serializer, projects, args.runs))
+
+
+if __name__ == "__main__":
+    main()
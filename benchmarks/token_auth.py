@@ -0,0 +1,62 @@
+"""
+Measures the auth overhead per request of a project token, verified with the
+slow hash every time versus served from the cache of verified tokens. The
+repository is kept in memory so only the verification itself is measured.
+
+    python benchmarks/token_auth.py --requests 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from deployment_server.models import ProjectToken
+from deployment_server.packages.utils import tokens
+from deployment_server.services.token import TokenService
+
+
+class MemoryTokenRepository:
+    def __init__(self):
+        self.records: dict[str, ProjectToken] = {}
+
+    async def get_active(self, rid: str) -> ProjectToken | None:
+        return self.records.get(rid)
+
+    async def add(self, token: ProjectToken) -> ProjectToken:
+        self.records[token.rid] = token
+        return token
+
+
+async def measure(service: TokenService, token: str, requests: int) -> list[float]:
+    durations = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        assert await service.verify(token) == "project"
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(name: str, durations: list[float]):
+    print(
+        f"{name:<12} median {statistics.median(durations) * 1000:9.3f}ms "
+        f"p99 {sorted(durations)[int(len(durations) * 0.99) - 1] * 1000:9.3f}ms "
+        f"total {sum(durations):8.3f}s"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    repo = MemoryTokenRepository()
+    uncached = TokenService(token_repo=repo, token_cache=tokens.TokenCache(max_size=0))
+    cached = TokenService(token_repo=repo, token_cache=tokens.TokenCache())
+    _, token = await cached.create(project_rid="project", name="benchmark")
+
+    report("no cache", await measure(uncached, token, args.requests))
+    report("cache", await measure(cached, token, args.requests))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+Compares creating an application venv from scratch with cloning it from a
+template venv.
+
+    python benchmarks/venv_template.py --runs 5
+"""
+
+import argparse
+import logging
+import statistics
+import tempfile
+import time
+import venv
+from pathlib import Path
+from deployment_server.packages.deployer.venv_template import VenvTemplate
+
+
+def measure(fn, runs: int) -> list[float]:
+    durations = []
+    for i in range(runs):
+        start = time.perf_counter()
+        fn(i)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(name: str, durations: list[float]):
+    print(
+        f"{name:<12} median {statistics.median(durations):8.3f}s "
+        f"min {min(durations):8.3f}s max {max(durations):8.3f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--no-upgrade-deps",
+        action="store_true",
+        help="skip upgrading pip over the network, for offline machines",
+    )
+    args = parser.parse_args()
+    upgrade_deps = not args.no_upgrade_deps
+
+    with tempfile.TemporaryDirectory() as root:
+        root_dir = Path(root)
+
+        def create(i: int):
+            venv.create(
+                root_dir / f"cold-{i}", with_pip=True, upgrade_deps=upgrade_deps
+            )
+
+        venv_template = VenvTemplate(root_dir / "templates", logging.getLogger())
+        venv_template.upgrade_deps = upgrade_deps
+        venv_template.build()
+
+        def clone(i: int):
+            venv_template.clone(root_dir / f"clone-{i}")
+
+        report("venv.create", measure(create, args.runs))
+        report("clone", measure(clone, args.runs))
+
+
+if __name__ == "__main__":
+    main()
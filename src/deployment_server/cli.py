@@ -5,6 +5,7 @@ import logging
 from deployment_server.modules import acme, nginx
 from deployment_server.packages.utils import validators
 from deployment_server.modules import env
+from deployment_server.packages.deployer.base import Deployer
 
 
 def init_logging(name: str, debug: bool = False):
@@ -180,9 +181,23 @@ def remove_ssl_certs(
     "-u",
     "--upstream-server",
     multiple=True,
-    required=True,
+    required=False,
     help="The upstream server(s).",
 )
+@click.option(
+    "--upstream-port",
+    type=int,
+    required=False,
+    help="The port of the first instance of a daemon, instead of --upstream-server.",
+)
+@click.option(
+    "--upstream-instances",
+    type=int,
+    required=False,
+    default=1,
+    show_default=True,
+    help="The number of instances of the daemon on consecutive ports.",
+)
 @click.option(
     "--ssl-cert-fullchain-file",
     required=False,
@@ -208,11 +223,15 @@ def setup_proxy_host(
     server_name: tuple[str, ...],
     upstream_name: str,
     upstream_server: tuple[str, ...],
+    upstream_port: int | None,
+    upstream_instances: int,
     ssl_cert_fullchain_file: str,
     ssl_cert_key_file: str,
     nginx_conf_dir: str,
 ):
     click.echo("setting up proxy host...")
+    if len(upstream_server) == 0 and upstream_port is not None:
+        upstream_server = nginx.get_upstream_servers(upstream_port, upstream_instances)
     success, message = nginx.setup_proxy_host(
         server_names=server_name,
         upstream_name=upstream_name,
@@ -292,7 +311,28 @@ def setup_static_host(
     click.echo("setting up static host... done.")
 
 
+@click.command()
+@click.argument("project_code", required=True)
+@click.option("--mode", required=True, help="The mode of the application.")
+def rollback(project_code: str, mode: str):
+    """
+    Switch an application back to its previous release and restart its services.
+
+    PROJECT_CODE is the code of the project to roll back.
+    """
+    click.echo("rolling back...")
+    deployer = Deployer(logger=init_logging("rolling back..."))
+    with deployer.lock(project_code, mode):
+        success, message = deployer.rollback(project_code, mode)
+    if not success:
+        click.UsageError(message).show()
+        click.echo("rolling back... failed.")
+        sys.exit(1)
+    click.echo("rolling back... done.")
+
+
 main.add_command(setup_ssl_certs)
 main.add_command(remove_ssl_certs)
 main.add_command(setup_proxy_host)
 main.add_command(setup_static_host)
+main.add_command(rollback)
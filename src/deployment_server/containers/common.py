@@ -1,12 +1,20 @@
 import os
 import logging
-from typing import AsyncGenerator, Generator
+from typing import AsyncGenerator
 from pathlib import Path
-from contextlib import asynccontextmanager, contextmanager
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from contextlib import asynccontextmanager
+from celery import Celery
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+)
 from deployment_server.modules.env import is_dev
+from deployment_server.modules.events import EventHub
+from deployment_server.modules.loop import EventLoopThread
+from deployment_server.modules import pooling
 
 
 def init_logging(name: str, debug: bool = False):
@@ -26,8 +34,24 @@ def init_logging(name: str, debug: bool = False):
     # cleanup
 
 
-async def create_session_factory(conn_str: str):
-    engine = create_async_engine(conn_str)
+def create_engine_with_options(conn_str: str, options: dict = None) -> AsyncEngine:
+    options = options or {}
+    return create_async_engine(
+        # asyncpg is the only driver, older worker configs may name psycopg2
+        make_url(conn_str).set(drivername="postgresql+asyncpg"),
+        poolclass=pooling.InstrumentedAsyncQueuePool,
+        connect_args={
+            # 0 turns prepared statements off, for pgbouncer in transaction mode
+            "prepared_statement_cache_size": pooling.get_option(
+                options, "db_statement_cache_size", 100
+            ),
+            "server_settings": pooling.get_server_settings(options),
+        },
+        **pooling.get_pool_options(options),
+    )
+
+
+def create_session_getter(engine: AsyncEngine):
     AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
     @asynccontextmanager
@@ -38,26 +62,57 @@ async def create_session_factory(conn_str: str):
         finally:
             await session.close()
 
-    yield get_session
+    get_session.pool_status = lambda: pooling.get_pool_status(engine.pool)
+    return get_session
+
+
+async def create_session_factory(conn_str: str, options: dict = None):
+    engine = create_engine_with_options(conn_str, options)
+
+    yield create_session_getter(engine)
 
     await engine.dispose()
 
 
-def create_session_factory_sync(conn_str: str):
-    engine = create_engine(conn_str)
-    SessionLocal = sessionmaker(engine, expire_on_commit=False)
+def create_event_loop():
+    event_loop = EventLoopThread()
 
-    @contextmanager
-    def get_session() -> Generator[Session, None, None]:
-        session = SessionLocal()
-        try:
-            yield session
-        finally:
-            session.close()
+    yield event_loop
+
+    event_loop.stop()
+
+
+def create_session_factory_on_loop(
+    conn_str: str, event_loop: EventLoopThread, options: dict = None
+):
+    """
+    The same async sessions for sync callers, which run their queries on
+    event_loop where the pooled connections live.
+    """
+    engine = create_engine_with_options(conn_str, options)
+    # forked worker processes must not reuse connections of the parent
+    os.register_at_fork(after_in_child=lambda: engine.sync_engine.dispose(close=False))
+
+    yield create_session_getter(engine)
+
+    if event_loop.loop is not None:
+        event_loop.run(engine.dispose())
+
+
+async def create_event_hub(conn_str: str, channel: str, logger: logging.Logger):
+    event_hub = EventHub(conn_str=conn_str, channel=channel, logger=logger)
+
+    yield event_hub
+
+    await event_hub.close()
+
+
+def create_task_queue(broker: str):
+    task_queue = Celery("tasks", broker=broker)
 
-    yield get_session
+    yield task_queue
 
-    engine.dispose()
+    task_queue.close()
 
 
 def find_yaml_files(service_name: str) -> list[str | Path]:
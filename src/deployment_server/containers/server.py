@@ -3,16 +3,24 @@ from deployment_server.repositories.project import ProjectRepository
 from deployment_server.services.project import ProjectService
 from deployment_server.repositories.deployment import DeploymentRepository
 from deployment_server.services.deployment import DeploymentService
+from deployment_server.services.dispatch import DispatchService
+from deployment_server.repositories.token import TokenRepository
+from deployment_server.services.token import TokenService
+from deployment_server.packages.utils.tokens import TokenCache
 from deployment_server.containers.common import (
     find_yaml_files,
     init_logging,
     create_session_factory,
+    create_task_queue,
+    create_event_hub,
 )
 
 
 class ServerContainer(containers.DeclarativeContainer):
     wiring_config = containers.WiringConfiguration(
         modules=[
+            "deployment_server.routers.auth",
+            "deployment_server.routers.health",
             "deployment_server.routers.project",
             "deployment_server.routers.deployment",
         ],
@@ -21,8 +29,15 @@ class ServerContainer(containers.DeclarativeContainer):
     config = providers.Configuration(yaml_files=find_yaml_files("server"), strict=True)
     logger = providers.Resource(init_logging, name=config.codename, debug=config.debug)
     session_factory = providers.Resource(
-        create_session_factory, conn_str=config.pg_conn_str
+        create_session_factory, conn_str=config.pg_conn_str, options=config
     )
+    event_hub = providers.Resource(
+        create_event_hub,
+        conn_str=config.pg_conn_str,
+        channel="deployment_status",
+        logger=logger,
+    )
+    task_queue = providers.Resource(create_task_queue, broker=config.rabbitmq_conn_str)
     project_repo = providers.Factory(ProjectRepository, session_factory=session_factory)
     project_service = providers.Factory(ProjectService, project_repo=project_repo)
     deployment_repo = providers.Factory(
@@ -31,3 +46,12 @@ class ServerContainer(containers.DeclarativeContainer):
     deployment_service = providers.Factory(
         DeploymentService, deployment_repo=deployment_repo
     )
+    # shared by all requests of the process
+    token_cache = providers.Singleton(TokenCache)
+    token_repo = providers.Factory(TokenRepository, session_factory=session_factory)
+    token_service = providers.Factory(
+        TokenService, token_repo=token_repo, token_cache=token_cache
+    )
+    dispatch_service = providers.Factory(
+        DispatchService, task_queue=task_queue, logger=logger
+    )
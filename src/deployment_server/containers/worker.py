@@ -6,7 +6,8 @@ from deployment_server.repositories.deployment import DeploymentRepository
 from deployment_server.services.deployment import DeploymentService
 from deployment_server.containers.common import (
     init_logging,
-    create_session_factory_sync,
+    create_event_loop,
+    create_session_factory_on_loop,
     find_yaml_files,
 )
 
@@ -18,8 +19,12 @@ class WorkerContainer(containers.DeclarativeContainer):
     )
     config = providers.Configuration(yaml_files=find_yaml_files("worker"), strict=True)
     logger = providers.Resource(init_logging, name=config.codename, debug=config.debug)
+    event_loop = providers.Resource(create_event_loop)
     session_factory = providers.Resource(
-        create_session_factory_sync, conn_str=config.pg_conn_str
+        create_session_factory_on_loop,
+        conn_str=config.pg_conn_str,
+        event_loop=event_loop,
+        options=config,
     )
     postmark = PostmarkClient(server_token=config.postmark_server_token)
     project_repo = providers.Factory(ProjectRepository, session_factory=session_factory)
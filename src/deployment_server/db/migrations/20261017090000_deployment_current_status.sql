@@ -0,0 +1,49 @@
+-- migrate:up
+alter table deployment
+add column status deployment_status,
+add column status_rid text;
+
+-- backfill the current status of existing deployments
+update deployment d
+set status = ls.status, status_rid = ls.rid
+from (
+    select distinct on (deployment_rid) rid, deployment_rid, status
+    from deployment_status_update
+    where removed_at is null
+    order by deployment_rid, created_at desc
+) ls
+where ls.deployment_rid = d.rid;
+
+-- keeps deployment.status in sync with its latest status update, in the same
+-- transaction as the status change
+create function deployment_current_status() returns trigger as $$
+begin
+    if tg_op = 'INSERT' then
+        update deployment
+        set status = new.status, status_rid = new.rid
+        where rid = new.deployment_rid;
+    else
+        update deployment
+        set status = new.status
+        where rid = new.deployment_rid and status_rid = new.rid;
+    end if;
+    return new;
+end;
+$$ language plpgsql;
+
+create trigger deployment_status_update_current_status
+after insert or update of status on deployment_status_update
+for each row when (new.removed_at is null)
+execute function deployment_current_status();
+
+create index deployment_ready_index
+    on deployment (created_at desc)
+    where status = 'READY' and removed_at is null;
+
+-- migrate:down
+drop index if exists deployment_ready_index;
+drop trigger if exists deployment_status_update_current_status on deployment_status_update;
+drop function if exists deployment_current_status();
+alter table deployment
+drop column status,
+drop column status_rid;
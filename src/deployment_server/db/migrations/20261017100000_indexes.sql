@@ -0,0 +1,27 @@
+-- migrate:up
+-- lookups by code and git url always skip removed projects
+create index project_code_index
+    on project (code)
+    where removed_at is null;
+
+create index project_git_url_index
+    on project (git_url)
+    where removed_at is null;
+
+-- foreign keys are also used by relationship loads, which don't filter removed
+-- rows, so these can't be partial
+create index daemon_project_rid_index
+    on daemon (project_rid);
+
+create index deployment_project_rid_version_index
+    on deployment (project_rid, version);
+
+create index deployment_status_update_deployment_rid_created_at_index
+    on deployment_status_update (deployment_rid, created_at desc);
+
+-- migrate:down
+drop index if exists deployment_status_update_deployment_rid_created_at_index;
+drop index if exists deployment_project_rid_version_index;
+drop index if exists daemon_project_rid_index;
+drop index if exists project_git_url_index;
+drop index if exists project_code_index;
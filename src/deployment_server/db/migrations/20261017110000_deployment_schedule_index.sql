@@ -0,0 +1,7 @@
+-- migrate:up
+create index deployment_scheduled_index
+    on deployment (scheduled_to_run_at)
+    where status = 'SCHEDULED' and removed_at is null;
+
+-- migrate:down
+drop index if exists deployment_scheduled_index;
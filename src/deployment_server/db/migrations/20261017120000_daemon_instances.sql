@@ -0,0 +1,7 @@
+-- migrate:up
+alter table daemon
+add column instances integer not null default 1 check (instances >= 1);
+
+-- migrate:down
+alter table daemon
+drop column instances;
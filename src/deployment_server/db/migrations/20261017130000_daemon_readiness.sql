@@ -0,0 +1,9 @@
+-- migrate:up
+alter table daemon
+add column health_path text,
+add column ready_timeout integer check (ready_timeout > 0);
+
+-- migrate:down
+alter table daemon
+drop column health_path,
+drop column ready_timeout;
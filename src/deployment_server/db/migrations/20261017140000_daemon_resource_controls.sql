@@ -0,0 +1,25 @@
+-- migrate:up
+alter table daemon
+add column cpu_quota integer check (cpu_quota > 0),
+add column cpu_weight integer check (cpu_weight between 1 and 10000),
+add column memory_high text,
+add column memory_max text,
+add column io_weight integer check (io_weight between 1 and 10000),
+add column tasks_max integer check (tasks_max > 0),
+add column nice integer check (nice between -20 and 19),
+add column cpu_affinity text,
+add column numa_policy text,
+add column numa_mask text;
+
+-- migrate:down
+alter table daemon
+drop column cpu_quota,
+drop column cpu_weight,
+drop column memory_high,
+drop column memory_max,
+drop column io_weight,
+drop column tasks_max,
+drop column nice,
+drop column cpu_affinity,
+drop column numa_policy,
+drop column numa_mask;
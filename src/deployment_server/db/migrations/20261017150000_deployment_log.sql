@@ -0,0 +1,17 @@
+-- migrate:up
+-- output of a deployment in chunks, appended while it runs
+create table deployment_log (
+    rid text not null constraint deployment_log_pk primary key,
+    created_at timestamp with time zone default now(),
+    updated_at timestamp with time zone,
+    removed_at timestamp with time zone,
+    deployment_rid text not null references deployment (rid) on delete cascade,
+    position bigint not null,
+    content text not null
+);
+
+create unique index deployment_log_deployment_rid_position_index
+    on deployment_log (deployment_rid, position);
+
+-- migrate:down
+drop table if exists deployment_log;
@@ -0,0 +1,42 @@
+-- migrate:up
+-- also announces every status change on the deployment_status channel, the
+-- notification is delivered when the transaction commits
+create or replace function deployment_current_status() returns trigger as $$
+begin
+    if tg_op = 'INSERT' then
+        update deployment
+        set status = new.status, status_rid = new.rid
+        where rid = new.deployment_rid;
+    else
+        update deployment
+        set status = new.status
+        where rid = new.deployment_rid and status_rid = new.rid;
+    end if;
+    perform pg_notify(
+        'deployment_status',
+        json_build_object(
+            'deployment_rid', new.deployment_rid,
+            'status_rid', new.rid,
+            'status', new.status,
+            'description', left(new.description, 1000)
+        )::text
+    );
+    return new;
+end;
+$$ language plpgsql;
+
+-- migrate:down
+create or replace function deployment_current_status() returns trigger as $$
+begin
+    if tg_op = 'INSERT' then
+        update deployment
+        set status = new.status, status_rid = new.rid
+        where rid = new.deployment_rid;
+    else
+        update deployment
+        set status = new.status
+        where rid = new.deployment_rid and status_rid = new.rid;
+    end if;
+    return new;
+end;
+$$ language plpgsql;
@@ -0,0 +1,18 @@
+-- migrate:up
+-- keyset pagination of listings, newest first
+create index project_created_at_rid_index
+    on project (created_at desc, rid desc)
+    where removed_at is null;
+
+create index deployment_created_at_rid_index
+    on deployment (created_at desc, rid desc)
+    where removed_at is null;
+
+create index deployment_project_rid_created_at_rid_index
+    on deployment (project_rid, created_at desc, rid desc)
+    where removed_at is null;
+
+-- migrate:down
+drop index if exists deployment_project_rid_created_at_rid_index;
+drop index if exists deployment_created_at_rid_index;
+drop index if exists project_created_at_rid_index;
@@ -0,0 +1,18 @@
+-- migrate:up
+-- deploy tokens scoped to a project, only hashes of their secrets are kept
+create table project_token (
+    rid text not null constraint project_token_pk primary key,
+    created_at timestamp with time zone default now(),
+    updated_at timestamp with time zone,
+    removed_at timestamp with time zone,
+    project_rid text not null references project (rid) on delete cascade,
+    name text not null,
+    secret_hash text not null
+);
+
+create index project_token_project_rid_index
+    on project_token (project_rid)
+    where removed_at is null;
+
+-- migrate:down
+drop table if exists project_token;
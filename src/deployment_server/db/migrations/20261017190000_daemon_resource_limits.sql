@@ -0,0 +1,14 @@
+-- migrate:up
+-- 0 lifts the default cpu quota and task limit
+alter table daemon
+drop constraint daemon_cpu_quota_check,
+drop constraint daemon_tasks_max_check,
+add constraint daemon_cpu_quota_check check (cpu_quota >= 0),
+add constraint daemon_tasks_max_check check (tasks_max >= 0);
+
+-- migrate:down
+alter table daemon
+drop constraint daemon_cpu_quota_check,
+drop constraint daemon_tasks_max_check,
+add constraint daemon_cpu_quota_check check (cpu_quota > 0),
+add constraint daemon_tasks_max_check check (tasks_max > 0);
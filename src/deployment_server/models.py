@@ -1,9 +1,9 @@
 import enum
 import nanoid
-from typing import Optional, Annotated
+from typing import Optional, Annotated, Literal
 from datetime import datetime, timezone
-from pydantic import BaseModel, Field, AfterValidator
-from sqlalchemy import String, ForeignKey, Enum, TIMESTAMP, Integer
+from pydantic import BaseModel, Field, AfterValidator, model_validator
+from sqlalchemy import String, ForeignKey, Enum, TIMESTAMP, Integer, BigInteger
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import (
     DeclarativeBase,
@@ -13,7 +13,11 @@ from sqlalchemy.orm import (
     declared_attr,
 )
 from sqlalchemy.sql import func
-from deployment_server.packages.utils import validators
+from deployment_server.packages.utils import validators, generators
+
+
+memory_size_pattern = r"^(\d+[KMGT]?|\d{1,2}%|100%|infinity)$"
+cpu_list_pattern = r"^\d+(-\d+)?([ ,]\d+(-\d+)?)*$"
 
 
 class SystemdUnit(BaseModel):
@@ -26,6 +30,46 @@ class SystemdUnit(BaseModel):
     py_module_name: Annotated[
         str | None, AfterValidator(validators.pip_package_name_pydantic)
     ] = None
+    # instances of a daemon with a port listen on consecutive ports
+    instances: Annotated[int, Field(ge=1, le=64)] = 1
+    # the daemon is ready when a GET to this path succeeds, or when its port
+    # accepts connections if there is no path
+    health_path: Annotated[str | None, Field(pattern=r"^/", max_length=256)] = None
+    ready_timeout: Annotated[int | None, Field(ge=1, le=600)] = None
+    # resource controls, see systemd.resource-control(5) and systemd.exec(5)
+    # 0 lifts the default quota and task limit, infinity the default memory limit
+    cpu_quota: Annotated[int | None, Field(ge=0, le=10000)] = None  # percent
+    cpu_weight: Annotated[int | None, Field(ge=1, le=10000)] = None
+    memory_high: Annotated[str | None, Field(pattern=memory_size_pattern)] = None
+    memory_max: Annotated[str | None, Field(pattern=memory_size_pattern)] = None
+    io_weight: Annotated[int | None, Field(ge=1, le=10000)] = None
+    tasks_max: Annotated[int | None, Field(ge=0)] = None
+    nice: Annotated[int | None, Field(ge=-20, le=19)] = None
+    cpu_affinity: Annotated[str | None, Field(pattern=cpu_list_pattern)] = None
+    numa_policy: (
+        Literal["default", "preferred", "bind", "interleave", "local"] | None
+    ) = None
+    numa_mask: Annotated[str | None, Field(pattern=cpu_list_pattern)] = None
+
+    @model_validator(mode="after")
+    def check_port_range(self):
+        if self.port and self.port + self.instances - 1 > 9999:
+            raise ValueError("the ports of the instances must be less than 10000")
+        return self
+
+    @model_validator(mode="after")
+    def check_memory_limits(self):
+        if not self.memory_high:
+            return self
+        # MemoryHigh has no effect at or above MemoryMax, the default one included
+        memory_max = (
+            self.memory_max or generators.default_resource_controls["MemoryMax"]
+        )
+        high = validators.memory_size_bytes(self.memory_high)
+        limit = validators.memory_size_bytes(memory_max)
+        if high is not None and limit is not None and high >= limit:
+            raise ValueError(f"memory_high must be less than memory_max ({memory_max})")
+        return self
 
 
 class SecretsProvider(enum.Enum):
@@ -33,6 +77,8 @@ class SecretsProvider(enum.Enum):
     COLDRUNE = "COLDRUNE"
 
 
+# relationships are never loaded implicitly, queries ask for the ones they
+# need with loader options and touching any other one raises
 class ModelBase(AsyncAttrs, DeclarativeBase):
     created_at: Mapped[datetime] = mapped_column(
         TIMESTAMP(timezone=True),
@@ -70,10 +116,10 @@ class Project(ModelBase):
     )
 
     deployments: Mapped[list["Deployment"]] = relationship(
-        back_populates="project", lazy="selectin"
+        back_populates="project", lazy="raise"
     )
     daemons: Mapped[list["Daemon"]] = relationship(
-        back_populates="project", lazy="selectin"
+        back_populates="project", lazy="raise"
     )
 
 
@@ -90,11 +136,33 @@ class Daemon(ModelBase):
     name: Mapped[str] = mapped_column(String)
     port: Mapped[Optional[int]] = mapped_column(Integer, default=0)
     py_module_name: Mapped[Optional[str]] = mapped_column(String)
+    instances: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+    health_path: Mapped[Optional[str]] = mapped_column(String)
+    ready_timeout: Mapped[Optional[int]] = mapped_column(Integer)
+    cpu_quota: Mapped[Optional[int]] = mapped_column(Integer)
+    cpu_weight: Mapped[Optional[int]] = mapped_column(Integer)
+    memory_high: Mapped[Optional[str]] = mapped_column(String)
+    memory_max: Mapped[Optional[str]] = mapped_column(String)
+    io_weight: Mapped[Optional[int]] = mapped_column(Integer)
+    tasks_max: Mapped[Optional[int]] = mapped_column(Integer)
+    nice: Mapped[Optional[int]] = mapped_column(Integer)
+    cpu_affinity: Mapped[Optional[str]] = mapped_column(String)
+    numa_policy: Mapped[Optional[str]] = mapped_column(String)
+    numa_mask: Mapped[Optional[str]] = mapped_column(String)
     project_rid: Mapped[str] = mapped_column(
         String, ForeignKey("project.rid", ondelete="CASCADE")
     )
 
-    project: Mapped["Project"] = relationship(back_populates="daemons", lazy="selectin")
+    project: Mapped["Project"] = relationship(back_populates="daemons", lazy="raise")
+
+
+class DeploymentStatus(enum.Enum):
+    SCHEDULED = "SCHEDULED"
+    READY = "READY"
+    RUNNING = "RUNNING"
+    FAILED = "FAILED"
+    SUCCESS = "SUCCESS"
+    SKIPPED = "SKIPPED"
 
 
 class Deployment(ModelBase):
@@ -106,27 +174,23 @@ class Deployment(ModelBase):
     scheduled_to_run_at: Mapped[Optional[datetime]] = mapped_column(
         TIMESTAMP(timezone=True)
     )
+    # current status, maintained by a trigger on deployment_status_update
+    status: Mapped[Optional[DeploymentStatus]] = mapped_column(
+        Enum(DeploymentStatus, name="deployment_status")
+    )
+    status_rid: Mapped[Optional[str]] = mapped_column(String)
     project_rid: Mapped[str] = mapped_column(
         String, ForeignKey("project.rid", ondelete="CASCADE")
     )
 
     project: Mapped["Project"] = relationship(
-        back_populates="deployments", lazy="selectin"
+        back_populates="deployments", lazy="raise"
     )
     status_updates: Mapped[list["DeploymentStatusUpdate"]] = relationship(
-        back_populates="deployment", lazy="selectin"
+        back_populates="deployment", lazy="raise"
     )
 
 
-class DeploymentStatus(enum.Enum):
-    SCHEDULED = "SCHEDULED"
-    READY = "READY"
-    RUNNING = "RUNNING"
-    FAILED = "FAILED"
-    SUCCESS = "SUCCESS"
-    SKIPPED = "SKIPPED"
-
-
 class DeploymentStatusUpdate(ModelBase):
     __tablename__ = "deployment_status_update"
     rid: Mapped[str]
@@ -140,5 +204,29 @@ class DeploymentStatusUpdate(ModelBase):
     )
 
     deployment: Mapped["Deployment"] = relationship(
-        back_populates="status_updates", lazy="selectin"
+        back_populates="status_updates", lazy="raise"
+    )
+
+
+class DeploymentLog(ModelBase):
+    __tablename__ = "deployment_log"
+    rid: Mapped[str]
+
+    # offset of the chunk in the whole log, in characters
+    position: Mapped[int] = mapped_column(BigInteger)
+    content: Mapped[str] = mapped_column(String)
+    deployment_rid: Mapped[str] = mapped_column(
+        String, ForeignKey("deployment.rid", ondelete="CASCADE")
+    )
+
+
+class ProjectToken(ModelBase):
+    __tablename__ = "project_token"
+    rid: Mapped[str]
+
+    name: Mapped[str] = mapped_column(String)
+    # salted slow hash of the secret part of the token
+    secret_hash: Mapped[str] = mapped_column(String)
+    project_rid: Mapped[str] = mapped_column(
+        String, ForeignKey("project.rid", ondelete="CASCADE")
     )
@@ -1,9 +1,9 @@
-import subprocess
 import enum
 import os
 import shutil
 from pathlib import Path
 from logging import Logger
+from deployment_server.modules import process
 
 
 class DnsProvider(enum.Enum):
@@ -40,15 +40,8 @@ def issue_ssl_certs(
         "--config-home",
         acme_home,
     ]
-    result = subprocess.run(
-        args,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        universal_newlines=True,
-    )
     logger.debug(f"issue command: {" ".join(args)}")
-    logger.debug(f"issue command result: {result.stdout}")
+    result = process.run(args, on_line=logger.debug, merge_stderr=True)
     if result.returncode != 0:
         return False, f"failed. error details: {result.stdout}"
     logger.info("certificates issued successfully.")
@@ -82,15 +75,8 @@ def install_ssl_certs(
         "--config-home",
         acme_home,
     ]
-    result = subprocess.run(
-        args,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        universal_newlines=True,
-    )
     logger.debug(f"install command: {" ".join(args)}")
-    logger.debug(f"install command result: {result.stdout}")
+    result = process.run(args, on_line=logger.debug, merge_stderr=True)
     if result.returncode != 0:
         return False, f"failed. error details: {result.stdout}"
     logger.info("certificates installed successfully.")
@@ -149,15 +135,8 @@ def remove_ssl_certs(
     if revoke:
         logger.info("will also revoke certificates.")
         args.append("--revoke")
-    result = subprocess.run(
-        args,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        universal_newlines=True,
-    )
     logger.debug(f"remove command: {" ".join(args)}")
-    logger.debug(f"remove command result: {result.stdout}")
+    result = process.run(args, on_line=logger.debug, merge_stderr=True)
     if result.returncode != 0:
         return False, f"failed. error details: {result.stdout}"
     logger.info("removed from acme client.")
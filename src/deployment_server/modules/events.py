@@ -0,0 +1,78 @@
+import asyncio
+import json
+from logging import Logger
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+import asyncpg
+from sqlalchemy.engine import make_url
+
+
+class EventHub:
+    """
+    Listens to a postgres notification channel over a single connection and
+    fans the notifications out to any number of subscribers of the process.
+    The connection is opened with the first subscriber, and again with the
+    next one after it is lost.
+
+    A subscriber that falls behind, or whose notifications are lost with the
+    connection, gets None and is expected to resync.
+    """
+
+    def __init__(
+        self, conn_str: str, channel: str, logger: Logger, queue_size: int = 100
+    ):
+        self.logger: Logger = logger
+        # asyncpg takes a plain postgres url, without the sqlalchemy driver
+        self.dsn = make_url(conn_str).set(drivername="postgresql")
+        self.channel = channel
+        self.queue_size = queue_size
+        self.subscribers: set[asyncio.Queue] = set()
+        self.connection: asyncpg.Connection | None = None
+        self.connecting = asyncio.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncGenerator[asyncio.Queue, None]:
+        await self.connect()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers.discard(queue)
+
+    async def connect(self):
+        async with self.connecting:
+            if self.connection is not None and not self.connection.is_closed():
+                return
+            self.connection = await asyncpg.connect(
+                self.dsn.render_as_string(hide_password=False)
+            )
+            await self.connection.add_listener(self.channel, self.on_notify)
+            self.connection.add_termination_listener(self.on_terminate)
+            self.logger.debug(f"listening to {self.channel}")
+
+    async def close(self):
+        if self.connection is not None and not self.connection.is_closed():
+            self.connection.remove_termination_listener(self.on_terminate)
+            await self.connection.close()
+        self.connection = None
+
+    def on_notify(self, connection, pid: int, channel: str, payload: str):
+        event = json.loads(payload)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.drop(queue)
+
+    def on_terminate(self, connection):
+        self.logger.warning(f"lost the connection listening to {self.channel}")
+        for queue in list(self.subscribers):
+            self.drop(queue)
+        self.connection = None
+
+    def drop(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+class EventLoopThread:
+    """
+    Runs one asyncio loop on a background thread for the whole process, so
+    that sync code such as celery tasks can await the async repositories and
+    keep reusing the connections pooled on that loop. The thread is started
+    with the first coroutine, and again in forked children since threads
+    don't survive a fork.
+    """
+
+    def __init__(self, name: str = "event-loop"):
+        self.name = name
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.reset)
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(
+                    target=self.loop.run_forever, name=self.name, daemon=True
+                )
+                self.thread.start()
+            return self.loop
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> Future[T]:
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: float = None) -> T:
+        """
+        Runs the coroutine on the loop and blocks until it's done. Must not
+        be called from the loop thread itself.
+        """
+        if self.thread is threading.current_thread():
+            coro.close()
+            raise RuntimeError("can't block the event loop thread on itself.")
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        with self.lock:
+            if self.loop is None:
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+            self.thread = None
+
+    def reset(self):
+        # the loop of the parent is unusable here, its thread is gone
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
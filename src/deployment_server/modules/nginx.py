@@ -13,6 +13,15 @@ def is_nginx_available():
     return shutil.which("nginx") is not None
 
 
+def get_upstream_servers(
+    port: int, instances: int = 1, host: str = "127.0.0.1"
+) -> tuple[str, ...]:
+    """
+    Lists the servers of a daemon whose instances listen on consecutive ports.
+    """
+    return tuple(f"{host}:{port + i}" for i in range(instances))
+
+
 def setup_proxy_host(
     server_names: tuple[str, ...],
     upstream_name: str,
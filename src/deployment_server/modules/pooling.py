@@ -0,0 +1,99 @@
+import threading
+import time
+from typing import Any, Callable
+from sqlalchemy.pool import Pool, QueuePool, AsyncAdaptedQueuePool
+
+
+class PoolWaits:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+
+class InstrumentedPool:
+    """
+    Times every checkout, from asking for a connection until getting one,
+    which includes waiting for a free one and opening a new one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = PoolWaits()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.waits.record(time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def get_option(options: dict, key: str, default: Any, cast: Callable = int) -> Any:
+    value = options.get(key)
+    if value is None or value == "":
+        return default
+    return cast(value)
+
+
+def to_bool(value: Any) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_pool_options(options: dict) -> dict[str, Any]:
+    """
+    Reads the pool settings of a service from its config, all optional.
+    """
+    return {
+        "pool_size": get_option(options, "db_pool_size", 5),
+        "max_overflow": get_option(options, "db_max_overflow", 10),
+        "pool_timeout": get_option(options, "db_pool_timeout", 30, float),
+        # connections older than this are replaced on checkout, -1 never
+        "pool_recycle": get_option(options, "db_pool_recycle", -1),
+        "pool_pre_ping": get_option(options, "db_pool_pre_ping", False, to_bool),
+    }
+
+
+def get_server_settings(options: dict) -> dict[str, str]:
+    """
+    Session settings applied by postgres to every pooled connection, in ms.
+    """
+    settings = {}
+    statement_timeout = get_option(options, "db_statement_timeout", 0)
+    if statement_timeout > 0:
+        settings["statement_timeout"] = str(statement_timeout)
+    idle_timeout = get_option(options, "db_idle_in_transaction_timeout", 0)
+    if idle_timeout > 0:
+        settings["idle_in_transaction_session_timeout"] = str(idle_timeout)
+    return settings
+
+
+def get_pool_status(pool: Pool) -> dict[str, Any]:
+    status = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+    waits = getattr(pool, "waits", None)
+    if waits is not None:
+        with waits.lock:
+            status["checkouts"] = waits.count
+            status["wait_seconds_total"] = round(waits.total_seconds, 6)
+            status["wait_seconds_max"] = round(waits.max_seconds, 6)
+    return status
@@ -0,0 +1,81 @@
+import os
+import selectors
+import subprocess
+from collections import deque
+from typing import Callable
+
+
+read_size = 64 * 1024
+# longer lines (e.g. progress bars redrawn with \r) are cut into pieces
+max_line_size = 64 * 1024
+
+
+def run(
+    args: list[str],
+    cwd: str | os.PathLike = None,
+    env: dict[str, str] = None,
+    on_line: Callable[[str], None] = None,
+    tail_lines: int = 100,
+    merge_stderr: bool = False,
+) -> subprocess.CompletedProcess:
+    """
+    Runs a command and passes its output to on_line as it comes, line by
+    line. Only the last tail_lines lines of each stream are kept, so memory
+    stays flat however much the command prints.
+
+    :return: The result with the tails as stdout and stderr.
+    """
+    process = subprocess.Popen(
+        args,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+    )
+    tails = {"stdout": deque(maxlen=tail_lines), "stderr": deque(maxlen=tail_lines)}
+    buffers = {"stdout": bytearray(), "stderr": bytearray()}
+
+    def emit(name: str, data: bytes):
+        line = data.decode("utf-8", errors="replace").rstrip("\r")
+        tails[name].append(line)
+        if on_line is not None:
+            on_line(line)
+
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ, "stdout")
+        if not merge_stderr:
+            selector.register(process.stderr, selectors.EVENT_READ, "stderr")
+        while len(selector.get_map()) > 0:
+            for key, _ in selector.select():
+                name = key.data
+                chunk = os.read(key.fd, read_size)
+                buffer = buffers[name]
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    if len(buffer) > 0:
+                        emit(name, bytes(buffer))
+                        buffer.clear()
+                    continue
+                buffer.extend(chunk)
+                while True:
+                    end = buffer.find(b"\n")
+                    if end == -1:
+                        if len(buffer) >= max_line_size:
+                            emit(name, bytes(buffer[:max_line_size]))
+                            del buffer[:max_line_size]
+                            continue
+                        break
+                    emit(name, bytes(buffer[:end]))
+                    del buffer[: end + 1]
+
+    returncode = process.wait()
+    process.stdout.close()
+    if process.stderr is not None:
+        process.stderr.close()
+    return subprocess.CompletedProcess(
+        args,
+        returncode,
+        stdout="\n".join(tails["stdout"]),
+        stderr="\n".join(tails["stderr"]),
+    )
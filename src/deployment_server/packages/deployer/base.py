@@ -1,15 +1,33 @@
 import os
 import pwd
 import grp
+import fcntl
+import hashlib
 import subprocess
 import shutil
 import re
-import venv
+import tempfile
+import enum
 from logging import Logger
 from pathlib import Path
+from contextlib import contextmanager, suppress
+from typing import Callable
 from dependency_injector import containers, providers
+from pydantic import BaseModel
 from deployment_server.models import Daemon, DaemonType, SecretsProvider
+from deployment_server.modules import process
 from deployment_server.packages.utils import modifiers, generators
+from deployment_server.packages.deployer.stages import Stage, run_stages
+from deployment_server.packages.deployer.wheelhouse import Wheelhouse
+from deployment_server.packages.deployer.venv_template import VenvTemplate
+from deployment_server.packages.deployer.releases import Releases
+from deployment_server.packages.deployer.systemd import (
+    SystemdBus,
+    Systemctl,
+    UnitJob,
+    UnitJobResult,
+)
+from deployment_server.packages.deployer.readiness import Probe, wait_until_ready
 from deployment_server.containers.common import find_yaml_files
 
 
@@ -17,6 +35,31 @@ class Container(containers.DeclarativeContainer):
     config = providers.Configuration(strict=True)
 
 
+class UnitKind(enum.Enum):
+    SOCKET = "socket"
+    SOCKET_SERVICE = "socket_service"
+    SERVICE = "service"
+
+
+class UnitFile(BaseModel):
+    service_id: str
+    kind: UnitKind
+    path: Path
+    content: str
+    # set for template units, e.g. ports of name@.socket
+    instances: list[str] = []
+
+    def unit_names(self) -> list[str]:
+        if len(self.instances) == 0:
+            return [self.path.name]
+        return [f"{self.service_id}@{i}{self.path.suffix}" for i in self.instances]
+
+    def service_names(self) -> list[str]:
+        if len(self.instances) == 0:
+            return [f"{self.service_id}.service"]
+        return [f"{self.service_id}@{i}.service" for i in self.instances]
+
+
 class Deployer:
 
     def __init__(self, logger: Logger):
@@ -27,7 +70,23 @@ class Deployer:
         self.application_data_root_dir = Path("/var/lib")
         self.user_root_dir = Path("/home")
         self.systemd_root_dir = Path("/etc/systemd/system")
+        self.lock_root_dir = Path("/run/lock")
+        self.max_stage_workers = 4
+        self.wheelhouse = Wheelhouse(
+            root_dir=Path("/var/cache/deployer/wheelhouse"),
+            max_bytes=5 * 1024**3,
+            logger=logger,
+        )
+        self.venv_template = VenvTemplate(
+            root_dir=Path("/var/cache/deployer/venv-templates"), logger=logger
+        )
+        self.releases = Releases(logger=logger)
+        self.ready_timeout = 30
+        # how long a daemon without a health path has to stay up to be ready
+        self.ready_settle = 5
         self.os_groups = ("deployer",)
+        # receives the output of commands line by line as they run
+        self.output: Callable[[str], None] | None = None
 
     def fetch_secrets(self, provider: SecretsProvider, mode: str, project_code: str):
         if provider == SecretsProvider.LOCAL:
@@ -46,145 +105,256 @@ class Deployer:
         else:
             return {}
 
+    @contextmanager
+    def lock(self, project_code: str, mode: str, blocking: bool = True):
+        """
+        Yields whether the lock is held, without blocking it may not be.
+        """
+        application_id = self.get_application_id(project_code, mode)
+        os.makedirs(self.lock_root_dir, exist_ok=True)
+        lock_file = self.lock_root_dir / f"deployer-{application_id}.lock"
+        with open(lock_file, "w") as f:
+            self.logger.debug(f"waiting for the lock of {application_id}")
+            try:
+                fcntl.flock(
+                    f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                )
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
     def deploy(
         self,
         project_code: str,
         mode: str,
         secrets_provider: SecretsProvider,
+        version: str = None,
         pip_package_name: str = None,
         pip_index_url: str = None,
         pip_index_user: str = None,
         pip_index_auth: str = None,
         daemons: list[Daemon] = None,
     ):
-        try:
-            application_dir, os_user, os_groups = self.verify_os_configuration(
-                project_code, mode
+        systemd_units = [d for d in daemons or [] if d.type == DaemonType.SYSTEMD]
+
+        def verify_os_configuration(_):
+            return self.verify_os_configuration(project_code, mode)
+
+        def fetch_secrets(_):
+            return self.fetch_secrets(secrets_provider, mode, project_code)
+
+        def prepare_release(results):
+            if pip_package_name is None:
+                return None
+            application_dir = results["os"][0]
+            return self.releases.prepare(application_dir, version)
+
+        def install_pip_package(results):
+            if results["release"] is None:
+                return None
+            return self.install_pip_package(
+                project_code=project_code,
+                mode=mode,
+                release_dir=results["release"],
+                version=version,
+                pip_package_name=pip_package_name,
+                pip_index_url=pip_index_url,
+                pip_index_user=pip_index_user,
+                pip_index_auth=pip_index_auth,
             )
-        except Exception as ex:
-            return False, str(ex)
-
-        env_vars_dict = self.fetch_secrets(secrets_provider, mode, project_code)
-        db_migrations_root_dir = application_dir
 
-        if pip_package_name is not None:
-            try:
-                pkg_dir, py_exec, pip_exec = self.install_pip_package(
-                    project_code=project_code,
-                    mode=mode,
-                    pip_package_name=pip_package_name,
-                    pip_index_url=pip_index_url,
-                    pip_index_user=pip_index_user,
-                    pip_index_auth=pip_index_auth,
-                )
-                db_migrations_root_dir = pkg_dir
-            except Exception as ex:
-                return False, str(ex)
+        def render_systemd_units(results):
+            application_dir, os_user, os_groups = results["os"]
+            return self.render_systemd_units(
+                daemons=systemd_units,
+                project_code=project_code,
+                mode=mode,
+                os_user=os_user,
+                os_group=os_groups[0],
+            )
 
-        if "pg_conn_str" in env_vars_dict:
-            self.run_database_migrations(
+        def run_database_migrations(results):
+            env_vars_dict = results["secrets"]
+            if "pg_conn_str" not in env_vars_dict:
+                return False
+            db_migrations_root_dir = self.get_application_dir(project_code, mode)
+            if results["package"] is not None:
+                db_migrations_root_dir = results["package"][0]
+            return self.run_database_migrations(
                 db_migrations_root_dir, env_vars_dict["pg_conn_str"]
             )
 
-        if daemons is not None and len(daemons) > 0:
-            systemd_units = [d for d in daemons if d.type == DaemonType.SYSTEMD]
-            if len(systemd_units) > 0:
-                try:
-                    self.setup_systemd_units(
-                        daemons=systemd_units,
-                        project_code=project_code,
-                        mode=mode,
-                        os_user=os_user,
-                        os_group=os_groups[0],
-                    )
-                except Exception as ex:
-                    return False, str(ex)
+        switched = {}
 
+        def switch_release(results):
+            if results["release"] is None:
+                return None
+            application_dir = results["os"][0]
+            switched["previous"] = self.releases.switch(
+                application_dir, results["release"]
+            )
+            return True
+
+        def setup_systemd_units(results):
+            if len(results["units"]) == 0:
+                return False
+            return self.setup_systemd_units(
+                results["units"], release_changed=results["switch"] is True
+            )
+
+        def wait_until_ready(results):
+            if results["systemd"] is False:
+                return False
+            return self.wait_until_ready(systemd_units, project_code, mode)
+
+        # stages only wait for what they depend on, e.g. secrets and unit files
+        # are ready while the package is still being installed
+        stages = [
+            Stage("os", verify_os_configuration),
+            Stage("secrets", fetch_secrets, depends_on=("os",)),
+            Stage("release", prepare_release, depends_on=("os",)),
+            Stage("package", install_pip_package, depends_on=("release",)),
+            Stage("units", render_systemd_units, depends_on=("os",)),
+            Stage(
+                "migrations",
+                run_database_migrations,
+                depends_on=("secrets", "package"),
+            ),
+            Stage(
+                "switch",
+                switch_release,
+                depends_on=("os", "release", "package", "migrations"),
+            ),
+            Stage("systemd", setup_systemd_units, depends_on=("units", "switch")),
+            Stage("ready", wait_until_ready, depends_on=("systemd",)),
+        ]
+        try:
+            run_stages(stages, max_workers=self.max_stage_workers, logger=self.logger)
+        except Exception as ex:
+            if switched.get("previous") is not None:
+                self.releases.switch(
+                    self.get_application_dir(project_code, mode),
+                    switched["previous"],
+                )
+                success, message = self.restart_services(project_code, mode)
+                if not success:
+                    self.logger.error(message)
+            return False, str(ex)
+
+        if "previous" in switched:
+            self.releases.prune(self.get_application_dir(project_code, mode))
         return True, ""
 
-    def setup_systemd_units(
+    def rollback(self, project_code: str, mode: str):
+        application_dir = self.get_application_dir(project_code, mode)
+        previous = self.releases.get_previous(application_dir)
+        if previous is None:
+            return False, "there is no previous release to roll back to."
+        self.releases.switch(application_dir, previous)
+        return self.restart_services(project_code, mode)
+
+    def restart_services(self, project_code: str, mode: str):
+        # the pattern matches loaded units, instances of template units too
+        application_id = self.get_application_id(project_code, mode)
+        args = ["sudo", "systemctl", "restart", f"{application_id}-*.service"]
+        result = self.run(args)
+        if result.returncode != 0:
+            return False, f"failed to restart services. error: {result.stderr}"
+
+        return True, ""
+
+    def run(self, args: list[str], **kwargs):
+        """
+        Runs a command with its output streamed to self.output. Results keep
+        only the last lines of stdout and stderr.
+        """
+        return process.run(args, on_line=self.output, **kwargs)
+
+    def render_systemd_units(
         self,
         daemons: list[Daemon],
         project_code: str,
         mode: str,
         os_user: str,
         os_group: str,
-    ):
-        self.logger.debug("setting up systemd units")
+    ) -> list[UnitFile]:
         application_dir = self.get_application_dir(project_code, mode)
+        current_dir = self.releases.get_current_link(application_dir)
         application_config_dir = self.get_application_config_dir(project_code, mode)
         application_logs_dir = self.get_application_logs_dir(project_code, mode)
         application_data_dir = self.get_application_data_dir(project_code, mode)
 
-        new_sockets = set()
-        new_socket_services = set()
-        new_services = set()
-        existing_sockets = set()
-        existing_socket_services = set()
-        existing_services = set()
+        units = []
         for d in daemons:
             service_id = f"{self.get_application_id(project_code, mode)}-{d.name}"
-            self.logger.debug(f"setting up unit {service_id}")
-            py_exec, pip_exec = self.get_executables(self.get_venv_dir(application_dir))
+            self.logger.debug(f"rendering unit {service_id}")
+            py_exec, pip_exec = self.get_executables(self.get_venv_dir(current_dir))
             exec_start = f"{py_exec} -m {d.py_module_name}"
 
+            # several instances run from one template unit, e.g. name@.service,
+            # named after their ports when they listen on one
+            instances = []
+            unit_id = service_id
+            unit_stem = service_id
+            port = d.port
+            if (d.instances or 1) > 1:
+                first = d.port if d.port else 1
+                instances = [str(first + i) for i in range(d.instances)]
+                unit_id = f"{service_id}@%i"
+                unit_stem = f"{service_id}@"
+                port = "%i" if d.port else d.port
+
             if d.type == DaemonType.DOCKER:
                 self.logger.warning("docker based deployment isn't supported yet.")
                 # NOTE no support for docker deployments currently
                 continue
 
             if d.port:
-                socket_file_name = f"{service_id}.socket"
-                service_file_name = f"{service_id}.service"
                 self.logger.debug("this is an http service")
-                socket_file_path = self.systemd_root_dir / socket_file_name
-                service_file_path = self.systemd_root_dir / service_file_name
-                self.logger.debug(f"socket file: {socket_file_path}")
-                self.logger.debug(f"service file: {service_file_path}")
-                exec_start = f"{exec_start} --port {d.port}"
+                exec_start = f"{exec_start} --port {port}"
                 service_content, socket_content = (
                     generators.systemd_service_with_socket(
-                        service_id=service_id,
+                        service_id=unit_id,
                         application_dir=application_dir.as_posix(),
+                        working_dir=current_dir.as_posix(),
                         application_logs_dir=application_logs_dir.as_posix(),
                         application_data_dir=application_data_dir.as_posix(),
                         application_config_dir=application_config_dir.as_posix(),
                         exec_start=exec_start,
                         mode=mode,
-                        port=d.port,
+                        port=port,
                         os_user=os_user,
                         os_group=os_group,
+                        resource_controls=self.get_resource_controls(d),
+                    )
+                )
+                units.append(
+                    UnitFile(
+                        service_id=service_id,
+                        kind=UnitKind.SOCKET,
+                        path=self.systemd_root_dir / f"{unit_stem}.socket",
+                        content=socket_content,
+                        instances=instances,
                     )
                 )
-                if not socket_file_path.exists():
-                    self.logger.debug(f"creating socket file: {socket_file_path}")
-                    success, message = self.write_file(socket_file_path, socket_content)
-                    if not success:
-                        raise ValueError(
-                            f"failed to write systemd socket {socket_file_name}. error: {message}"
-                        )
-                    new_sockets.add(service_id)
-                else:
-                    existing_sockets.add(service_id)
-                if not service_file_path.exists():
-                    self.logger.debug(f"creating service file: {service_file_path}")
-                    success, message = self.write_file(
-                        service_file_path, service_content
+                units.append(
+                    UnitFile(
+                        service_id=service_id,
+                        kind=UnitKind.SOCKET_SERVICE,
+                        path=self.systemd_root_dir / f"{unit_stem}.service",
+                        content=service_content,
+                        instances=instances,
                     )
-                    if not success:
-                        raise ValueError(
-                            f"failed to write systemd service {service_file_name}. error: {message}"
-                        )
-                    new_socket_services.add(service_id)
-                else:
-                    existing_socket_services.add(service_id)
+                )
             else:
-                service_file_name = f"{service_id}.service"
-                service_file_path = self.systemd_root_dir / service_file_name
-                self.logger.debug(f"service file: {service_file_path}")
                 service_content = generators.systemd_service(
-                    service_id=service_id,
+                    service_id=unit_id,
                     application_dir=application_dir.as_posix(),
+                    working_dir=current_dir.as_posix(),
                     application_logs_dir=application_logs_dir.as_posix(),
                     application_data_dir=application_data_dir.as_posix(),
                     application_config_dir=application_config_dir.as_posix(),
@@ -192,72 +362,222 @@ class Deployer:
                     mode=mode,
                     os_user=os_user,
                     os_group=os_group,
+                    resource_controls=self.get_resource_controls(d),
                 )
-                if not service_file_path.exists():
-                    self.logger.debug(f"creating service file: {service_file_path}")
-                    success, message = self.write_file(
-                        service_file_path, service_content
+                units.append(
+                    UnitFile(
+                        service_id=service_id,
+                        kind=UnitKind.SERVICE,
+                        path=self.systemd_root_dir / f"{unit_stem}.service",
+                        content=service_content,
+                        instances=instances,
                     )
-                    if not success:
-                        raise ValueError(
-                            f"failed to write systemd service {service_file_name}. error: {message}"
-                        )
-                    new_services.add(service_id)
-                else:
-                    existing_services.add(service_id)
-
-        new_services_combined = set([*new_sockets, *new_services])
-
-        if len(new_services_combined) > 0:
-            args = ["sudo", "systemctl", "enable", *new_services_combined]
-            self.logger.debug(f"enabling new services: {new_services_combined}")
-            result = subprocess.run(args, capture_output=True, text=True)
-            if result.returncode != 0:
-                raise ValueError(
-                    f"failed to enable new sockets. error: {result.stderr}"
                 )
-            args = ["sudo", "systemctl", "start", *new_services_combined]
-            result = subprocess.run(args, capture_output=True, text=True)
-            if result.returncode != 0:
-                raise ValueError(f"failed to start new sockets. error: {result.stderr}")
 
-        if len(set([*new_services_combined, *new_socket_services])) > 0:
-            args = ["sudo", "systemctl", "daemon-reload"]
-            self.logger.debug("reloading daemon")
-            result = subprocess.run(args, capture_output=True, text=True)
-            if result.returncode != 0:
+        return units
+
+    def get_resource_controls(self, daemon: Daemon) -> dict[str, str | None]:
+        directives = {
+            "CPUQuota": f"{daemon.cpu_quota}%" if daemon.cpu_quota else None,
+            "CPUWeight": daemon.cpu_weight,
+            "MemoryHigh": daemon.memory_high,
+            "MemoryMax": daemon.memory_max,
+            "IOWeight": daemon.io_weight,
+            "TasksMax": "infinity" if daemon.tasks_max == 0 else daemon.tasks_max,
+            "Nice": daemon.nice,
+            "CPUAffinity": daemon.cpu_affinity,
+            "NUMAPolicy": daemon.numa_policy,
+            "NUMAMask": daemon.numa_mask,
+        }
+        controls = {k: str(v) for k, v in directives.items() if v is not None}
+        if daemon.cpu_quota == 0:
+            # no quota, drops the default one
+            controls["CPUQuota"] = None
+        return controls
+
+    def setup_systemd_units(self, units: list[UnitFile], release_changed: bool = True):
+        """
+        Brings the unit files on disk in line with the rendered ones and each
+        unit in systemd, every instance of a template unit, in line with its
+        file. Units that aren't enabled or running are enabled and started,
+        units whose content changed are restarted and, when a new release
+        went live, so are the running services. Units a daemon no longer has,
+        instances above its count or the plain units of a daemon that moved
+        to a template, and the reverse, are stopped and disabled.
+        """
+        self.logger.debug("setting up systemd units")
+
+        files_changed = False
+        changed_services = set()
+        # units that are enabled and started, socket services start with their sockets
+        wanted_units = []
+        socket_services = []
+        services = []
+        for unit in units:
+            unit_type = unit.path.suffix.lstrip(".")
+            if unit.kind == UnitKind.SOCKET_SERVICE:
+                socket_services.extend(unit.unit_names())
+            else:
+                wanted_units.extend(unit.unit_names())
+            if unit.kind == UnitKind.SERVICE:
+                services.extend(unit.unit_names())
+
+            is_new = not unit.path.exists()
+            if not is_new:
+                on_disk_hash = hashlib.sha256(unit.path.read_bytes()).hexdigest()
+                content_hash = hashlib.sha256(unit.content.encode()).hexdigest()
+                if on_disk_hash == content_hash:
+                    continue
+
+            self.logger.debug(f"writing {unit_type} file: {unit.path}")
+            success, message = self.write_file(unit.path, unit.content)
+            if not success:
                 raise ValueError(
-                    f"failed to execute daemon-reload. error: {result.stderr}"
+                    f"failed to write systemd {unit_type} {unit.path.name}. error: {message}"
+                )
+            files_changed = True
+            if not is_new:
+                # a socket is part of its service and restarts with it
+                changed_services.update(unit.service_names())
+
+        known_units = set(wanted_units + socket_services)
+        service_ids = sorted({unit.service_id for unit in units})
+        rendered_paths = {unit.path for unit in units}
+        stale_files = [
+            self.systemd_root_dir / f"{service_id}{stem}{suffix}"
+            for service_id in service_ids
+            for stem in ("", "@")
+            for suffix in (".socket", ".service")
+        ]
+        stale_files = [f for f in stale_files if f not in rendered_paths and f.exists()]
+
+        systemd = self.get_systemd()
+        try:
+            patterns = [
+                pattern
+                for service_id in service_ids
+                for pattern in (f"{service_id}.*", f"{service_id}@*")
+            ]
+            stale_units = [
+                unit for unit in systemd.list_units(patterns) if unit not in known_units
+            ]
+            if len(stale_units) > 0:
+                # stopped first, an old socket would hold the port of a new one
+                self.logger.debug(f"stopping stale units: {stale_units}")
+                self.check_jobs(
+                    systemd.run_jobs(
+                        [UnitJob(method="StopUnit", unit=unit) for unit in stale_units]
+                    )
                 )
+                systemd.disable(stale_units)
+            for stale_file in stale_files:
+                self.logger.debug(f"removing stale unit file: {stale_file}")
+                stale_file.unlink(missing_ok=True)
+                files_changed = True
+            if files_changed:
+                self.logger.debug("reloading daemon")
+                systemd.reload()
+
+            states = {s.name: s for s in systemd.get_unit_states(wanted_units)}
+            disabled_units = [
+                unit
+                for unit in wanted_units
+                if states[unit].unit_file_state != "enabled"
+            ]
+            if len(disabled_units) > 0:
+                self.logger.debug(f"enabling units: {disabled_units}")
+                systemd.enable(disabled_units)
+            stopped_units = [
+                unit for unit in wanted_units if states[unit].active_state != "active"
+            ]
+
+            jobs = [UnitJob(method="StartUnit", unit=unit) for unit in stopped_units]
+            jobs += [
+                UnitJob(method="RestartUnit", unit=unit)
+                for unit in sorted(changed_services)
+                if unit not in stopped_units
+            ]
+            if release_changed:
+                jobs += [
+                    UnitJob(method="RestartUnit", unit=unit)
+                    for unit in socket_services
+                    if unit not in changed_services
+                    and f"{unit.removesuffix('.service')}.socket" not in stopped_units
+                ]
+                jobs += [
+                    UnitJob(method="ReloadUnit", unit=unit)
+                    for unit in services
+                    if unit not in changed_services and unit not in stopped_units
+                ]
 
-        if len(existing_socket_services) > 0:
-            args = ["sudo", "systemctl", "restart", *existing_socket_services]
             self.logger.debug(
-                f"restarting existing sockets: {existing_socket_services}"
+                f"running systemd jobs: {[(j.method, j.unit) for j in jobs]}"
             )
-            result = subprocess.run(args, capture_output=True, text=True)
-            if result.returncode != 0:
-                raise ValueError(
-                    f"failed to restart existing sockets. error: {result.stderr}"
-                )
+            self.check_jobs(systemd.run_jobs(jobs))
 
-        if len(existing_services) > 0:
-            args = ["sudo", "systemctl", "reload", *existing_services]
-            self.logger.debug(f"reloading existing services: {existing_services}")
-            result = subprocess.run(args, capture_output=True, text=True)
-            if result.returncode != 0:
+            not_running = [
+                s.name
+                for s in systemd.get_unit_states(wanted_units)
+                if s.active_state != "active"
+            ]
+            if len(not_running) > 0:
                 raise ValueError(
-                    f"failed to restart existing services. error: {result.stderr}"
+                    f"some systemd units aren't running: {', '.join(not_running)}"
                 )
+        finally:
+            systemd.close()
 
-        stat = os.system(
-            f"sudo systemctl status --no-pager {' '.join(set([*new_sockets, *existing_sockets, *existing_services]))}"
-        )
-        if stat != 0:
-            raise ValueError("some systemd units aren't running.")
+        return True
+
+    @staticmethod
+    def check_jobs(results: list[UnitJobResult]):
+        failed = [r for r in results if r.result != "done"]
+        if len(failed) > 0:
+            raise ValueError(
+                f"failed to start/stop/restart/reload units: {', '.join(f'{r.unit} ({r.result})' for r in failed)}"
+            )
+
+    def wait_until_ready(self, daemons: list[Daemon], project_code: str, mode: str):
+        probes = []
+        for d in daemons:
+            service_id = f"{self.get_application_id(project_code, mode)}-{d.name}"
+            timeout = d.ready_timeout or self.ready_timeout
+            instances = d.instances or 1
+            for i in range(instances):
+                port = d.port + i if d.port else None
+                unit = f"{service_id}.service"
+                if instances > 1:
+                    unit = f"{service_id}@{port or i + 1}.service"
+                probes.append(
+                    Probe(
+                        unit=unit,
+                        port=port,
+                        health_path=d.health_path,
+                        timeout=timeout,
+                        settle=min(self.ready_settle, timeout / 2),
+                    )
+                )
 
+        systemd = self.get_systemd()
+        try:
+            results = wait_until_ready(probes, systemd, self.logger)
+        finally:
+            systemd.close()
+        not_ready = [f"{r.unit} ({r.message})" for r in results if not r.ready]
+        if len(not_ready) > 0:
+            raise ValueError(f"some units aren't ready: {', '.join(not_ready)}")
+        self.logger.info(f"verified readiness of {len(results)} units")
         return True
 
+    def get_systemd(self) -> SystemdBus | Systemctl:
+        try:
+            return SystemdBus.connect(self.logger)
+        except Exception as ex:
+            self.logger.warning(
+                f"couldn't connect to the system bus, using systemctl instead. error: {ex}"
+            )
+            return Systemctl(self.logger)
+
     def run_database_migrations(self, root_dir: Path, db_conn_str: str):
         db_migrations_dir = root_dir / "db" / "migrations"
         is_dir_exists = db_migrations_dir.exists()
@@ -276,12 +596,7 @@ class Deployer:
             db_migrations_dir.as_posix(),
             "up",
         ]
-        result = subprocess.run(
-            args,
-            env=dict(os.environ, DATABASE_URL=db_conn_str),
-            capture_output=True,
-            text=True,
-        )
+        result = self.run(args, env=dict(os.environ, DATABASE_URL=db_conn_str))
         if result.returncode != 0:
             self.logger.error(
                 f"failed to run db migrations: {result.stderr}, stderr: {result.stderr}, stdout: {result.stdout}"
@@ -299,31 +614,46 @@ class Deployer:
         pip_index_url: str,
         pip_index_user: str,
         pip_index_auth: str,
+        release_dir: Path,
+        version: str = None,
     ) -> tuple[Path, Path, Path]:
         application_dir = self.get_application_dir(project_code, mode)
-        venv_dir = self.get_venv_dir(application_dir)
+        venv_dir = self.get_venv_dir(release_dir)
         if not venv_dir.exists():
-            venv.create(venv_dir, with_pip=True, upgrade_deps=True)
+            self.venv_template.clone(venv_dir)
         self.logger.info(f"verified venv")
 
         py_exec, pip_exec = self.get_executables(venv_dir)
-        priv_url = modifiers.add_auth_to_url(
-            pip_index_url, pip_index_auth, pip_index_user
-        )
-        args = [
-            str(pip_exec),
-            "install",
-            "--upgrade",
-            "--index-url",
-            priv_url,
-            pip_package_name,
-        ]
-        result = subprocess.run(
-            args, cwd=application_dir, capture_output=True, text=True
-        )
-        if result.returncode != 0:
-            raise ValueError(
-                f"failed to install/update package: {pip_package_name}. error: {result.stderr}"
+        self.wheelhouse.setup()
+
+        # the released version is usually in the wheelhouse already, either
+        # from another mode of the same project or from a previous attempt
+        if version is not None:
+            args = [
+                str(pip_exec),
+                "install",
+                "--upgrade",
+                "--no-index",
+                "--find-links",
+                str(self.wheelhouse.links_dir),
+                f"{pip_package_name}=={version}",
+            ]
+            result = self.run(args, cwd=application_dir)
+            if result.returncode == 0:
+                self.logger.info(f"installed {pip_package_name} from the wheelhouse")
+            else:
+                self.logger.debug(
+                    f"couldn't install {pip_package_name} from the wheelhouse. error: {result.stderr}"
+                )
+        if version is None or result.returncode != 0:
+            self.install_pip_package_online(
+                application_dir=application_dir,
+                pip_exec=pip_exec,
+                pip_package_name=pip_package_name,
+                pip_index_url=pip_index_url,
+                pip_index_user=pip_index_user,
+                pip_index_auth=pip_index_auth,
+                version=version,
             )
         self.logger.info(f"verified package {pip_package_name}")
 
@@ -352,6 +682,68 @@ class Deployer:
 
         return pkg_dir, py_exec, pip_exec
 
+    def install_pip_package_online(
+        self,
+        application_dir: Path,
+        pip_exec: Path,
+        pip_package_name: str,
+        pip_index_url: str,
+        pip_index_user: str,
+        pip_index_auth: str,
+        version: str = None,
+    ):
+        priv_url = modifiers.add_auth_to_url(
+            pip_index_url, pip_index_auth, pip_index_user
+        )
+        # the deployment's version, not whatever the index resolves to
+        requirement = (
+            f"{pip_package_name}=={version}"
+            if version is not None
+            else pip_package_name
+        )
+        with tempfile.TemporaryDirectory() as wheels_dir:
+            # resolve into wheels first so they can be kept in the wheelhouse,
+            # pip picks wheels from the wheelhouse over downloading them again
+            args = [
+                str(pip_exec),
+                "wheel",
+                "--wheel-dir",
+                wheels_dir,
+                "--find-links",
+                str(self.wheelhouse.links_dir),
+                "--index-url",
+                priv_url,
+                requirement,
+            ]
+            result = self.run(args, cwd=application_dir)
+            if result.returncode != 0:
+                raise ValueError(
+                    f"failed to download package: {pip_package_name}. error: {result.stderr}"
+                )
+
+            args = [
+                str(pip_exec),
+                "install",
+                "--upgrade",
+                "--no-index",
+                "--find-links",
+                wheels_dir,
+                requirement,
+            ]
+            result = self.run(args, cwd=application_dir)
+            if result.returncode != 0:
+                raise ValueError(
+                    f"failed to install/update package: {pip_package_name}. error: {result.stderr}"
+                )
+
+            try:
+                added = self.wheelhouse.add_all(Path(wheels_dir))
+                self.logger.debug(f"added {added} wheels to the wheelhouse")
+                self.wheelhouse.prune()
+            except Exception as ex:
+                # the wheelhouse is only a cache
+                self.logger.warning(f"failed to update the wheelhouse. error: {ex}")
+
     def verify_os_configuration(self, project_code: str, mode: str):
         os_user = project_code
         os_group = project_code
@@ -359,9 +751,7 @@ class Deployer:
 
         for group in os_groups:
             if not self.is_os_group_exists(group):
-                result = subprocess.run(
-                    ["groupadd", group], capture_output=True, text=True
-                )
+                result = self.run(["groupadd", group])
                 if result.returncode != 0:
                     raise ValueError(
                         f"failed to create os group: {group} stderr: {result.stderr}, stdout: {result.stdout}"
@@ -384,7 +774,7 @@ class Deployer:
                 user_groups,
                 os_user,
             ]
-            result = subprocess.run(args, capture_output=True, text=True)
+            result = self.run(args)
             if result.returncode != 0:
                 raise ValueError(f"failed to create os user: {os_user}")
             os.chmod(user_home, 0o750)
@@ -537,12 +927,18 @@ class Deployer:
             return False
 
     def write_file(self, file: str | Path, content: str):
+        # written aside and renamed so readers never see a partial file
+        tmp_file = Path(file).with_name(f".{Path(file).name}.tmp")
         try:
-            with open(file, "w") as f:
-                try:
+            try:
+                with open(tmp_file, "w") as f:
                     f.write(content)
-                    return True, "file saved successfully."
-                except (IOError, OSError):
-                    return False, f"failed to write to file. file: {file}"
+                os.replace(tmp_file, file)
+            except BaseException:
+                # never left behind in the release or systemd directory
+                with suppress(OSError):
+                    tmp_file.unlink(missing_ok=True)
+                raise
+            return True, "file saved successfully."
         except (FileNotFoundError, PermissionError, OSError):
-            return False, f"failed to open file for writing. file: {file}"
+            return False, f"failed to write to file. file: {file}"
@@ -0,0 +1,70 @@
+import threading
+from logging import Logger
+from typing import Callable
+
+
+class ChunkedLog:
+    """
+    Collects output lines into chunks of about chunk_size characters and
+    hands each one to flush along with its position in the whole log. A
+    partial chunk is flushed every interval so the log can be tailed while
+    it grows, and nothing more than one chunk is ever held in memory.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[int, str], None],
+        logger: Logger,
+        chunk_size: int = 16 * 1024,
+        interval: float = 1.0,
+    ):
+        self.logger: Logger = logger
+        self.flush_chunk = flush
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.position = 0
+        self.lines: list[str] = []
+        self.size = 0
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, line: str):
+        with self.lock:
+            self.lines.append(f"{line}\n")
+            self.size += len(line) + 1
+            if self.size >= self.chunk_size:
+                self.flush()
+
+    def run(self):
+        while not self.closed.wait(self.interval):
+            with self.lock:
+                self.flush()
+
+    def flush(self):
+        # the lock is held by the caller
+        if self.size == 0:
+            return
+        content = "".join(self.lines)
+        self.lines.clear()
+        self.size = 0
+        try:
+            self.flush_chunk(self.position, content)
+            self.position += len(content)
+        except Exception as ex:
+            # the log is only for watching, a deployment never fails because of it
+            self.logger.warning(f"failed to write deployment log. error: {ex}")
+
+    def close(self):
+        self.closed.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        with self.lock:
+            self.flush()
@@ -0,0 +1,144 @@
+import socket
+import threading
+import time
+import http.client
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from logging import Logger
+from pydantic import BaseModel
+
+
+class Probe(BaseModel):
+    unit: str
+    port: int | None = None
+    # probed with a GET when set. sockets of socket activated units accept
+    # connections before the app is up, so without a path a tcp connect only
+    # activates the service, which then has to stay up for settle seconds
+    health_path: str | None = None
+    timeout: float = 30
+    settle: float = 5
+
+
+class ProbeResult(BaseModel):
+    unit: str
+    ready: bool
+    message: str = ""
+
+
+def probe_tcp(port: int, timeout: float) -> tuple[bool, str]:
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=timeout):
+            return True, ""
+    except OSError as ex:
+        return False, str(ex)
+
+
+def probe_http(port: int, path: str, timeout: float) -> tuple[bool, str]:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        if 200 <= response.status < 400:
+            return True, ""
+        return False, f"responded with {response.status}"
+    except (OSError, http.client.HTTPException) as ex:
+        return False, str(ex)
+    finally:
+        connection.close()
+
+
+def wait_until_ready(
+    probes: list[Probe],
+    systemd,
+    logger: Logger,
+    interval: float = 0.5,
+    max_restarts: int = 2,
+) -> list[ProbeResult]:
+    """
+    Probes all units at once until each one answers, fails, restarts too
+    often or runs out of time. Units without a health path are ready once
+    their service has stayed active, without restarting, for the settle
+    window of their probe. The systemd state of the units is polled from the
+    calling thread in one batch per interval.
+    """
+    if len(probes) == 0:
+        return []
+    units = [p.unit for p in probes]
+    baseline = {s.name: s.n_restarts or 0 for s in systemd.get_unit_states(units)}
+    stopped = {p.unit: threading.Event() for p in probes}
+    activated = {p.unit: threading.Event() for p in probes}
+    settles = {p.unit: p.settle for p in probes if not p.health_path}
+    # unit -> (active since, restarts then)
+    active_since: dict[str, tuple[float, int]] = {}
+    results: dict[str, ProbeResult] = {}
+
+    def run(probe: Probe) -> ProbeResult:
+        deadline = time.monotonic() + probe.timeout
+        message = "timed out"
+        while not stopped[probe.unit].is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return ProbeResult(unit=probe.unit, ready=False, message=message)
+            if probe.health_path:
+                ready, message = probe_http(
+                    probe.port, probe.health_path, min(remaining, 5)
+                )
+                if ready:
+                    return ProbeResult(unit=probe.unit, ready=True)
+            elif activated[probe.unit].is_set():
+                # the polling loop decides once the unit has settled
+                message = f"didn't stay active for {probe.settle}s"
+            elif probe.port is None:
+                activated[probe.unit].set()
+                continue
+            else:
+                ready, message = probe_tcp(probe.port, min(remaining, 5))
+                if ready:
+                    activated[probe.unit].set()
+                    continue
+            stopped[probe.unit].wait(interval)
+        return ProbeResult(unit=probe.unit, ready=False, message="stopped")
+
+    with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+        futures = {executor.submit(run, p): p.unit for p in probes}
+        pending = set(futures)
+        while len(pending) > 0:
+            done, pending = wait(pending, timeout=interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit = futures[future]
+                results.setdefault(unit, future.result())
+
+            watched = [futures[f] for f in pending]
+            now = time.monotonic()
+            for state in systemd.get_unit_states(watched) if len(watched) > 0 else []:
+                n_restarts = state.n_restarts or 0
+                restarts = n_restarts - baseline.get(state.name, 0)
+                message = None
+                if state.active_state == "failed":
+                    message = "failed"
+                elif restarts >= max_restarts:
+                    message = f"restarted {restarts} times"
+                if message is not None:
+                    logger.debug(f"{state.name} isn't going to be ready: {message}")
+                    results[state.name] = ProbeResult(
+                        unit=state.name, ready=False, message=message
+                    )
+                    stopped[state.name].set()
+                    continue
+
+                if state.name not in settles:
+                    continue
+                if state.active_state != "active":
+                    active_since.pop(state.name, None)
+                    continue
+                since = active_since.get(state.name)
+                if since is None or since[1] != n_restarts:
+                    # the settle window starts over after every restart
+                    active_since[state.name] = (now, n_restarts)
+                elif (
+                    activated[state.name].is_set()
+                    and now - since[0] >= settles[state.name]
+                ):
+                    results[state.name] = ProbeResult(unit=state.name, ready=True)
+                    stopped[state.name].set()
+
+    return [results[p.unit] for p in probes]
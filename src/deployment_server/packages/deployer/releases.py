@@ -0,0 +1,101 @@
+import os
+import re
+import shutil
+from datetime import datetime
+from logging import Logger
+from pathlib import Path
+
+
+class Releases:
+    """
+    Every deployment is installed into its own directory under
+    <application dir>/releases and goes live by pointing the <application
+    dir>/current symlink to it. Units only know about current, so rolling
+    back is a symlink switch and a restart.
+
+    Release directories are named <prepared at>-<version>, they sort in the
+    order they were prepared in. Their mtimes can't tell, the units run in
+    current and change it with every file they create or remove there.
+    """
+
+    def __init__(self, logger: Logger):
+        self.logger: Logger = logger
+        self.keep = 5
+
+    def get_releases_dir(self, application_dir: Path) -> Path:
+        return application_dir / "releases"
+
+    def get_current_link(self, application_dir: Path) -> Path:
+        return application_dir / "current"
+
+    def get_current(self, application_dir: Path) -> Path | None:
+        current_link = self.get_current_link(application_dir)
+        if not current_link.is_symlink():
+            return None
+        return current_link.resolve()
+
+    def list(self, application_dir: Path) -> list[Path]:
+        """
+        :return: Releases, the oldest first.
+        """
+        releases_dir = self.get_releases_dir(application_dir)
+        if not releases_dir.exists():
+            return []
+        releases = [d for d in releases_dir.iterdir() if d.is_dir()]
+        return sorted(releases, key=lambda d: d.name)
+
+    @staticmethod
+    def get_version(release_dir: Path) -> str | None:
+        _, _, version = release_dir.name.partition("-")
+        return version or None
+
+    def prepare(self, application_dir: Path, version: str = None) -> Path:
+        now = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        version = re.sub(r"[^\w.+-]", "-", version) if version else None
+        current = self.get_current(application_dir)
+        for release_dir in self.list(application_dir):
+            # left over from a failed attempt, the live release is never touched
+            if version and self.get_version(release_dir) == version:
+                if release_dir.resolve() != current:
+                    shutil.rmtree(release_dir)
+        name = f"{now}-{version}" if version else now
+        release_dir = self.get_releases_dir(application_dir) / name
+        os.makedirs(release_dir)
+        self.logger.debug(f"prepared release {release_dir}")
+        return release_dir
+
+    def switch(self, application_dir: Path, release_dir: Path) -> Path | None:
+        """
+        Points current to the given release atomically.
+
+        :return: The release current pointed to before.
+        """
+        previous = self.get_current(application_dir)
+        current_link = self.get_current_link(application_dir)
+        tmp_link = application_dir / ".current.tmp"
+        tmp_link.unlink(missing_ok=True)
+        os.symlink(release_dir.relative_to(application_dir), tmp_link)
+        os.replace(tmp_link, current_link)
+        self.logger.info(f"switched current release to {release_dir.name}")
+        return previous
+
+    def get_previous(self, application_dir: Path) -> Path | None:
+        current = self.get_current(application_dir)
+        releases = self.list(application_dir)
+        if current not in releases:
+            return releases[-1] if len(releases) > 0 else None
+        index = releases.index(current)
+        return releases[index - 1] if index > 0 else None
+
+    def prune(self, application_dir: Path) -> int:
+        current = self.get_current(application_dir)
+        releases = self.list(application_dir)
+        removed = 0
+        for release_dir in releases[: max(len(releases) - self.keep, 0)]:
+            if release_dir == current:
+                continue
+            shutil.rmtree(release_dir, ignore_errors=True)
+            removed += 1
+        if removed > 0:
+            self.logger.debug(f"removed {removed} old releases")
+        return removed
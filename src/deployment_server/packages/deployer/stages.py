@@ -0,0 +1,77 @@
+import time
+from logging import Logger
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Stage:
+    """
+    A named step of a deployment. fn receives the results of the stages it
+    depends on, keyed by stage name.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[dict[str, Any]], Any],
+        depends_on: tuple[str, ...] = (),
+    ):
+        self.name = name
+        self.fn = fn
+        self.depends_on = depends_on
+
+
+def run_stages(stages: list[Stage], max_workers: int, logger: Logger) -> dict:
+    """
+    Runs the stages on a thread pool as soon as their dependencies are
+    completed, so independent stages overlap. Stops scheduling new stages on
+    the first failure and raises it once the running ones are finished.
+
+    :return: Results of all stages keyed by stage name.
+    """
+    pending = {s.name: s for s in stages}
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in pending:
+                raise ValueError(
+                    f"stage {stage.name} depends on an unknown stage: {dependency}"
+                )
+
+    results = {}
+    running = {}
+    started_at = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(pending) > 0 or len(running) > 0:
+            if error is None:
+                for name, stage in list(pending.items()):
+                    if all(d in results for d in stage.depends_on):
+                        del pending[name]
+                        dependencies = {d: results[d] for d in stage.depends_on}
+                        started_at[name] = time.monotonic()
+                        logger.debug(f"stage {name} started")
+                        running[executor.submit(stage.fn, dependencies)] = name
+            if len(running) == 0:
+                if error is not None:
+                    break
+                raise ValueError(
+                    f"stages can't be scheduled, check for cycles: {', '.join(pending)}"
+                )
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                elapsed = time.monotonic() - started_at[name]
+                try:
+                    results[name] = future.result()
+                    logger.debug(f"stage {name} completed in {elapsed:.2f}s")
+                except Exception as ex:
+                    logger.debug(f"stage {name} failed in {elapsed:.2f}s")
+                    if error is None:
+                        error = ValueError(f"stage {name} failed. error: {ex}")
+                        error.__cause__ = ex
+
+    if error is not None:
+        raise error
+
+    return results
@@ -0,0 +1,339 @@
+import subprocess
+import time
+from logging import Logger
+from pydantic import BaseModel
+from jeepney import DBusAddress, HeaderFields, MatchRule, MessageType, new_method_call
+from jeepney.bus_messages import message_bus
+from jeepney.io.blocking import open_dbus_connection
+
+
+systemd_manager = DBusAddress(
+    "/org/freedesktop/systemd1",
+    bus_name="org.freedesktop.systemd1",
+    interface="org.freedesktop.systemd1.Manager",
+)
+
+
+class UnitJob(BaseModel):
+    method: str  # StartUnit, StopUnit, RestartUnit or ReloadUnit
+    unit: str
+
+
+class UnitJobResult(BaseModel):
+    unit: str
+    result: str  # done, failed, timeout, canceled, dependency, skipped or an error
+
+
+class UnitState(BaseModel):
+    name: str
+    load_state: str
+    active_state: str
+    sub_state: str
+    # enabled, disabled, static... of the unit file, of the instance for templates
+    unit_file_state: str | None = None
+    n_restarts: int | None = None
+
+
+class SystemdBus:
+    """
+    Talks to the systemd manager over the system bus. Jobs are submitted
+    together and their completion signals are collected as they arrive, so a
+    deployment waits as long as its slowest unit rather than the sum of all.
+    """
+
+    def __init__(self, connection, logger: Logger):
+        self.logger: Logger = logger
+        self.connection = connection
+        self.timeout = 90
+        self.finished_jobs: dict[str, str] = {}
+
+    @classmethod
+    def connect(cls, logger: Logger):
+        return cls(open_dbus_connection(bus="SYSTEM"), logger)
+
+    def close(self):
+        self.connection.close()
+
+    def enable(self, units: list[str]):
+        self.call_many(
+            [
+                new_method_call(
+                    systemd_manager, "EnableUnitFiles", "asbb", (units, False, False)
+                )
+            ]
+        )
+
+    def disable(self, units: list[str]):
+        self.call_many(
+            [
+                new_method_call(
+                    systemd_manager, "DisableUnitFiles", "asb", (units, False)
+                )
+            ]
+        )
+
+    def reload(self):
+        self.call_many([new_method_call(systemd_manager, "Reload")])
+
+    def list_units(self, patterns: list[str]) -> list[str]:
+        """
+        :return: Names of the loaded units matching any of the patterns,
+            running instances of template units included.
+        """
+        replies = self.call_many(
+            [
+                new_method_call(
+                    systemd_manager, "ListUnitsByPatterns", "asas", ([], patterns)
+                )
+            ]
+        )
+        return [unit[0] for unit in replies[0].body[0]]
+
+    def run_jobs(self, jobs: list[UnitJob]) -> list[UnitJobResult]:
+        if len(jobs) == 0:
+            return []
+        deadline = time.monotonic() + self.timeout
+        rule = MatchRule(
+            type="signal",
+            sender=systemd_manager.bus_name,
+            interface=systemd_manager.interface,
+            member="JobRemoved",
+            path=systemd_manager.object_path,
+        )
+        self.call_many(
+            [message_bus.AddMatch(rule), new_method_call(systemd_manager, "Subscribe")],
+            deadline,
+        )
+
+        replies = self.call_many(
+            [
+                new_method_call(
+                    systemd_manager, job.method, "ss", (job.unit, "replace")
+                )
+                for job in jobs
+            ],
+            deadline,
+        )
+        pending = {}
+        results = {}
+        for job, reply in zip(jobs, replies):
+            if reply.header.message_type == MessageType.error:
+                results[job.unit] = self.describe_error(reply)
+            else:
+                pending[reply.body[0]] = job.unit
+
+        # signals of fast jobs may come before the replies of the others
+        while any(path not in self.finished_jobs for path in pending):
+            self.receive(deadline)
+        for path, unit in pending.items():
+            results[unit] = self.finished_jobs.pop(path)
+
+        return [UnitJobResult(unit=job.unit, result=results[job.unit]) for job in jobs]
+
+    def get_unit_states(self, units: list[str]) -> list[UnitState]:
+        if len(units) == 0:
+            return []
+        deadline = time.monotonic() + self.timeout
+        replies = self.call_many(
+            [
+                new_method_call(systemd_manager, "LoadUnit", "s", (unit,))
+                for unit in units
+            ],
+            deadline,
+        )
+        for unit, reply in zip(units, replies):
+            if reply.header.message_type == MessageType.error:
+                raise ValueError(
+                    f"failed to load unit {unit}. error: {self.describe_error(reply)}"
+                )
+
+        addresses = [
+            DBusAddress(
+                reply.body[0],
+                bus_name=systemd_manager.bus_name,
+                interface="org.freedesktop.DBus.Properties",
+            )
+            for reply in replies
+        ]
+        services = [
+            (unit, address)
+            for unit, address in zip(units, addresses)
+            if unit.endswith(".service")
+        ]
+        replies = self.call_many(
+            [
+                new_method_call(
+                    address, "GetAll", "s", ("org.freedesktop.systemd1.Unit",)
+                )
+                for address in addresses
+            ]
+            + [
+                new_method_call(
+                    address,
+                    "Get",
+                    "ss",
+                    ("org.freedesktop.systemd1.Service", "NRestarts"),
+                )
+                for _, address in services
+            ],
+            deadline,
+        )
+        n_restarts = {}
+        for (unit, _), reply in zip(services, replies[len(units) :]):
+            if reply.header.message_type != MessageType.error:
+                n_restarts[unit] = reply.body[0][1]
+
+        states = []
+        for unit, reply in zip(units, replies[: len(units)]):
+            if reply.header.message_type == MessageType.error:
+                raise ValueError(
+                    f"failed to read unit {unit}. error: {self.describe_error(reply)}"
+                )
+            # variants come as (signature, value) pairs
+            properties = {k: v[1] for k, v in reply.body[0].items()}
+            states.append(
+                UnitState(
+                    name=unit,
+                    load_state=properties["LoadState"],
+                    active_state=properties["ActiveState"],
+                    sub_state=properties["SubState"],
+                    unit_file_state=properties.get("UnitFileState"),
+                    n_restarts=n_restarts.get(unit),
+                )
+            )
+        return states
+
+    def call_many(self, messages: list, deadline: float = None) -> list:
+        """
+        Sends all messages before waiting for any reply.
+
+        :return: Replies in the order of the messages.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        serials = []
+        for message in messages:
+            serial = next(self.connection.outgoing_serial)
+            self.connection.send(message, serial=serial)
+            serials.append(serial)
+
+        replies = {}
+        while len(replies) < len(serials):
+            message = self.receive(deadline)
+            reply_serial = message.header.fields.get(HeaderFields.reply_serial)
+            if reply_serial in serials:
+                replies[reply_serial] = message
+
+        if (
+            len(messages) == 1
+            and replies[serials[0]].header.message_type == MessageType.error
+        ):
+            raise ValueError(self.describe_error(replies[serials[0]]))
+        return [replies[serial] for serial in serials]
+
+    def receive(self, deadline: float):
+        try:
+            message = self.connection.receive(
+                timeout=max(deadline - time.monotonic(), 0)
+            )
+        except TimeoutError:
+            raise ValueError("timed out waiting for systemd.")
+        fields = message.header.fields
+        if (
+            message.header.message_type == MessageType.signal
+            and fields.get(HeaderFields.member) == "JobRemoved"
+        ):
+            _, path, _, result = message.body
+            self.finished_jobs[path] = result
+        return message
+
+    @staticmethod
+    def describe_error(message) -> str:
+        error_name = message.header.fields.get(HeaderFields.error_name, "")
+        detail = message.body[0] if len(message.body) > 0 else ""
+        return f"{error_name} {detail}".strip()
+
+
+class Systemctl:
+    """
+    Same interface as SystemdBus over systemctl, for hosts without a
+    reachable system bus.
+    """
+
+    def __init__(self, logger: Logger):
+        self.logger: Logger = logger
+        self.verbs = {
+            "StartUnit": "start",
+            "StopUnit": "stop",
+            "RestartUnit": "restart",
+            "ReloadUnit": "reload",
+        }
+
+    def close(self):
+        pass
+
+    def enable(self, units: list[str]):
+        self.systemctl("enable", *units)
+
+    def disable(self, units: list[str]):
+        self.systemctl("disable", *units)
+
+    def reload(self):
+        self.systemctl("daemon-reload")
+
+    def list_units(self, patterns: list[str]) -> list[str]:
+        result = self.systemctl(
+            "list-units", "--all", "--plain", "--no-legend", "--full", *patterns
+        )
+        return [line.split()[0] for line in result.stdout.splitlines() if line.strip()]
+
+    def run_jobs(self, jobs: list[UnitJob]) -> list[UnitJobResult]:
+        results = {}
+        for method, verb in self.verbs.items():
+            units = [job.unit for job in jobs if job.method == method]
+            if len(units) == 0:
+                continue
+            result = subprocess.run(
+                ["sudo", "systemctl", verb, *units], capture_output=True, text=True
+            )
+            for unit in units:
+                results[unit] = (
+                    "done" if result.returncode == 0 else result.stderr.strip()
+                )
+        return [UnitJobResult(unit=job.unit, result=results[job.unit]) for job in jobs]
+
+    def get_unit_states(self, units: list[str]) -> list[UnitState]:
+        if len(units) == 0:
+            return []
+        result = self.systemctl(
+            "show",
+            "--property=Id,LoadState,ActiveState,SubState,UnitFileState,NRestarts",
+            *units,
+        )
+        # one block of key=value lines per unit, in the given order
+        states = []
+        for unit, block in zip(units, result.stdout.strip().split("\n\n")):
+            properties = dict(
+                line.split("=", 1) for line in block.splitlines() if "=" in line
+            )
+            states.append(
+                UnitState(
+                    name=unit,
+                    load_state=properties.get("LoadState", ""),
+                    active_state=properties.get("ActiveState", ""),
+                    sub_state=properties.get("SubState", ""),
+                    unit_file_state=properties.get("UnitFileState") or None,
+                    n_restarts=properties.get("NRestarts") or None,
+                )
+            )
+        return states
+
+    def systemctl(self, *args: str):
+        result = subprocess.run(
+            ["sudo", "systemctl", *args], capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise ValueError(
+                f"failed to execute systemctl {args[0]}. error: {result.stderr}"
+            )
+        return result
@@ -0,0 +1,84 @@
+import os
+import sys
+import shutil
+import tempfile
+import venv
+from logging import Logger
+from pathlib import Path
+
+
+class VenvTemplate:
+    """
+    Keeps one ready venv per python version and clones it into applications.
+    Files are hardlinked (copied when the template is on another device)
+    except the few ones that embed the venv path, which are rewritten.
+    pip replaces files rather than writing into them so the applications
+    never modify the template through the links.
+    """
+
+    def __init__(self, root_dir: Path, logger: Logger):
+        self.logger: Logger = logger
+        self.root_dir = root_dir
+        self.upgrade_deps = True
+
+    def get_template_dir(self) -> Path:
+        return (
+            self.root_dir / f"python{sys.version_info.major}.{sys.version_info.minor}"
+        )
+
+    def build(self) -> Path:
+        template_dir = self.get_template_dir()
+        if template_dir.exists():
+            return template_dir
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        # built aside and renamed so a template is either complete or missing
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.root_dir, prefix=".build-"))
+        build_dir = tmp_dir / template_dir.name
+        venv.create(build_dir, with_pip=True, upgrade_deps=self.upgrade_deps)
+        self.rewrite_paths(build_dir, build_dir, template_dir)
+        try:
+            os.rename(build_dir, template_dir)
+            self.logger.info(f"built venv template {template_dir}")
+        except OSError:
+            # someone else built it in the meantime
+            pass
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return template_dir
+
+    def clone(self, venv_dir: Path):
+        template_dir = self.build()
+        tmp_dir = venv_dir.with_name(f".{venv_dir.name}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.copytree(
+            template_dir, tmp_dir, symlinks=True, copy_function=self.link_or_copy
+        )
+        self.rewrite_paths(tmp_dir, template_dir, venv_dir)
+        os.rename(tmp_dir, venv_dir)
+        self.logger.debug(f"cloned venv template into {venv_dir}")
+
+    @staticmethod
+    def link_or_copy(src: str, dst: str):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    @staticmethod
+    def rewrite_paths(venv_dir: Path, old_dir: Path, new_dir: Path):
+        old, new = str(old_dir).encode(), str(new_dir).encode()
+        files = [venv_dir / "pyvenv.cfg"] + [
+            f
+            for f in (venv_dir / "bin").iterdir()
+            if f.is_file() and not f.is_symlink()
+        ]
+        for f in files:
+            content = f.read_bytes()
+            if old not in content:
+                continue
+            # written as a new file so a hardlinked original stays intact
+            mode = f.stat().st_mode
+            f.unlink()
+            f.write_bytes(content.replace(old, new))
+            os.chmod(f, mode)
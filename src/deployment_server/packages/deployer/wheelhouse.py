@@ -0,0 +1,108 @@
+import os
+import re
+import shutil
+import hashlib
+from logging import Logger
+from pathlib import Path
+
+
+wheel_file_name_re = re.compile(
+    r"^(?P<name>[^-]+)-(?P<version>[^-]+)(-(?P<build>\d[^-]*))?"
+    r"-(?P<tags>[^-]+-[^-]+-[^-]+)\.whl$"
+)
+
+
+class Wheelhouse:
+    """
+    A local store of wheels shared by all projects and modes. Wheels are kept
+    under a key of their name, version and tags and are exposed to pip as a
+    flat --find-links directory. The least recently used ones are removed when
+    the store grows over its disk budget.
+    """
+
+    def __init__(self, root_dir: Path, max_bytes: int, logger: Logger):
+        self.logger: Logger = logger
+        self.root_dir = root_dir
+        self.objects_dir = root_dir / "objects"
+        self.links_dir = root_dir / "links"
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(wheel_file_name: str) -> str:
+        matches = wheel_file_name_re.match(wheel_file_name)
+        if matches is None:
+            raise ValueError(f"invalid wheel file name: {wheel_file_name}")
+        name = re.sub(r"[-_.]+", "_", matches.group("name")).lower()
+        parts = [
+            name,
+            matches.group("version"),
+            matches.group("build") or "",
+            matches.group("tags"),
+        ]
+        return hashlib.sha256("/".join(parts).encode()).hexdigest()
+
+    def setup(self):
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.links_dir, exist_ok=True)
+
+    def add(self, wheel_file: Path) -> bool:
+        """
+        Adds a wheel unless it's already there, marks it as recently used either way.
+
+        :return: True if the wheel is new.
+        """
+        object_dir = self.objects_dir / self.key(wheel_file.name)
+        object_file = object_dir / wheel_file.name
+        link_file = self.links_dir / wheel_file.name
+        is_new = not object_file.exists()
+        if is_new:
+            # copy under a temporary name so a half written wheel is never visible
+            os.makedirs(object_dir, exist_ok=True)
+            tmp_file = object_dir / f".{wheel_file.name}.tmp"
+            shutil.copyfile(wheel_file, tmp_file)
+            os.replace(tmp_file, object_file)
+        if not link_file.exists():
+            os.link(object_file, link_file)
+        os.utime(object_dir)
+        return is_new
+
+    def add_all(self, wheels_dir: Path) -> int:
+        count = 0
+        for wheel_file in Path(wheels_dir).glob("*.whl"):
+            if self.add(wheel_file):
+                count += 1
+        return count
+
+    def prune(self) -> int:
+        """
+        Removes the least recently used wheels until the store fits its budget.
+
+        :return: Number of wheels removed.
+        """
+        entries = []
+        total_bytes = 0
+        for object_dir in self.objects_dir.iterdir():
+            files = [f for f in object_dir.iterdir() if f.suffix == ".whl"]
+            stats = [f.stat() for f in files]
+            size = sum(st.st_size for st in stats)
+            # pip reading a wheel through the links dir updates the shared
+            # inode's atime (relatime), adding a wheel updates the dir mtime
+            last_used = max(
+                [object_dir.stat().st_mtime] + [st.st_atime for st in stats]
+            )
+            entries.append((last_used, object_dir, files, size))
+            total_bytes += size
+
+        removed = 0
+        for last_used, object_dir, files, size in sorted(entries, key=lambda e: e[0]):
+            if total_bytes <= self.max_bytes:
+                break
+            for f in files:
+                (self.links_dir / f.name).unlink(missing_ok=True)
+            shutil.rmtree(object_dir, ignore_errors=True)
+            total_bytes -= size
+            removed += 1
+
+        if removed > 0:
+            self.logger.debug(f"removed {removed} least recently used wheels")
+        return removed
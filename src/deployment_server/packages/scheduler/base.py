@@ -0,0 +1,99 @@
+import heapq
+import threading
+from logging import Logger
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+
+class Scheduler:
+    """
+    Keeps scheduled deployments in a time ordered heap and fires each of them
+    when it's due. The thread sleeps until the earliest deployment is due or a
+    new one is added, there is no polling.
+
+    fire gets the instant the deployment was due at, so that promoting it
+    doesn't depend on the database clock agreeing with this one. A
+    deployment whose fire raises is tried again after retry_interval.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        load: Callable[[], list[tuple[str, datetime]]],
+        fire: Callable[[str, datetime], None],
+        retry_interval: timedelta = timedelta(seconds=5),
+    ):
+        self.logger: Logger = logger
+        self.load = load
+        self.fire = fire
+        self.retry_interval = retry_interval
+        self.heap: list[tuple[datetime, str]] = []
+        self.entries: set[tuple[datetime, str]] = set()
+        self.condition = threading.Condition()
+        self.thread: threading.Thread | None = None
+        self.running = False
+
+    def start(self):
+        for deployment_rid, scheduled_to_run_at in self.load():
+            self.add(deployment_rid, scheduled_to_run_at)
+        self.running = True
+        self.thread = threading.Thread(
+            target=self.run, name="deployment-scheduler", daemon=True
+        )
+        self.thread.start()
+        self.logger.debug(f"scheduler started with {len(self.heap)} deployments.")
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def add(self, deployment_rid: str, scheduled_to_run_at: datetime):
+        if scheduled_to_run_at.tzinfo is None:
+            scheduled_to_run_at = scheduled_to_run_at.replace(tzinfo=timezone.utc)
+        entry = (scheduled_to_run_at, deployment_rid)
+        with self.condition:
+            if entry in self.entries:
+                return
+            self.entries.add(entry)
+            heapq.heappush(self.heap, entry)
+            # wake up in case this one is due earlier than the current head
+            self.condition.notify()
+
+    def pop_due(self) -> list[tuple[datetime, str]]:
+        now = datetime.now(timezone.utc)
+        due = []
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            self.entries.discard(entry)
+            due.append(entry)
+        return due
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                due = self.pop_due()
+                if len(due) == 0:
+                    timeout = None
+                    if len(self.heap) > 0:
+                        timeout = (
+                            self.heap[0][0] - datetime.now(timezone.utc)
+                        ).total_seconds()
+                    self.condition.wait(timeout)
+                    continue
+            for due_at, deployment_rid in due:
+                try:
+                    self.fire(deployment_rid, due_at)
+                except Exception as ex:
+                    self.logger.error(
+                        f"failed to fire scheduled deployment {deployment_rid}, retrying. error: {ex}"
+                    )
+                    # the database or the broker may be back by then
+                    self.add(
+                        deployment_rid, datetime.now(timezone.utc) + self.retry_interval
+                    )
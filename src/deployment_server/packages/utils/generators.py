@@ -1,6 +1,9 @@
 import jinja2
 
 
+default_resource_controls = {"MemoryMax": "512M", "CPUQuota": "50%", "TasksMax": "50"}
+
+
 template_socket = """\
 [Unit]
 Description={{ service_id }} socket.
@@ -23,8 +26,8 @@ Description={{ service_id }} service.
 Type=exec
 User={{ user }}
 Group={{ group }}
-WorkingDirectory={{ application_dir }}
-Environment=PYTHONPATH={{ application_dir }}
+WorkingDirectory={{ working_dir }}
+Environment=PYTHONPATH={{ working_dir }}
 Environment=PYTHONUNBUFFERED=1
 Environment=DEBUG=0
 Environment=APPLICATION_MODE={{ mode }}
@@ -55,9 +58,7 @@ ReadWritePaths={{ write_paths }}
 #BindPaths={{ write_paths }}
 
 # resource limits
-MemoryMax=512M
-CPUQuota=50%
-TasksMax=50
+{{ resource_controls }}
 
 # logging
 StandardOutput=journal
@@ -80,8 +81,8 @@ After=network.target
 Type=exec
 User={{ user }}
 Group={{ group }}
-WorkingDirectory={{ application_dir }}
-Environment=PYTHONPATH={{ application_dir }}
+WorkingDirectory={{ working_dir }}
+Environment=PYTHONPATH={{ working_dir }}
 Environment=PYTHONUNBUFFERED=1
 Environment=DEBUG=0
 Environment=APPLICATION_MODE={{ mode }}
@@ -114,9 +115,7 @@ ReadWritePaths={{ write_paths }}
 #BindPaths={{ write_paths }}
 
 # resource limits
-MemoryMax=512M
-CPUQuota=50%
-TasksMax=50
+{{ resource_controls }}
 
 # logging
 StandardOutput=journal
@@ -298,6 +297,12 @@ server {
 """
 
 
+def render_resource_controls(resource_controls: dict[str, str | None] = None) -> str:
+    # a None value drops the directive, default included
+    directives = {**default_resource_controls, **(resource_controls or {})}
+    return "\n".join(f"{k}={v}" for k, v in directives.items() if v is not None)
+
+
 def systemd_service_with_socket(
     service_id,
     application_dir: str,
@@ -309,6 +314,8 @@ def systemd_service_with_socket(
     port: str | int,
     os_user: str,
     os_group: str,
+    working_dir: str = None,
+    resource_controls: dict[str, str | None] = None,
 ):
     template = jinja2.Environment(
         loader=jinja2.BaseLoader(), keep_trailing_newline=True, lstrip_blocks=True
@@ -327,6 +334,7 @@ def systemd_service_with_socket(
     service = template.render(
         service_id=service_id,
         application_dir=application_dir,
+        working_dir=working_dir or application_dir,
         application_logs_dir=application_logs_dir,
         application_data_dir=application_data_dir,
         application_config_dir=application_config_dir,
@@ -336,6 +344,7 @@ def systemd_service_with_socket(
         exec_start=exec_start,
         user=os_user,
         group=os_group,
+        resource_controls=render_resource_controls(resource_controls),
     )
 
     template = jinja2.Environment(
@@ -355,6 +364,8 @@ def systemd_service(
     exec_start: str,
     os_user: str,
     os_group: str,
+    working_dir: str = None,
+    resource_controls: dict[str, str | None] = None,
 ):
     template = jinja2.Environment(
         loader=jinja2.BaseLoader(), keep_trailing_newline=True, lstrip_blocks=True
@@ -373,6 +384,7 @@ def systemd_service(
     return template.render(
         service_id=service_id,
         application_dir=application_dir,
+        working_dir=working_dir or application_dir,
         application_logs_dir=application_logs_dir,
         application_data_dir=application_data_dir,
         application_config_dir=application_config_dir,
@@ -382,6 +394,7 @@ def systemd_service(
         exec_start=exec_start,
         user=os_user,
         group=os_group,
+        resource_controls=render_resource_controls(resource_controls),
     )
 
 
@@ -0,0 +1,34 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(created_at: datetime, rid: str) -> str:
+    """
+    Encodes the (created_at, rid) key of the last row of a page into an
+    opaque cursor for the next page.
+    """
+    raw = json.dumps([created_at.isoformat(), rid], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, rid = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(rid)
+    except (ValueError, TypeError) as ex:
+        raise ValueError(f"failed to decode cursor. error: {ex}")
+
+
+def parse_expand(expand: str | None, allowed: tuple[str, ...]) -> set[str]:
+    """
+    Parses a comma separated list of relationships to include.
+    """
+    if expand is None:
+        return set()
+    names = {x.strip() for x in expand.split(",") if x.strip() != ""}
+    unknown = names - set(allowed)
+    if len(unknown) > 0:
+        raise ValueError(f"failed to expand {', '.join(sorted(unknown))}.")
+    return names
@@ -0,0 +1,51 @@
+from typing import Any, Iterable, Type
+import orjson
+from sqlalchemy import inspect
+from starlette.responses import Response
+
+
+class FastJSONResponse(Response):
+    """
+    Renders with orjson, which handles datetimes and enums itself.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+class Serializer:
+    """
+    Turns rows of a SQLAlchemy model into plain dicts of their columns. The
+    column list is read from the mapper once, and no validation is done
+    since the values come from the database.
+    """
+
+    def __init__(
+        self,
+        model: Type,
+        exclude: Iterable[str] = (),
+        relationships: dict[str, "Serializer"] = None,
+    ):
+        excluded = set(exclude)
+        self.columns: tuple[str, ...] = tuple(
+            attr.key for attr in inspect(model).column_attrs if attr.key not in excluded
+        )
+        self.relationships = relationships or {}
+
+    def dump(self, obj, expand: Iterable[str] = ()) -> dict:
+        item = {name: getattr(obj, name) for name in self.columns}
+        # relationships are only present when expanded, and only loaded then
+        for name in expand:
+            value = getattr(obj, name)
+            serializer = self.relationships[name]
+            if isinstance(value, list):
+                item[name] = serializer.dump_many(value)
+            else:
+                item[name] = None if value is None else serializer.dump(value)
+        return item
+
+    def dump_many(self, objs: Iterable, expand: Iterable[str] = ()) -> list[dict]:
+        expand = tuple(expand)
+        return [self.dump(obj, expand) for obj in objs]
@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+
+
+# scrypt parameters, around 50ms and 16 MiB per verification
+scrypt_n = 2**14
+scrypt_r = 8
+scrypt_p = 1
+
+
+def generate_token(token_rid: str) -> tuple[str, str]:
+    """
+    :return: The token to hand out once, and the secret part of it to hash.
+    """
+    secret = secrets.token_urlsafe(32)
+    return f"{token_rid}.{secret}", secret
+
+
+def split_token(token: str) -> tuple[str, str] | None:
+    token_rid, _, secret = token.partition(".")
+    if len(token_rid) == 0 or len(secret) == 0:
+        return None
+    return token_rid, secret
+
+
+def hash_secret(secret: str) -> str:
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(
+        secret.encode(), salt=salt, n=scrypt_n, r=scrypt_r, p=scrypt_p
+    )
+    encoded = [base64.b64encode(x).decode() for x in (salt, digest)]
+    return f"scrypt${scrypt_n}${scrypt_r}${scrypt_p}${encoded[0]}${encoded[1]}"
+
+
+def verify_secret(secret: str, hashed: str) -> bool:
+    try:
+        algorithm, n, r, p, salt, digest = hashed.split("$")
+        if algorithm != "scrypt":
+            return False
+        expected = base64.b64decode(digest)
+        actual = hashlib.scrypt(
+            secret.encode(),
+            salt=base64.b64decode(salt),
+            n=int(n),
+            r=int(r),
+            p=int(p),
+            dklen=len(expected),
+        )
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+class TokenCache:
+    """
+    Remembers recently verified tokens by a fast digest of them, so that the
+    slow hash is checked once per token per ttl rather than on every
+    request. Revoked tokens are evicted here, other processes notice within
+    the ttl.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        # digest -> (project rid, token rid, verified at)
+        self.entries: OrderedDict[bytes, tuple[str, str, float]] = OrderedDict()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> str | None:
+        """
+        :return: The project rid of the token, if it is verified and fresh.
+        """
+        key = self.digest(token)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[2] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, token: str, project_rid: str, token_rid: str):
+        if self.max_size <= 0:
+            return
+        key = self.digest(token)
+        self.entries[key] = (project_rid, token_rid, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def evict(self, token_rid: str):
+        for key in [k for k, v in self.entries.items() if v[1] == token_rid]:
+            del self.entries[key]
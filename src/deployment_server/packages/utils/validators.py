@@ -168,3 +168,19 @@ def nginx_upstream_name(name: str):
         except UnicodeError:
             return False
     return False
+
+
+memory_size_units = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def memory_size_bytes(value: str):
+    """
+    Convert a systemd memory size like 512M to bytes.
+
+    Returns None for infinity and percentages, they can't be compared.
+    """
+    matches = re.match(r"^(\d+)([KMGT]?)$", value)
+    if not matches:
+        return None
+    number, unit = matches.groups()
+    return int(number) * memory_size_units.get(unit, 1)
@@ -1,13 +1,15 @@
 from datetime import datetime, timezone
-from typing import Callable, AsyncContextManager, ContextManager
+from typing import Callable, AsyncContextManager
 from pydantic import BaseModel
-from sqlalchemy import select, update, and_, text
+from sqlalchemy import select, update, insert, and_, text, tuple_
+from sqlalchemy.dialects.postgresql import distinct_on
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import selectinload
 from deployment_server.models import (
     Deployment,
     DeploymentStatusUpdate,
     DeploymentStatus,
+    DeploymentLog,
     Project,
 )
 
@@ -54,24 +56,10 @@ def repr_latest_status(
 class DeploymentRepository:
     def __init__(
         self,
-        session_factory: (
-            Callable[[], AsyncContextManager[AsyncSession]]
-            | Callable[[], ContextManager[Session]]
-        ),
+        session_factory: Callable[[], AsyncContextManager[AsyncSession]],
     ):
         self.session_factory = session_factory
         self.query_latest_status = """
-WITH latest_status AS (
-    SELECT
-        rid,
-        deployment_rid,
-        status,
-        description,
-        created_at,
-        ROW_NUMBER() OVER (PARTITION BY deployment_rid ORDER BY created_at DESC) as rn
-    FROM deployment_status_update
-    WHERE removed_at IS NULL
-)
 SELECT
     p.rid as project_rid,
     p.name as project_name,
@@ -79,15 +67,103 @@ SELECT
     d.rid as deployment_rid,
     d.version,
     d.mode,
-    ls.status,
-    ls.rid
+    d.status,
+    d.status_rid
 FROM deployment d
 JOIN project p ON d.project_rid = p.rid
-JOIN latest_status ls ON d.rid = ls.deployment_rid
-WHERE d.removed_at IS NULL
+WHERE d.status = 'READY'
+    AND d.removed_at IS NULL
     AND p.removed_at IS NULL
-    AND ls.status = 'READY'
 ORDER BY d.created_at DESC;
+"""
+        # locks a ready deployment and marks its latest status as running
+        # in one statement, so concurrent workers never claim the same deployment
+        self.query_claim = """
+WITH claimed AS (
+    UPDATE deployment_status_update s
+    SET status = 'RUNNING', updated_at = now()
+    WHERE s.rid = (
+        SELECT d.status_rid
+        FROM deployment d
+        JOIN project p ON p.rid = d.project_rid
+        WHERE d.rid = :deployment_rid
+            AND d.status = 'READY'
+            AND d.removed_at IS NULL
+            AND p.removed_at IS NULL
+        FOR UPDATE OF d SKIP LOCKED
+    )
+    AND s.status = 'READY'
+    RETURNING s.rid, s.deployment_rid, s.status
+)
+SELECT
+    p.rid as project_rid,
+    p.name as project_name,
+    p.code as project_code,
+    d.rid as deployment_rid,
+    d.version,
+    d.mode,
+    c.status,
+    c.rid
+FROM claimed c
+JOIN deployment d ON d.rid = c.deployment_rid
+JOIN project p ON p.rid = d.project_rid;
+"""
+        # skips a ready deployment once a newer one of the same project and mode
+        # is ready, running or live, the older one must not deploy last
+        self.query_skip_superseded = """
+UPDATE deployment_status_update s
+SET status = 'SKIPPED', updated_at = now()
+WHERE s.rid = (
+    SELECT d.status_rid
+    FROM deployment d
+    WHERE d.rid = :deployment_rid
+        AND d.status = 'READY'
+        AND EXISTS (
+            SELECT 1
+            FROM deployment n
+            WHERE n.project_rid = d.project_rid
+                AND COALESCE(n.mode, 'default') = COALESCE(d.mode, 'default')
+                AND n.created_at > d.created_at
+                AND n.status IN ('READY', 'RUNNING', 'SUCCESS')
+                AND n.removed_at IS NULL
+        )
+    FOR UPDATE OF d SKIP LOCKED
+)
+AND s.status = 'READY'
+RETURNING s.deployment_rid;
+"""
+        # flips due scheduled deployments to ready, all of them or the given one.
+        # due by the given instant, or by the database clock without one
+        self.query_promote = """
+UPDATE deployment_status_update s
+SET status = 'READY', updated_at = now()
+WHERE s.rid IN (
+    SELECT d.status_rid
+    FROM deployment d
+    WHERE d.status = 'SCHEDULED'
+        AND d.scheduled_to_run_at <= COALESCE(CAST(:due_at AS TIMESTAMPTZ), now())
+        AND d.removed_at IS NULL
+        AND (CAST(:deployment_rid AS TEXT) IS NULL OR d.rid = :deployment_rid)
+    FOR UPDATE SKIP LOCKED
+)
+AND s.status = 'SCHEDULED'
+RETURNING s.deployment_rid;
+"""
+        # chunks from the one holding the offset onwards
+        self.query_log = """
+SELECT l.position, l.content
+FROM deployment_log l
+WHERE l.deployment_rid = :deployment_rid
+    AND l.position >= COALESCE(
+        (
+            SELECT max(position)
+            FROM deployment_log
+            WHERE deployment_rid = :deployment_rid AND position <= :offset
+        ),
+        0
+    )
+ORDER BY l.position
+LIMIT :limit;
 """
 
     async def get_latest_statuses(
@@ -96,24 +172,23 @@ ORDER BY d.created_at DESC;
         async with self.session_factory() as session:
             query = """
 SELECT
-    DISTINCT ON (d.rid) d.rid as deployment_rid,
+    d.rid as deployment_rid,
     d.version,
     d.mode,
-    ds.rid,
-    ds.status,
+    d.status_rid,
+    d.status,
     p.rid as project_rid,
     p.code as project_code,
     p.name as project_name
 FROM deployment d
 JOIN project p ON p.rid = d.project_rid
-LEFT OUTER JOIN deployment_status_update ds ON ds.deployment_rid = d.rid
 WHERE
     p.rid = :project_rid AND
     d.version = :version AND
+    d.status IS NOT NULL AND
     d.removed_at IS NULL AND
-    p.removed_at IS NULL AND
-    ds.removed_at IS NULL
-ORDER BY d.rid, ds.created_at DESC;
+    p.removed_at IS NULL
+ORDER BY d.created_at DESC;
 """
             result = await session.execute(
                 text(query), {"project_rid": project_rid, "version": version}
@@ -136,14 +211,42 @@ ORDER BY d.rid, ds.created_at DESC;
             ]
             return results
 
-    async def pick_deployment(self) -> LatestStatusType | None:
+    async def get_latest_statuses_many(
+        self, keys: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], DeploymentStatus]:
+        """
+        The status of the latest deployment of each (project rid, version),
+        in one query. Keys without a deployment are left out.
+        """
+        if len(keys) == 0:
+            return {}
+        async with self.session_factory() as session:
+            statement = (
+                select(Deployment.project_rid, Deployment.version, Deployment.status)
+                .ext(distinct_on(Deployment.project_rid, Deployment.version))
+                .where(
+                    tuple_(Deployment.project_rid, Deployment.version).in_(keys),
+                    Deployment.status.is_not(None),
+                    Deployment.removed_at.is_(None),
+                )
+                .order_by(
+                    Deployment.project_rid,
+                    Deployment.version,
+                    Deployment.created_at.desc(),
+                )
+            )
+            result = await session.execute(statement)
+            return {(arr[0], arr[1]): arr[2] for arr in result.all()}
+
+    async def pick_deployments(self) -> list[LatestStatusType]:
+        # the latest ready deployment of each project and mode, older ones are skipped
         async with self.session_factory() as session:
             result = await session.execute(text(self.query_latest_status))
             rows = result.all()
-            if len(rows) == 0:
-                return None
-            results = [
-                repr_latest_status(
+            picked = {}
+            skipped = []
+            for arr in rows:
+                rec = repr_latest_status(
                     project_rid=arr[0],
                     project_name=arr[1],
                     project_code=arr[2],
@@ -153,78 +256,99 @@ ORDER BY d.rid, ds.created_at DESC;
                     status=arr[6],
                     rid=arr[7],
                 )
-                for arr in rows
-            ]
-            if len(results) == 1:
-                return results[0]
-            rest = results[1:]
-            ids = [x.rid for x in rest]
-            await self.status_update(status_rid=ids, value=DeploymentStatus.SKIPPED)
-            return results[0]
+                key = (rec.project_rid, rec.mode)
+                if key in picked:
+                    skipped.append(rec.rid)
+                else:
+                    picked[key] = rec
+            if len(skipped) > 0:
+                await self.status_update(
+                    status_rid=skipped,
+                    value=DeploymentStatus.SKIPPED,
+                    expected=DeploymentStatus.READY,
+                )
+            return list(picked.values())
 
-    def pick_deployment_sync(self) -> LatestStatusType | None:
-        with self.session_factory() as session:
-            result = session.execute(text(self.query_latest_status))
-            rows = result.all()
-            if len(rows) == 0:
+    async def claim_deployment(self, deployment_rid: str) -> LatestStatusType | None:
+        async with self.session_factory() as session:
+            # a superseded deployment is skipped, the claim below then finds nothing
+            await session.execute(
+                text(self.query_skip_superseded), {"deployment_rid": deployment_rid}
+            )
+            result = await session.execute(
+                text(self.query_claim), {"deployment_rid": deployment_rid}
+            )
+            arr = result.first()
+            await session.commit()
+            if arr is None:
                 return None
-            results = [
-                repr_latest_status(
-                    project_rid=arr[0],
-                    project_name=arr[1],
-                    project_code=arr[2],
-                    deployment_rid=arr[3],
-                    version=arr[4],
-                    mode=arr[5] or "default",
-                    status=arr[6],
-                    rid=arr[7],
-                )
-                for arr in rows
-            ]
-            if len(results) == 1:
-                return results[0]
-            rest = results[1:]
-            ids = [x.rid for x in rest]
-            self.status_update_sync(status_rid=ids, value=DeploymentStatus.SKIPPED)
-            return results[0]
+            return repr_latest_status(
+                project_rid=arr[0],
+                project_name=arr[1],
+                project_code=arr[2],
+                deployment_rid=arr[3],
+                version=arr[4],
+                mode=arr[5] or "default",
+                status=arr[6],
+                rid=arr[7],
+            )
 
-    async def status_update(
-        self,
-        status_rid: str | list[str],
-        value: DeploymentStatus,
-        description: str = None,
-    ):
-        is_bulk = False if isinstance(status_rid, str) else True
+    async def get_scheduled(self) -> list[tuple[str, datetime]]:
         async with self.session_factory() as session:
             statement = (
-                update(DeploymentStatusUpdate)
+                select(Deployment.rid, Deployment.scheduled_to_run_at)
                 .where(
-                    DeploymentStatusUpdate.rid == status_rid
-                    if not is_bulk
-                    else DeploymentStatusUpdate.rid.in_(status_rid)
+                    Deployment.status == DeploymentStatus.SCHEDULED,
+                    Deployment.removed_at.is_(None),
                 )
-                .values(status=value, description=description)
+                .order_by(Deployment.scheduled_to_run_at)
             )
             result = await session.execute(statement)
-            if not is_bulk:
-                if result.rowcount == 1:
-                    await session.commit()
-                    return True
-                return False
-            else:
-                if result.rowcount > 1:
-                    await session.commit()
-                    return True
-                return False
+            return [(arr[0], arr[1]) for arr in result.all()]
+
+    async def promote_scheduled(
+        self, deployment_rid: str = None, due_at: datetime = None
+    ) -> list[str]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                text(self.query_promote),
+                {"deployment_rid": deployment_rid, "due_at": due_at},
+            )
+            rids = [arr[0] for arr in result.all()]
+            await session.commit()
+            return rids
+
+    async def append_log(self, deployment_rid: str, position: int, content: str):
+        async with self.session_factory() as session:
+            session.add(
+                DeploymentLog(
+                    rid=DeploymentLog.generate_rid(),
+                    deployment_rid=deployment_rid,
+                    position=position,
+                    content=content,
+                )
+            )
+            await session.commit()
+
+    async def get_log(
+        self, deployment_rid: str, offset: int, limit: int
+    ) -> list[tuple[int, str]]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                text(self.query_log),
+                {"deployment_rid": deployment_rid, "offset": offset, "limit": limit},
+            )
+            return [(arr[0], arr[1]) for arr in result.all()]
 
-    def status_update_sync(
+    async def status_update(
         self,
         status_rid: str | list[str],
         value: DeploymentStatus,
         description: str = None,
+        expected: DeploymentStatus = None,
     ):
         is_bulk = False if isinstance(status_rid, str) else True
-        with self.session_factory() as session:
+        async with self.session_factory() as session:
             statement = (
                 update(DeploymentStatusUpdate)
                 .where(
@@ -234,15 +358,17 @@ ORDER BY d.rid, ds.created_at DESC;
                 )
                 .values(status=value, description=description)
             )
-            result = session.execute(statement)
+            if expected is not None:
+                statement = statement.where(DeploymentStatusUpdate.status == expected)
+            result = await session.execute(statement)
             if not is_bulk:
                 if result.rowcount == 1:
-                    session.commit()
+                    await session.commit()
                     return True
                 return False
             else:
-                if result.rowcount > 1:
-                    session.commit()
+                if result.rowcount > 0:
+                    await session.commit()
                     return True
                 return False
 
@@ -252,6 +378,37 @@ ORDER BY d.rid, ds.created_at DESC;
             result = await session.scalars(statement)
             return list(result.all())
 
+    async def get_page(
+        self,
+        limit: int,
+        after: tuple[datetime, str] = None,
+        expand: set[str] = frozenset(),
+        project_rid: str = None,
+    ) -> list[Deployment]:
+        """
+        Newest first, starting after the given (created_at, rid) key.
+        Relationships are only loaded when expanded.
+        """
+        async with self.session_factory() as session:
+            statement = (
+                select(Deployment)
+                .where(Deployment.removed_at.is_(None))
+                .order_by(Deployment.created_at.desc(), Deployment.rid.desc())
+                .limit(limit)
+            )
+            if "project" in expand:
+                statement = statement.options(selectinload(Deployment.project))
+            if "status_updates" in expand:
+                statement = statement.options(selectinload(Deployment.status_updates))
+            if project_rid is not None:
+                statement = statement.where(Deployment.project_rid == project_rid)
+            if after is not None:
+                statement = statement.where(
+                    tuple_(Deployment.created_at, Deployment.rid) < tuple_(*after)
+                )
+            result = await session.scalars(statement)
+            return list(result.all())
+
     async def get_one_by(self, column_name: str, value: str) -> Deployment | None:
         async with self.session_factory() as session:
             statement = select(Deployment).where(
@@ -275,6 +432,22 @@ ORDER BY d.rid, ds.created_at DESC;
             await session.commit()
             return deployment
 
+    async def add_many(
+        self, deployments: list[dict], status_updates: list[dict]
+    ) -> list[Deployment]:
+        """
+        Inserts the deployments and then their status updates, each with a
+        single multi-row insert, in one transaction.
+        """
+        async with self.session_factory() as session:
+            result = await session.scalars(
+                insert(Deployment).values(deployments).returning(Deployment)
+            )
+            recs = list(result.all())
+            await session.execute(insert(DeploymentStatusUpdate).values(status_updates))
+            await session.commit()
+            return recs
+
     async def remove_by_rid(self, rid: str) -> bool:
         async with self.session_factory() as session:
             statement = (
@@ -1,18 +1,21 @@
 from datetime import datetime, timezone
-from typing import Callable, AsyncContextManager, ContextManager
-from sqlalchemy import select, update
-from sqlalchemy.orm import Session
+from typing import Callable, AsyncContextManager
+from sqlalchemy import select, update, tuple_, or_
+from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
-from deployment_server.models import Project, SystemdUnit, Daemon, DaemonType
+from deployment_server.models import (
+    Project,
+    SystemdUnit,
+    Daemon,
+    DaemonType,
+    Deployment,
+)
 
 
 class ProjectRepository:
     def __init__(
         self,
-        session_factory: (
-            Callable[[], AsyncContextManager[AsyncSession]]
-            | Callable[[], ContextManager[Session]]
-        ),
+        session_factory: Callable[[], AsyncContextManager[AsyncSession]],
     ):
         self.session_factory = session_factory
 
@@ -22,11 +25,43 @@ class ProjectRepository:
             result = await session.scalars(statement)
             return list(result.all())
 
-    async def get_one_by(self, column_name: str, value: str) -> Project | None:
+    async def get_page(
+        self,
+        limit: int,
+        after: tuple[datetime, str] = None,
+        expand: set[str] = frozenset(),
+    ) -> list[Project]:
+        """
+        Newest first, starting after the given (created_at, rid) key.
+        Relationships are only loaded when expanded.
+        """
+        async with self.session_factory() as session:
+            statement = (
+                select(Project)
+                .where(Project.removed_at.is_(None))
+                .order_by(Project.created_at.desc(), Project.rid.desc())
+                .limit(limit)
+            )
+            if "daemons" in expand:
+                statement = statement.options(selectinload(Project.daemons))
+            if "deployments" in expand:
+                statement = statement.options(selectinload(Project.deployments))
+            if after is not None:
+                statement = statement.where(
+                    tuple_(Project.created_at, Project.rid) < tuple_(*after)
+                )
+            result = await session.scalars(statement)
+            return list(result.all())
+
+    async def get_one_by(
+        self, column_name: str, value: str, with_daemons: bool = False
+    ) -> Project | None:
         async with self.session_factory() as session:
             statement = select(Project).where(
                 getattr(Project, column_name) == value, Project.removed_at.is_(None)
             )
+            if with_daemons:
+                statement = statement.options(selectinload(Project.daemons))
             result = await session.scalars(statement)
             recs = result.all()
             if len(recs) == 0:
@@ -37,20 +72,19 @@ class ProjectRepository:
                 f"multiple projects found with the same project {column_name}."
             )
 
-    def get_one_by_sync(self, column_name: str, value: str) -> Project | None:
-        with self.session_factory() as session:
+    async def get_many_by_refs(
+        self, git_urls: list[str], codes: list[str]
+    ) -> list[Project]:
+        """
+        Projects matching any of the git urls or codes, in one query.
+        """
+        async with self.session_factory() as session:
             statement = select(Project).where(
-                getattr(Project, column_name) == value, Project.removed_at.is_(None)
-            )
-            result = session.scalars(statement)
-            recs = result.all()
-            if len(recs) == 0:
-                return None
-            if len(recs) == 1:
-                return recs[0]
-            raise ValueError(
-                f"multiple projects found with the same project {column_name}."
+                or_(Project.git_url.in_(git_urls), Project.code.in_(codes)),
+                Project.removed_at.is_(None),
             )
+            result = await session.scalars(statement)
+            return list(result.all())
 
     async def add(self, project: Project, daemons: list[SystemdUnit] = None) -> Project:
         async with self.session_factory() as session:
@@ -65,6 +99,19 @@ class ProjectRepository:
                         name=d.name,
                         port=d.port or None,
                         py_module_name=d.py_module_name or None,
+                        instances=d.instances,
+                        health_path=d.health_path,
+                        ready_timeout=d.ready_timeout,
+                        cpu_quota=d.cpu_quota,
+                        cpu_weight=d.cpu_weight,
+                        memory_high=d.memory_high,
+                        memory_max=d.memory_max,
+                        io_weight=d.io_weight,
+                        tasks_max=d.tasks_max,
+                        nice=d.nice,
+                        cpu_affinity=d.cpu_affinity,
+                        numa_policy=d.numa_policy,
+                        numa_mask=d.numa_mask,
                     )
                     for d in daemons
                 ]
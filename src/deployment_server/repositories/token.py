@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+from typing import Callable, AsyncContextManager
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from deployment_server.models import Project, ProjectToken
+
+
+class TokenRepository:
+    def __init__(
+        self, session_factory: Callable[[], AsyncContextManager[AsyncSession]]
+    ):
+        self.session_factory = session_factory
+
+    async def get_active(self, rid: str) -> ProjectToken | None:
+        async with self.session_factory() as session:
+            statement = (
+                select(ProjectToken)
+                .join(Project, Project.rid == ProjectToken.project_rid)
+                .where(
+                    ProjectToken.rid == rid,
+                    ProjectToken.removed_at.is_(None),
+                    Project.removed_at.is_(None),
+                )
+            )
+            result = await session.scalars(statement)
+            return result.first()
+
+    async def get_all_by_project(self, project_rid: str) -> list[ProjectToken]:
+        async with self.session_factory() as session:
+            statement = (
+                select(ProjectToken)
+                .where(
+                    ProjectToken.project_rid == project_rid,
+                    ProjectToken.removed_at.is_(None),
+                )
+                .order_by(ProjectToken.created_at)
+            )
+            result = await session.scalars(statement)
+            return list(result.all())
+
+    async def add(self, token: ProjectToken) -> ProjectToken:
+        async with self.session_factory() as session:
+            session.add(token)
+            await session.commit()
+            return token
+
+    async def remove_by_rid(self, rid: str, project_rid: str) -> bool:
+        async with self.session_factory() as session:
+            statement = (
+                update(ProjectToken)
+                .where(
+                    ProjectToken.rid == rid,
+                    ProjectToken.project_rid == project_rid,
+                    ProjectToken.removed_at.is_(None),
+                )
+                .values(removed_at=datetime.now(timezone.utc))
+            )
+            result = await session.execute(statement)
+            if result.rowcount == 1:
+                await session.commit()
+                return True
+            return False
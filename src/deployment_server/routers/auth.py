@@ -0,0 +1,83 @@
+import secrets
+from typing import Annotated
+from dependency_injector import providers
+from dependency_injector.wiring import inject, Provide
+from fastapi import Depends, HTTPException
+from fastapi.security import (
+    HTTPBasic,
+    HTTPBasicCredentials,
+    HTTPBearer,
+    HTTPAuthorizationCredentials,
+)
+from pydantic import BaseModel
+from deployment_server.containers.server import ServerContainer
+from deployment_server.services.token import TokenService
+
+
+basic_security = HTTPBasic(auto_error=False)
+bearer_security = HTTPBearer(auto_error=False)
+BasicCredentials = Annotated[HTTPBasicCredentials | None, Depends(basic_security)]
+BearerCredentials = Annotated[
+    HTTPAuthorizationCredentials | None, Depends(bearer_security)
+]
+AuthConfig = Annotated[
+    providers.Configuration, Depends(Provide[ServerContainer.config])
+]
+TokenServiceType = Annotated[
+    TokenService, Depends(Provide[ServerContainer.token_service])
+]
+
+
+class Caller(BaseModel):
+    # set when authenticated with a project token, None for the api user
+    project_rid: str | None = None
+
+    def can_access(self, project_rid: str) -> bool:
+        return self.project_rid is None or self.project_rid == project_rid
+
+
+def unauthorized() -> HTTPException:
+    return HTTPException(
+        status_code=401,
+        detail={"error": {"code": "Unauthorized"}},
+        headers={"WWW-Authenticate": "Basic"},
+    )
+
+
+def forbidden() -> HTTPException:
+    return HTTPException(status_code=403, detail={"error": {"code": "Forbidden"}})
+
+
+@inject
+async def authenticate(
+    basic_credentials: BasicCredentials,
+    bearer_credentials: BearerCredentials,
+    config: AuthConfig,
+    token_service: TokenServiceType,
+) -> Caller:
+    if bearer_credentials is not None:
+        project_rid = await token_service.verify(bearer_credentials.credentials)
+        if project_rid is None:
+            raise unauthorized()
+        return Caller(project_rid=project_rid)
+
+    if basic_credentials is None:
+        raise unauthorized()
+    is_correct_user = secrets.compare_digest(
+        basic_credentials.username.encode(), config["api_user"].encode()
+    )
+    is_correct_secret = secrets.compare_digest(
+        basic_credentials.password.encode(), config["api_secret"].encode()
+    )
+    if not (is_correct_user and is_correct_secret):
+        raise unauthorized()
+    return Caller()
+
+
+CallerType = Annotated[Caller, Depends(authenticate)]
+
+
+async def authenticate_api_user(caller: CallerType) -> Caller:
+    if caller.project_rid is not None:
+        raise forbidden()
+    return caller
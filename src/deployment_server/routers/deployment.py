@@ -1,39 +1,28 @@
-import secrets
+import asyncio
+import json
 from typing import Annotated
-from dependency_injector import providers
 from dependency_injector.wiring import inject, Provide
-from fastapi import Depends, HTTPException, APIRouter
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from pydantic import BaseModel, AfterValidator, Field
-from deployment_server.packages.utils import converters, validators
+from fastapi import Depends, HTTPException, APIRouter, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, AfterValidator, Field, AwareDatetime, model_validator
+from deployment_server.packages.utils import (
+    converters,
+    validators,
+    pagination,
+    serializers,
+)
 from deployment_server.containers.server import ServerContainer
 from deployment_server.services.project import ProjectService
 from deployment_server.services.deployment import DeploymentService
-from deployment_server.models import Deployment
-
-
-security = HTTPBasic()
-AuthCredentials = Annotated[HTTPBasicCredentials, Depends(security)]
-AuthConfig = Annotated[
-    providers.Configuration, Depends(Provide[ServerContainer.config])
-]
-
-
-@inject
-async def authenticate(credentials: AuthCredentials, config: AuthConfig):
-    is_correct_user = secrets.compare_digest(
-        credentials.username.encode(), config["api_user"].encode()
-    )
-    is_correct_secret = secrets.compare_digest(
-        credentials.password.encode(), config["api_secret"].encode()
-    )
-    if not (is_correct_user and is_correct_secret):
-        raise HTTPException(
-            status_code=401,
-            detail={"error": {"code": "Unauthorized"}},
-            headers={"WWW-Authenticate": "Basic"},
-        )
-    return credentials.username
+from deployment_server.services.dispatch import DispatchService
+from deployment_server.modules.events import EventHub
+from deployment_server.routers.auth import authenticate, CallerType, forbidden
+from deployment_server.models import (
+    Deployment,
+    DeploymentStatus,
+    DeploymentStatusUpdate,
+    Project,
+)
 
 
 router = APIRouter(
@@ -47,7 +36,61 @@ ProjectServiceType = Annotated[
 DeploymentServiceType = Annotated[
     DeploymentService, Depends(Provide[ServerContainer.deployment_service])
 ]
+DispatchServiceType = Annotated[
+    DispatchService, Depends(Provide[ServerContainer.dispatch_service])
+]
+EventHubType = Annotated[EventHub, Depends(Provide[ServerContainer.event_hub])]
 DeploymentModel = converters.sqlalchemy_to_pydantic(Deployment, "Deployment")
+ProjectModel = converters.sqlalchemy_to_pydantic(Project, "Project")
+DeploymentStatusUpdateModel = converters.sqlalchemy_to_pydantic(
+    DeploymentStatusUpdate, "DeploymentStatusUpdate"
+)
+
+
+class DeploymentListItem(DeploymentModel):
+    # only present when expanded
+    project: ProjectModel | None = None
+    status_updates: list[DeploymentStatusUpdateModel] | None = None
+
+
+deployment_serializer = serializers.Serializer(
+    Deployment,
+    relationships={
+        "project": serializers.Serializer(Project),
+        "status_updates": serializers.Serializer(DeploymentStatusUpdate),
+    },
+)
+max_page_size = 200
+max_bulk_size = 100
+
+
+# a deployment stream ends with the first of these
+final_statuses = (
+    DeploymentStatus.SUCCESS.value,
+    DeploymentStatus.FAILED.value,
+    DeploymentStatus.SKIPPED.value,
+)
+# comments keep idle streams alive through proxies
+keepalive_interval = 15
+
+
+def format_event(event: dict) -> str:
+    return f"event: status\nid: {event['status_rid']}\ndata: {json.dumps(event)}\n\n"
+
+
+def event_stream_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def next_event(queue: asyncio.Queue) -> dict | str | None:
+    try:
+        return await asyncio.wait_for(queue.get(), keepalive_interval)
+    except TimeoutError:
+        return ": keepalive\n\n"
 
 
 class DeploymentCreateRequest(BaseModel):
@@ -56,20 +99,102 @@ class DeploymentCreateRequest(BaseModel):
     mode: Annotated[str, AfterValidator(validators.deployment_mode_pydantic)] = (
         "default"
     )
+    scheduled_to_run_at: AwareDatetime | None = None
+
+
+class DeploymentBulkItem(BaseModel):
+    # the project is given by one of these
+    git_url: Annotated[str | None, AfterValidator(validators.url_pydantic)] = None
+    project_code: Annotated[str | None, Field(max_length=64, min_length=1)] = None
+    version: Annotated[str, Field(max_length=64, min_length=1)]
+    mode: Annotated[str, AfterValidator(validators.deployment_mode_pydantic)] = (
+        "default"
+    )
+    scheduled_to_run_at: AwareDatetime | None = None
+
+    @model_validator(mode="after")
+    def check_project_ref(self):
+        if (self.git_url is None) == (self.project_code is None):
+            raise ValueError("either git_url or project_code is required")
+        return self
+
+
+class DeploymentBulkRequest(BaseModel):
+    items: Annotated[
+        list[DeploymentBulkItem], Field(min_length=1, max_length=max_bulk_size)
+    ]
+
+
+class DeploymentBulkResult(BaseModel):
+    # the deployment, or the error code of the item
+    deployment: DeploymentModel | None = None
+    error: str | None = None
+
+
+class DeploymentLogResponse(BaseModel):
+    content: str
+    offset: int
+    next_offset: int
+
+
+@router.get(
+    "/list",
+    response_model=list[DeploymentListItem],
+    response_model_exclude_unset=True,
+    operation_id="deployment_list",
+)
+@inject
+async def deployment_list(
+    caller: CallerType,
+    deployment_service: DeploymentServiceType,
+    limit: Annotated[int, Query(ge=1, le=max_page_size)] = 50,
+    cursor: str | None = None,
+    expand: str | None = None,
+    project_rid: str | None = None,
+):
+    # project tokens only see their own project
+    if caller.project_rid is not None:
+        if not caller.can_access(project_rid or caller.project_rid):
+            raise forbidden()
+        project_rid = caller.project_rid
+    try:
+        expanded = pagination.parse_expand(
+            expand, tuple(deployment_serializer.relationships)
+        )
+        deployments, next_cursor = await deployment_service.get_page(
+            limit=limit, cursor=cursor, expand=expanded, project_rid=project_rid
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail={"error": {"code": "invalid_request"}}
+        )
+
+    # rows are trusted, they skip the response model validation
+    headers = {}
+    if next_cursor is not None:
+        # the next page is requested with ?cursor=<X-Next-Cursor>
+        headers["X-Next-Cursor"] = next_cursor
+    return serializers.FastJSONResponse(
+        deployment_serializer.dump_many(deployments, expanded), headers=headers
+    )
 
 
 @router.post("/", response_model=DeploymentModel, operation_id="deployment_create")
 @inject
 async def deployment_create(
     body: DeploymentCreateRequest,
+    caller: CallerType,
     project_service: ProjectServiceType,
     deployment_service: DeploymentServiceType,
+    dispatch_service: DispatchServiceType,
 ):
     project = await project_service.get_by_git_url(body.git_url)
     if project is None:
         raise HTTPException(
             status_code=404, detail={"error": {"code": "project_not_found"}}
         )
+    if not caller.can_access(project.rid):
+        raise forbidden()
 
     good = await deployment_service.verify_version_is_good_to_go(
         project_rid=project.rid, version=body.version
@@ -83,7 +208,157 @@ async def deployment_create(
         project_rid=project.rid,
         version=body.version,
         mode=body.mode,
-        scheduled_to_run_at=None,
+        scheduled_to_run_at=body.scheduled_to_run_at,
     )
 
+    if deployment.status == DeploymentStatus.SCHEDULED:
+        await dispatch_service.schedule_deployment(
+            deployment.rid, deployment.scheduled_to_run_at
+        )
+    else:
+        await dispatch_service.dispatch_deployment(deployment.rid)
+
     return deployment
+
+
+@router.post(
+    "/bulk",
+    response_model=list[DeploymentBulkResult],
+    operation_id="deployment_create_bulk",
+)
+@inject
+async def deployment_create_bulk(
+    body: DeploymentBulkRequest,
+    caller: CallerType,
+    project_service: ProjectServiceType,
+    deployment_service: DeploymentServiceType,
+    dispatch_service: DispatchServiceType,
+):
+    by_git_url, by_code = await project_service.get_many_by_refs(
+        git_urls=[x.git_url for x in body.items if x.git_url is not None],
+        codes=[x.project_code for x in body.items if x.project_code is not None],
+    )
+
+    # the results are in the order of the items, each fails on its own
+    results: list[DeploymentBulkResult] = []
+    pending: list[tuple[int, str, str, str, AwareDatetime | None]] = []
+    for index, item in enumerate(body.items):
+        if item.git_url is not None:
+            project = by_git_url.get(item.git_url)
+        else:
+            project = by_code.get(item.project_code)
+        if project is None:
+            results.append(DeploymentBulkResult(error="project_not_found"))
+        elif not caller.can_access(project.rid):
+            results.append(DeploymentBulkResult(error="forbidden"))
+        else:
+            results.append(DeploymentBulkResult())
+            pending.append(
+                (index, project.rid, item.version, item.mode, item.scheduled_to_run_at)
+            )
+
+    deployments = await deployment_service.create_many([x[1:] for x in pending])
+    for (index, *_), deployment in zip(pending, deployments):
+        if deployment is None:
+            results[index].error = "deployment_already_exists"
+        else:
+            results[index].deployment = DeploymentModel.model_validate(deployment)
+
+    await dispatch_service.dispatch_deployments(
+        [d for d in deployments if d is not None]
+    )
+
+    return results
+
+
+@router.get(
+    "/{rid}/log",
+    response_model=DeploymentLogResponse,
+    operation_id="deployment_log",
+)
+@inject
+async def deployment_log(
+    rid: str,
+    caller: CallerType,
+    deployment_service: DeploymentServiceType,
+    offset: Annotated[int, Query(ge=0)] = 0,
+):
+    deployment = await deployment_service.get_by_rid(rid)
+    if deployment is None:
+        raise HTTPException(
+            status_code=404, detail={"error": {"code": "deployment_not_found"}}
+        )
+    if not caller.can_access(deployment.project_rid):
+        raise forbidden()
+
+    # clients tail the log by passing next_offset back until it stops growing
+    content, next_offset = await deployment_service.get_log(rid, offset)
+    return DeploymentLogResponse(
+        content=content, offset=offset, next_offset=next_offset
+    )
+
+
+@router.get("/events", operation_id="deployment_events_all")
+@inject
+async def deployment_events_all(caller: CallerType, event_hub: EventHubType):
+    if caller.project_rid is not None:
+        raise forbidden()
+
+    async def stream():
+        async with event_hub.subscribe() as queue:
+            while True:
+                event = await next_event(queue)
+                if event is None:
+                    # fell behind, the client reconnects and catches up
+                    return
+                yield event if isinstance(event, str) else format_event(event)
+
+    return event_stream_response(stream())
+
+
+@router.get("/{rid}/events", operation_id="deployment_events")
+@inject
+async def deployment_events(
+    rid: str,
+    caller: CallerType,
+    deployment_service: DeploymentServiceType,
+    event_hub: EventHubType,
+):
+    deployment = await deployment_service.get_by_rid(rid)
+    if deployment is None:
+        raise HTTPException(
+            status_code=404, detail={"error": {"code": "deployment_not_found"}}
+        )
+    if not caller.can_access(deployment.project_rid):
+        raise forbidden()
+
+    async def stream():
+        async with event_hub.subscribe() as queue:
+            # read after subscribing so that no change is missed in between
+            current = await deployment_service.get_by_rid(rid)
+            if current is None or current.status is None:
+                return
+            yield format_event(
+                {
+                    "deployment_rid": current.rid,
+                    "status_rid": current.status_rid,
+                    "status": current.status.value,
+                    "description": None,
+                }
+            )
+            if current.status.value in final_statuses:
+                return
+            while True:
+                event = await next_event(queue)
+                if event is None:
+                    return
+                if isinstance(event, str):
+                    yield event
+                    continue
+                if event["deployment_rid"] != rid:
+                    continue
+                yield format_event(event)
+                if event["status"] in final_statuses:
+                    return
+
+    return event_stream_response(stream())
@@ -1,5 +1,9 @@
-from fastapi import APIRouter
+from typing import Annotated, Callable
+from dependency_injector.wiring import Provide, inject
+from fastapi import APIRouter, Depends
 from fastapi.responses import PlainTextResponse
+from deployment_server.routers.auth import authenticate_api_user
+from deployment_server.containers.server import ServerContainer
 
 
 router = APIRouter(prefix="/health", tags=["health"])
@@ -8,3 +12,21 @@ router = APIRouter(prefix="/health", tags=["health"])
 @router.get("/", response_class=PlainTextResponse, operation_id="healthcheck")
 async def healthcheck():
     return PlainTextResponse("")
+
+
+@router.get(
+    "/pool",
+    operation_id="healthcheck_pool",
+    dependencies=[Depends(authenticate_api_user)],
+)
+@inject
+async def healthcheck_pool(
+    session_factory: Annotated[
+        Callable, Depends(Provide[ServerContainer.session_factory])
+    ],
+) -> dict:
+    """
+    Connection pool usage of this server process, checkout waits include
+    opening new connections.
+    """
+    return session_factory.pool_status()
@@ -1,48 +1,38 @@
-import secrets
 from typing import Annotated
-from dependency_injector import providers
 from dependency_injector.wiring import Provide, inject
 from pydantic import BaseModel, Field, AfterValidator
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi import APIRouter, HTTPException, Depends, Query
 from starlette.responses import PlainTextResponse
-from deployment_server.models import Project, SystemdUnit, SecretsProvider
+from deployment_server.models import (
+    Project,
+    Daemon,
+    Deployment,
+    ProjectToken,
+    SystemdUnit,
+    SecretsProvider,
+)
 from deployment_server.services.project import ProjectService
+from deployment_server.services.token import TokenService
+from deployment_server.routers.auth import authenticate_api_user
 from deployment_server.containers.server import ServerContainer
-from deployment_server.packages.utils import converters, validators
+from deployment_server.packages.utils import (
+    converters,
+    validators,
+    pagination,
+    serializers,
+)
 
 ProjectRid = Annotated[str, Field(max_length=64, min_length=1)]
 ProjectServiceType = Annotated[
     ProjectService, Depends(Provide[ServerContainer.project_service])
 ]
-
-
-security = HTTPBasic()
-AuthCredentials = Annotated[HTTPBasicCredentials, Depends(security)]
-AuthConfig = Annotated[
-    providers.Configuration, Depends(Provide[ServerContainer.config])
+TokenServiceType = Annotated[
+    TokenService, Depends(Provide[ServerContainer.token_service])
 ]
 
 
-@inject
-async def authenticate(credentials: AuthCredentials, config: AuthConfig):
-    is_correct_user = secrets.compare_digest(
-        credentials.username.encode(), config["api_user"].encode()
-    )
-    is_correct_secret = secrets.compare_digest(
-        credentials.password.encode(), config["api_secret"].encode()
-    )
-    if not (is_correct_user and is_correct_secret):
-        raise HTTPException(
-            status_code=401,
-            detail={"error": {"code": "Unauthorized"}},
-            headers={"WWW-Authenticate": "Basic"},
-        )
-    return credentials.username
-
-
 router = APIRouter(
-    prefix="/project", tags=["project"], dependencies=[Depends(authenticate)]
+    prefix="/project", tags=["project"], dependencies=[Depends(authenticate_api_user)]
 )
 
 
@@ -61,6 +51,24 @@ class ProjectCreateRequestBody(BaseModel):
 
 
 ProjectModel = converters.sqlalchemy_to_pydantic(Project, "ProjectModel")
+DaemonModel = converters.sqlalchemy_to_pydantic(Daemon, "DaemonModel")
+DeploymentModel = converters.sqlalchemy_to_pydantic(Deployment, "DeploymentModel")
+
+
+class ProjectListItem(ProjectModel):
+    # only present when expanded
+    daemons: list[DaemonModel] | None = None
+    deployments: list[DeploymentModel] | None = None
+
+
+project_serializer = serializers.Serializer(
+    Project,
+    relationships={
+        "daemons": serializers.Serializer(Daemon),
+        "deployments": serializers.Serializer(Deployment),
+    },
+)
+max_page_size = 200
 
 
 @router.post("/", response_model=ProjectModel, operation_id="project_create")
@@ -92,10 +100,39 @@ async def project_create(
     return new_project
 
 
-@router.get("/list", response_model=list[ProjectModel], operation_id="project_list")
+@router.get(
+    "/list",
+    response_model=list[ProjectListItem],
+    response_model_exclude_unset=True,
+    operation_id="project_list",
+)
 @inject
-async def project_list(project_service: ProjectServiceType):
-    return await project_service.get_all()
+async def project_list(
+    project_service: ProjectServiceType,
+    limit: Annotated[int, Query(ge=1, le=max_page_size)] = 50,
+    cursor: str | None = None,
+    expand: str | None = None,
+):
+    try:
+        expanded = pagination.parse_expand(
+            expand, tuple(project_serializer.relationships)
+        )
+        projects, next_cursor = await project_service.get_page(
+            limit=limit, cursor=cursor, expand=expanded
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail={"error": {"code": "invalid_request"}}
+        )
+
+    # rows are trusted, they skip the response model validation
+    headers = {}
+    if next_cursor is not None:
+        # the next page is requested with ?cursor=<X-Next-Cursor>
+        headers["X-Next-Cursor"] = next_cursor
+    return serializers.FastJSONResponse(
+        project_serializer.dump_many(projects, expanded), headers=headers
+    )
 
 
 @router.get("/{rid}", response_model=ProjectModel, operation_id="project_get")
@@ -106,7 +143,7 @@ async def project_get(rid: ProjectRid, project_service: ProjectServiceType):
         raise HTTPException(
             status_code=404, detail={"error": {"code": "project_not_found"}}
         )
-    return project
+    return serializers.FastJSONResponse(project_serializer.dump(project))
 
 
 class ProjectRemoveResponse(BaseModel):
@@ -128,3 +165,64 @@ async def project_remove(rid: ProjectRid, project_service: ProjectServiceType):
     status_code = 204 if result is True else 404
 
     return PlainTextResponse(status_code=status_code)
+
+
+class TokenCreateRequestBody(BaseModel):
+    name: Annotated[str, Field(max_length=64, min_length=1)]
+
+
+ProjectTokenModel = converters.sqlalchemy_to_pydantic(
+    ProjectToken,
+    "ProjectTokenModel",
+    exclude_fields={"registry", "metadata", "secret_hash"},
+)
+
+
+class TokenCreateResponse(ProjectTokenModel):
+    # shown only once, only a hash of it is kept
+    token: str
+
+
+@router.post(
+    "/{rid}/token", response_model=TokenCreateResponse, operation_id="token_create"
+)
+@inject
+async def token_create(
+    rid: ProjectRid,
+    body: TokenCreateRequestBody,
+    project_service: ProjectServiceType,
+    token_service: TokenServiceType,
+):
+    project = await project_service.get_by_rid(rid)
+    if project is None:
+        raise HTTPException(
+            status_code=404, detail={"error": {"code": "project_not_found"}}
+        )
+
+    record, token = await token_service.create(project_rid=project.rid, name=body.name)
+    return TokenCreateResponse(
+        **ProjectTokenModel.model_validate(record).model_dump(), token=token
+    )
+
+
+@router.get(
+    "/{rid}/token", response_model=list[ProjectTokenModel], operation_id="token_list"
+)
+@inject
+async def token_list(rid: ProjectRid, token_service: TokenServiceType):
+    return await token_service.get_all_by_project(rid)
+
+
+@router.delete(
+    "/{rid}/token/{token_rid}",
+    response_class=PlainTextResponse,
+    operation_id="token_remove",
+)
+@inject
+async def token_remove(
+    rid: ProjectRid, token_rid: ProjectRid, token_service: TokenServiceType
+):
+    result = await token_service.revoke(project_rid=rid, rid=token_rid)
+    status_code = 204 if result is True else 404
+
+    return PlainTextResponse(status_code=status_code)
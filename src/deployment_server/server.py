@@ -1,5 +1,7 @@
 import os
+import socket
 import uvicorn
+from uvicorn.supervisors import Multiprocess
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
@@ -63,20 +65,58 @@ def get_socket_fd():
     return None
 
 
+def get_server_socket(socket_fd: int | None, host: str, port: int) -> socket.socket:
+    if socket_fd is not None:
+        # the family is read from the fd, uvicorn's own fromfd assumes AF_UNIX
+        return socket.socket(fileno=socket_fd)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # a restarted server can bind the port while the old one drains
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_server(socket_fd: int | None, port: int):
+    from deployment_server.containers.server import ServerContainer
+
+    options = ServerContainer().config()
+    workers = int(options.get("server_workers") or 1)
+    max_requests = int(options.get("server_max_requests") or 0)
+
+    config = uvicorn.Config(
+        app="deployment_server.server:create_app",
+        factory=True,
+        workers=workers,
+        limit_max_requests=max_requests or None,
+        # so that workers don't recycle all at once
+        limit_max_requests_jitter=max_requests // 10,
+    )
+    sock = get_server_socket(socket_fd, "0.0.0.0", port)
+
+    # the supervisor replaces workers that exit after max requests and
+    # restarts them one by one on SIGHUP, all accept on the same socket
+    if workers > 1 or max_requests > 0:
+        Multiprocess(config, sockets=[sock]).run()
+    else:
+        uvicorn.Server(config).run(sockets=[sock])
+
+
 if __name__ == "__main__":
     init()
 
     socket_fd = get_socket_fd()
 
-    if socket_fd is not None:
-        uvicorn.run(
-            app="deployment_server.server:create_app", factory=True, fd=socket_fd
-        )
-    else:
+    if socket_fd is None and env.is_dev():
         uvicorn.run(
             app="deployment_server.server:create_app",
             factory=True,
             host="0.0.0.0",
             port=int(os.environ.get("APPLICATION_SERVER_PORT")),
-            reload=env.is_dev(),
+            reload=True,
         )
+    else:
+        run_server(socket_fd, int(os.environ.get("APPLICATION_SERVER_PORT")))
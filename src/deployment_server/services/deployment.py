@@ -1,5 +1,6 @@
 import datetime
 from deployment_server.repositories.deployment import DeploymentRepository
+from deployment_server.packages.utils import pagination
 from deployment_server.models import (
     Deployment,
     DeploymentStatus,
@@ -21,25 +22,69 @@ class DeploymentService:
             return True
         return False
 
-    async def pick_deployment(self):
-        return await self.deployment_repo.pick_deployment()
+    async def claim_deployment(self, deployment_rid: str):
+        return await self.deployment_repo.claim_deployment(deployment_rid)
 
-    def pick_deployment_sync(self):
-        return self.deployment_repo.pick_deployment_sync()
+    async def get_scheduled(self):
+        return await self.deployment_repo.get_scheduled()
+
+    async def promote_scheduled(
+        self, deployment_rid: str = None, due_at: datetime.datetime = None
+    ):
+        return await self.deployment_repo.promote_scheduled(deployment_rid, due_at)
+
+    async def pick_deployments(self):
+        return await self.deployment_repo.pick_deployments()
 
     async def send_status_update(
         self, status_rid: str, value: DeploymentStatus, description: str = None
     ):
         return await self.deployment_repo.status_update(status_rid, value, description)
 
-    def send_status_update_sync(
-        self, status_rid: str, value: DeploymentStatus, description: str = None
-    ):
-        return self.deployment_repo.status_update_sync(status_rid, value, description)
+    async def append_log(self, deployment_rid: str, position: int, content: str):
+        return await self.deployment_repo.append_log(deployment_rid, position, content)
+
+    async def get_log(
+        self, deployment_rid: str, offset: int, max_chunks: int = 16
+    ) -> tuple[str, int]:
+        """
+        Reads the log from offset on, at most max_chunks chunks of it.
+
+        :return: The content and the offset to continue from.
+        """
+        chunks = await self.deployment_repo.get_log(deployment_rid, offset, max_chunks)
+        if len(chunks) == 0:
+            return "", offset
+        content = "".join(c for _, c in chunks)
+        start = chunks[0][0]
+        end = start + len(content)
+        if offset >= end:
+            return "", offset
+        return content[max(offset - start, 0) :], end
 
     async def get_all(self):
         return await self.deployment_repo.get_all()
 
+    async def get_page(
+        self,
+        limit: int,
+        cursor: str = None,
+        expand: set[str] = frozenset(),
+        project_rid: str = None,
+    ) -> tuple[list[Deployment], str | None]:
+        """
+        :return: The deployments and the cursor of the next page, if there is one.
+        """
+        after = pagination.decode_cursor(cursor) if cursor else None
+        # one more than asked tells whether there is a next page
+        deployments = await self.deployment_repo.get_page(
+            limit + 1, after, expand, project_rid
+        )
+        if len(deployments) <= limit:
+            return deployments, None
+        last = deployments[limit - 1]
+        return deployments[:limit], pagination.encode_cursor(last.created_at, last.rid)
+
     async def get_by_rid(self, rid: str):
         return await self.deployment_repo.get_one_by("rid", rid)
 
@@ -57,14 +102,74 @@ class DeploymentService:
             mode=mode,
             scheduled_to_run_at=scheduled_to_run_at,
         )
+        is_scheduled = (
+            scheduled_to_run_at is not None
+            and scheduled_to_run_at > datetime.datetime.now(datetime.timezone.utc)
+        )
         status_update = DeploymentStatusUpdate(
             rid=DeploymentStatusUpdate.generate_rid(),
-            status=DeploymentStatus.READY,
+            status=(
+                DeploymentStatus.SCHEDULED if is_scheduled else DeploymentStatus.READY
+            ),
             deployment_rid=deployment.rid,
         )
+        deployment.status = status_update.status
+        deployment.status_rid = status_update.rid
         return await self.deployment_repo.add(
             deployment=deployment, status_update=status_update
         )
 
+    async def create_many(
+        self, items: list[tuple[str, str, str, datetime.datetime | None]]
+    ) -> list[Deployment | None]:
+        """
+        Creates a deployment for each (project rid, version, mode, scheduled
+        to run at) item whose version is good to go, checking them all in one
+        query and inserting them in one transaction. A version repeated in
+        the items is created once.
+
+        :return: The deployment of each item, None where the version conflicts.
+        """
+        statuses = await self.deployment_repo.get_latest_statuses_many(
+            list({(item[0], item[1]) for item in items})
+        )
+        now = datetime.datetime.now(datetime.timezone.utc)
+        created = []
+        deployments = []
+        status_updates = []
+        for project_rid, version, mode, scheduled_to_run_at in items:
+            key = (project_rid, version)
+            if statuses.get(key, DeploymentStatus.FAILED) != DeploymentStatus.FAILED:
+                created.append(None)
+                continue
+            is_scheduled = scheduled_to_run_at is not None and scheduled_to_run_at > now
+            status = (
+                DeploymentStatus.SCHEDULED if is_scheduled else DeploymentStatus.READY
+            )
+            # taken by this item, the same version later on conflicts with it
+            statuses[key] = status
+            deployment_rid = Deployment.generate_rid()
+            status_rid = DeploymentStatusUpdate.generate_rid()
+            deployments.append(
+                {
+                    "rid": deployment_rid,
+                    "project_rid": project_rid,
+                    "version": version,
+                    "mode": mode,
+                    "scheduled_to_run_at": scheduled_to_run_at,
+                    "status": status,
+                    "status_rid": status_rid,
+                }
+            )
+            status_updates.append(
+                {"rid": status_rid, "status": status, "deployment_rid": deployment_rid}
+            )
+            created.append(deployment_rid)
+        if len(deployments) == 0:
+            return [None for _ in items]
+        recs = await self.deployment_repo.add_many(deployments, status_updates)
+        by_rid = {rec.rid: rec for rec in recs}
+        return [None if rid is None else by_rid[rid] for rid in created]
+
     async def remove_by_rid(self, rid: str):
         return await self.deployment_repo.remove_by_rid(rid=rid)
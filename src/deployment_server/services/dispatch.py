@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime
+from logging import Logger
+from celery import Celery
+from deployment_server.models import Deployment, DeploymentStatus
+
+
+class DispatchService:
+    task_run_deployment = "deployment_server.tasks.run_deployment.run_deployment"
+
+    def __init__(self, task_queue: Celery, logger: Logger):
+        self.task_queue: Celery = task_queue
+        self.logger: Logger = logger
+
+    async def dispatch_deployment(self, deployment_rid: str) -> bool:
+        try:
+            await asyncio.to_thread(
+                self.task_queue.send_task,
+                self.task_run_deployment,
+                kwargs={"deployment_rid": deployment_rid},
+            )
+        except Exception as ex:
+            # the periodic sweep picks the deployment up anyway
+            self.logger.warning(
+                f"failed to dispatch deployment {deployment_rid}. error: {ex}"
+            )
+            return False
+        return True
+
+    async def dispatch_deployments(self, deployments: list[Deployment]) -> None:
+        """
+        Dispatches ready deployments and schedules the others, concurrently.
+        """
+        await asyncio.gather(
+            *(
+                (
+                    self.schedule_deployment(d.rid, d.scheduled_to_run_at)
+                    if d.status == DeploymentStatus.SCHEDULED
+                    else self.dispatch_deployment(d.rid)
+                )
+                for d in deployments
+            )
+        )
+
+    async def schedule_deployment(
+        self, deployment_rid: str, scheduled_to_run_at: datetime
+    ) -> bool:
+        # every worker keeps the deployment in its scheduler, promoting it is
+        # atomic so only one of them runs it
+        try:
+            await asyncio.to_thread(
+                self.task_queue.control.broadcast,
+                "schedule_deployment",
+                arguments={
+                    "deployment_rid": deployment_rid,
+                    "scheduled_to_run_at": scheduled_to_run_at.isoformat(),
+                },
+            )
+        except Exception as ex:
+            # workers load scheduled deployments on startup and the sweep
+            # promotes overdue ones anyway
+            self.logger.warning(
+                f"failed to schedule deployment {deployment_rid}. error: {ex}"
+            )
+            return False
+        return True
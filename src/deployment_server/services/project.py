@@ -1,6 +1,7 @@
 from slugify import slugify
 from deployment_server.repositories.project import ProjectRepository
 from deployment_server.models import Project, SystemdUnit, SecretsProvider
+from deployment_server.packages.utils import pagination
 
 
 class ProjectService:
@@ -10,18 +11,40 @@ class ProjectService:
     async def get_all(self):
         return await self.project_repo.get_all()
 
-    async def get_by_code(self, code: str):
-        return await self.project_repo.get_one_by("code", code)
+    async def get_page(
+        self, limit: int, cursor: str = None, expand: set[str] = frozenset()
+    ) -> tuple[list[Project], str | None]:
+        """
+        :return: The projects and the cursor of the next page, if there is one.
+        """
+        after = pagination.decode_cursor(cursor) if cursor else None
+        # one more than asked tells whether there is a next page
+        projects = await self.project_repo.get_page(limit + 1, after, expand)
+        if len(projects) <= limit:
+            return projects, None
+        last = projects[limit - 1]
+        return projects[:limit], pagination.encode_cursor(last.created_at, last.rid)
 
-    def get_by_code_sync(self, code: str):
-        return self.project_repo.get_one_by_sync("code", code)
+    async def get_by_code(self, code: str, with_daemons: bool = False):
+        return await self.project_repo.get_one_by("code", code, with_daemons)
 
-    async def get_by_rid(self, rid: str):
-        return await self.project_repo.get_one_by("rid", rid)
+    async def get_by_rid(self, rid: str, with_daemons: bool = False):
+        return await self.project_repo.get_one_by("rid", rid, with_daemons)
 
     async def get_by_git_url(self, git_url: str):
         return await self.project_repo.get_one_by("git_url", git_url)
 
+    async def get_many_by_refs(
+        self, git_urls: list[str], codes: list[str]
+    ) -> tuple[dict[str, Project], dict[str, Project]]:
+        """
+        :return: The projects by git url and by code.
+        """
+        projects = await self.project_repo.get_many_by_refs(git_urls, codes)
+        by_git_url = {p.git_url: p for p in projects if p.git_url is not None}
+        by_code = {p.code: p for p in projects}
+        return by_git_url, by_code
+
     def validate_code(self, code: str) -> str | bool:
         validated_code = slugify(code)
         if len(validated_code) == 0:
@@ -0,0 +1,57 @@
+import asyncio
+from deployment_server.repositories.token import TokenRepository
+from deployment_server.models import ProjectToken
+from deployment_server.packages.utils import tokens
+
+
+class TokenService:
+    def __init__(self, token_repo: TokenRepository, token_cache: tokens.TokenCache):
+        self.token_repo: TokenRepository = token_repo
+        self.token_cache: tokens.TokenCache = token_cache
+
+    async def create(self, project_rid: str, name: str) -> tuple[ProjectToken, str]:
+        """
+        :return: The record and the token itself, which isn't stored anywhere.
+        """
+        rid = ProjectToken.generate_rid()
+        token, secret = tokens.generate_token(rid)
+        # the hash is slow on purpose, it runs off the event loop
+        secret_hash = await asyncio.to_thread(tokens.hash_secret, secret)
+        record = await self.token_repo.add(
+            ProjectToken(
+                rid=rid, project_rid=project_rid, name=name, secret_hash=secret_hash
+            )
+        )
+        return record, token
+
+    async def verify(self, token: str) -> str | None:
+        """
+        :return: The rid of the project the token belongs to, None if it
+            isn't valid.
+        """
+        project_rid = self.token_cache.get(token)
+        if project_rid is not None:
+            return project_rid
+
+        parts = tokens.split_token(token)
+        if parts is None:
+            return None
+        rid, secret = parts
+        record = await self.token_repo.get_active(rid)
+        if record is None:
+            return None
+        verified = await asyncio.to_thread(
+            tokens.verify_secret, secret, record.secret_hash
+        )
+        if not verified:
+            return None
+        self.token_cache.put(token, record.project_rid, record.rid)
+        return record.project_rid
+
+    async def get_all_by_project(self, project_rid: str):
+        return await self.token_repo.get_all_by_project(project_rid)
+
+    async def revoke(self, project_rid: str, rid: str) -> bool:
+        removed = await self.token_repo.remove_by_rid(rid=rid, project_rid=project_rid)
+        self.token_cache.evict(rid)
+        return removed
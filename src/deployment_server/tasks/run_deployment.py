@@ -1,46 +1,106 @@
+import asyncio
 from logging import Logger
 from celery import shared_task, current_app
 from deployment_server.models import DeploymentStatus
 from deployment_server.services.deployment import DeploymentService
 from deployment_server.services.project import ProjectService
 from deployment_server.packages.deployer.base import Deployer
+from deployment_server.packages.deployer.log import ChunkedLog
+from deployment_server.modules.loop import EventLoopThread
+
+# a deployment waiting for the lock of its project and mode is tried again after
+lock_retry_seconds = 30
 
 
 @shared_task()
-def run_deployment():
+def run_deployment(deployment_rid: str = None):
+    # every task of the process shares one loop and the connections pooled on it
+    event_loop: EventLoopThread = current_app.container.event_loop()
+    return event_loop.run(run_deployment_async(deployment_rid))
+
+
+async def run_deployment_async(deployment_rid: str = None):
     logger: Logger = current_app.container.logger()
+    event_loop: EventLoopThread = current_app.container.event_loop()
     project_service: ProjectService = current_app.container.project_service()
     deployment_service: DeploymentService = current_app.container.deployment_service()
     deployer = Deployer(logger=logger)
     logger.debug("checking deployment tasks.")
 
-    rec = deployment_service.pick_deployment_sync()
-    if rec is None:
-        logger.debug("no deployment tasks found.")
+    if deployment_rid is None:
+        # sweep: promote overdue scheduled deployments the scheduler has missed
+        await deployment_service.promote_scheduled()
+        # fan out one task per project and mode, they run concurrently
+        recs = await deployment_service.pick_deployments()
+        for r in recs:
+            run_deployment.delay(r.deployment_rid)
+        logger.debug(f"dispatched {len(recs)} deployment tasks.")
+        session_factory = current_app.container.session_factory()
+        logger.debug(f"database pool: {session_factory.pool_status()}")
         return
 
-    deployment_service.send_status_update_sync(rec.rid, DeploymentStatus.RUNNING)
+    deployment = await deployment_service.get_by_rid(deployment_rid)
+    if deployment is None or deployment.status != DeploymentStatus.READY:
+        logger.debug(f"deployment {deployment_rid} isn't available to run.")
+        return
+    project = await project_service.get_by_rid(
+        deployment.project_rid, with_daemons=True
+    )
+    if project is None:
+        logger.debug(f"deployment {deployment_rid} isn't available to run.")
+        return
+    mode = deployment.mode or "default"
 
-    project = project_service.get_by_code_sync(rec.project_code)
+    # deployments of the same project and mode never run at the same time. the
+    # lock is held before the claim, a waiting task would hold a worker slot
+    with deployer.lock(project.code, mode, blocking=False) as locked:
+        if not locked:
+            logger.debug(f"{project.code} {mode} is being deployed, retrying later.")
+            run_deployment.apply_async((deployment_rid,), countdown=lock_retry_seconds)
+            return
+        # marks it as running, returns None if it isn't ready, another worker has
+        # it or a newer deployment of the same project and mode supersedes it
+        rec = await deployment_service.claim_deployment(deployment_rid)
+        if rec is None:
+            logger.debug(f"deployment {deployment_rid} isn't available to run.")
+            return
 
-    logger.debug(f"deploying project {project.name or project.git_url}.")
+        logger.debug(f"deploying project {project.name or project.git_url}.")
 
-    mode = rec.mode or "default"
-    success, message = deployer.deploy(
-        project_code=rec.project_code,
-        mode=mode,
-        pip_package_name=project.pip_package_name,
-        pip_index_url=project.pip_index_url,
-        pip_index_user=project.pip_index_user,
-        pip_index_auth=project.pip_index_auth,
-        daemons=project.daemons,
-        secrets_provider=project.secrets_provider,
-    )
-    if not success:
-        logger.error(message)
-        deployment_service.send_status_update_sync(rec.rid, DeploymentStatus.FAILED)
-        return False
+        def append_log(position: int, content: str):
+            # called from the log and deployer threads, never from the loop
+            event_loop.run(
+                deployment_service.append_log(rec.deployment_rid, position, content)
+            )
+
+        def deploy() -> tuple[bool, str]:
+            log = ChunkedLog(flush=append_log, logger=logger)
+            with log:
+                deployer.output = log.write
+                success, message = deployer.deploy(
+                    project_code=rec.project_code,
+                    mode=mode,
+                    version=rec.version,
+                    pip_package_name=project.pip_package_name,
+                    pip_index_url=project.pip_index_url,
+                    pip_index_user=project.pip_index_user,
+                    pip_index_auth=project.pip_index_auth,
+                    daemons=project.daemons,
+                    secrets_provider=project.secrets_provider,
+                )
+                if not success:
+                    log.write(message)
+            return success, message
+
+        # the deployer blocks on processes, the loop stays free for other queries
+        success, message = await asyncio.to_thread(deploy)
+        if not success:
+            logger.error(message)
+            await deployment_service.send_status_update(
+                rec.rid, DeploymentStatus.FAILED
+            )
+            return False
 
-    deployment_service.send_status_update_sync(rec.rid, DeploymentStatus.SUCCESS)
+        await deployment_service.send_status_update(rec.rid, DeploymentStatus.SUCCESS)
 
-    return True
+        return True
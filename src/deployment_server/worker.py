@@ -1,6 +1,8 @@
+from datetime import datetime
 from celery import Celery
 from celery.schedules import crontab
-from celery.signals import worker_init, worker_shutdown, setup_logging
+from celery.signals import worker_init, worker_ready, worker_shutdown, setup_logging
+from celery.worker.control import control_command
 from deployment_server.init import init
 
 
@@ -10,9 +12,23 @@ def config_loggers(*args, **kwargs):
     pass
 
 
+@control_command(
+    args=[("deployment_rid", str), ("scheduled_to_run_at", str)],
+    signature="<deployment_rid> <scheduled_to_run_at>",
+)
+def schedule_deployment(state, deployment_rid: str, scheduled_to_run_at: str):
+    """Add a deployment to the scheduler of this worker."""
+    scheduler = getattr(state.consumer.app, "scheduler", None)
+    if scheduler is None:
+        return {"error": "scheduler isn't running"}
+    scheduler.add(deployment_rid, datetime.fromisoformat(scheduled_to_run_at))
+    return {"ok": "scheduled"}
+
+
 def create_worker() -> Celery:
     from deployment_server.containers.worker import WorkerContainer
     from deployment_server.tasks.run_deployment import run_deployment
+    from deployment_server.packages.scheduler.base import Scheduler
 
     container = WorkerContainer()
     worker = Celery("tasks", broker=container.config.rabbitmq_conn_str())
@@ -22,17 +38,46 @@ def create_worker() -> Celery:
     def worker_init_handler(sender=None, **kwargs):
         container.init_resources()
 
+    @worker_ready.connect
+    def worker_ready_handler(sender=None, **kwargs):
+        # runs in the main process after the pool has been forked
+        deployment_service = container.deployment_service()
+        event_loop = container.event_loop()
+
+        def load():
+            return event_loop.run(deployment_service.get_scheduled())
+
+        def fire(deployment_rid: str, due_at: datetime):
+            promoted = event_loop.run(
+                deployment_service.promote_scheduled(deployment_rid, due_at)
+            )
+            for rid in promoted:
+                run_deployment.delay(rid)
+
+        worker.scheduler = Scheduler(logger=container.logger(), load=load, fire=fire)
+        worker.scheduler.start()
+
     @worker_shutdown.connect
     def worker_shutdown_handler(sender=None, **kwargs):
+        if getattr(worker, "scheduler", None) is not None:
+            worker.scheduler.stop()
         container.shutdown_resources()
 
+    # deployments are dispatched by the server as they are created, this is
+    # only a safety sweep for the ones that couldn't be dispatched
     worker.conf.beat_schedule = {
         "check-deployments-queue": {
             "task": "deployment_server.tasks.run_deployment.run_deployment",
-            "schedule": crontab(minute="*"),
+            "schedule": crontab(minute="*/5"),
         },
     }
     worker.conf.timezone = "UTC"
+    # deployments of different projects run in parallel up to this many
+    config = container.config()
+    if config.get("worker_concurrency"):
+        worker.conf.worker_concurrency = int(config["worker_concurrency"])
+    # deployments are long running, don't let a busy process hoard them
+    worker.conf.worker_prefetch_multiplier = 1
 
     return worker
 
@@ -0,0 +1,54 @@
+import logging
+import threading
+import time
+from deployment_server.packages.deployer.base import Deployer
+
+
+def test_lock_serializes_same_application(tmp_path):
+    deployer = Deployer(logger=logging.getLogger())
+    deployer.lock_root_dir = tmp_path
+    events = []
+
+    def deploy(name: str, project_code: str):
+        with deployer.lock(project_code, "prod"):
+            events.append(f"{name} start")
+            time.sleep(0.2)
+            events.append(f"{name} end")
+
+    t1 = threading.Thread(target=deploy, args=("one", "p1"))
+    t2 = threading.Thread(target=deploy, args=("two", "p1"))
+    t1.start()
+    time.sleep(0.05)
+    t2.start()
+    t1.join()
+    t2.join()
+    assert events == ["one start", "one end", "two start", "two end"]
+
+
+def test_lock_allows_different_applications(tmp_path):
+    deployer = Deployer(logger=logging.getLogger())
+    deployer.lock_root_dir = tmp_path
+    with deployer.lock("p1", "prod"):
+        acquired = threading.Event()
+
+        def deploy():
+            with deployer.lock("p2", "prod"):
+                acquired.set()
+
+        t = threading.Thread(target=deploy)
+        t.start()
+        assert acquired.wait(1)
+        t.join()
+
+
+def test_lock_without_blocking(tmp_path):
+    deployer = Deployer(logger=logging.getLogger())
+    deployer.lock_root_dir = tmp_path
+    with deployer.lock("p1", "prod") as locked:
+        assert locked
+        with deployer.lock("p1", "prod", blocking=False) as other:
+            assert not other
+        with deployer.lock("p2", "prod", blocking=False) as other:
+            assert other
+    with deployer.lock("p1", "prod", blocking=False) as locked:
+        assert locked
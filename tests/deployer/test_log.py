@@ -0,0 +1,41 @@
+import logging
+from deployment_server.packages.deployer.log import ChunkedLog
+
+
+logger = logging.getLogger()
+
+
+def test_chunks_have_positions():
+    chunks = []
+    with ChunkedLog(
+        flush=lambda p, c: chunks.append((p, c)),
+        logger=logger,
+        chunk_size=10,
+        interval=60,
+    ) as log:
+        for line in ("first", "second", "third"):
+            log.write(line)
+
+    assert chunks == [(0, "first\nsecond\n"), (13, "third\n")]
+
+
+def test_partial_chunk_is_flushed_on_interval():
+    chunks = []
+    log = ChunkedLog(
+        flush=lambda p, c: chunks.append((p, c)),
+        logger=logger,
+        interval=0.05,
+    )
+    with log:
+        log.write("line")
+        log.closed.wait(0.3)
+        assert chunks == [(0, "line\n")]
+
+
+def test_failed_flush_does_not_raise():
+    def flush(position, content):
+        raise ValueError("down")
+
+    with ChunkedLog(flush=flush, logger=logger, interval=60) as log:
+        log.write("line")
+    assert log.position == 0
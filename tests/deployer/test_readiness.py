@@ -0,0 +1,162 @@
+import logging
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from deployment_server.packages.deployer.readiness import Probe, wait_until_ready
+from deployment_server.packages.deployer.systemd import UnitState
+
+
+class FakeSystemd:
+    """
+    Units run from the start, the restarting ones restart between every two
+    polls.
+    """
+
+    def __init__(self, restarting=()):
+        self.restarting = restarting
+        self.calls = 0
+
+    def get_unit_states(self, units):
+        self.calls += 1
+        return [
+            UnitState(
+                name=unit,
+                load_state="loaded",
+                active_state="active",
+                sub_state="running",
+                n_restarts=self.calls if unit in self.restarting else 0,
+            )
+            for unit in units
+        ]
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path == "/health" else 500)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_wait_until_ready():
+    listener = socket.create_server(("127.0.0.1", 0))
+    server = HTTPServer(("127.0.0.1", 0), HealthHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        probes = [
+            Probe(
+                unit="a.service",
+                port=listener.getsockname()[1],
+                timeout=5,
+                settle=0.3,
+            ),
+            Probe(
+                unit="b.service",
+                port=server.server_address[1],
+                health_path="/health",
+                timeout=5,
+            ),
+            Probe(
+                unit="c.service",
+                port=server.server_address[1],
+                health_path="/broken",
+                timeout=1,
+            ),
+            Probe(unit="d.service", timeout=5, settle=0.3),
+        ]
+        results = wait_until_ready(
+            probes, FakeSystemd(), logging.getLogger(), interval=0.1
+        )
+        assert [(r.unit, r.ready) for r in results] == [
+            ("a.service", True),
+            ("b.service", True),
+            ("c.service", False),
+            ("d.service", True),
+        ]
+        assert results[2].message == "responded with 500"
+    finally:
+        server.shutdown()
+        listener.close()
+
+
+def test_wait_until_ready_concurrently():
+    probes = [
+        Probe(unit=f"{i}.service", port=get_free_port(), timeout=1) for i in range(4)
+    ]
+    start = time.monotonic()
+    results = wait_until_ready(probes, FakeSystemd(), logging.getLogger(), interval=0.1)
+    assert not any(r.ready for r in results)
+    assert time.monotonic() - start < 2
+
+
+def test_wait_until_ready_restart_loop():
+    probes = [Probe(unit="a.service", port=get_free_port(), timeout=30)]
+    start = time.monotonic()
+    results = wait_until_ready(
+        probes,
+        FakeSystemd(restarting=("a.service",)),
+        logging.getLogger(),
+        interval=0.1,
+    )
+    assert results[0].ready is False
+    assert results[0].message.startswith("restarted")
+    assert time.monotonic() - start < 5
+
+
+def test_wait_until_ready_unsettled():
+    # neither a listening socket nor a unit without a port is ready while the
+    # service keeps restarting
+    listener = socket.create_server(("127.0.0.1", 0))
+    try:
+        probes = [
+            Probe(
+                unit="a.service",
+                port=listener.getsockname()[1],
+                timeout=1,
+                settle=0.3,
+            ),
+            Probe(unit="b.service", timeout=1, settle=0.3),
+        ]
+        systemd = FakeSystemd(restarting=("a.service", "b.service"))
+        results = wait_until_ready(
+            probes, systemd, logging.getLogger(), interval=0.1, max_restarts=1000
+        )
+        assert [(r.unit, r.ready) for r in results] == [
+            ("a.service", False),
+            ("b.service", False),
+        ]
+        assert results[1].message == "didn't stay active for 0.3s"
+
+        results = wait_until_ready(
+            probes[1:],
+            FakeSystemd(restarting=("b.service",)),
+            logging.getLogger(),
+            interval=0.1,
+        )
+        assert results[0].ready is False
+        assert results[0].message.startswith("restarted")
+    finally:
+        listener.close()
+
+
+def test_wait_until_ready_inactive_service():
+    class InactiveSystemd(FakeSystemd):
+        def get_unit_states(self, units):
+            states = super().get_unit_states(units)
+            for state in states:
+                state.active_state = "activating"
+            return states
+
+    probes = [Probe(unit="a.service", timeout=0.5, settle=0.1)]
+    results = wait_until_ready(
+        probes, InactiveSystemd(), logging.getLogger(), interval=0.1
+    )
+    assert results[0].ready is False
@@ -0,0 +1,49 @@
+import logging
+import os
+from deployment_server.packages.deployer.releases import Releases
+
+
+def test_releases(tmp_path):
+    releases = Releases(logging.getLogger())
+    releases.keep = 2
+    for version in ("v1", "v2", "v3"):
+        release_dir = releases.prepare(tmp_path, version)
+        releases.switch(tmp_path, release_dir)
+    assert os.readlink(tmp_path / "current") == f"releases/{release_dir.name}"
+    assert releases.get_version(release_dir) == "v3"
+    assert releases.get_version(releases.get_previous(tmp_path)) == "v2"
+
+    assert releases.prune(tmp_path) == 1
+    assert [releases.get_version(d) for d in releases.list(tmp_path)] == ["v2", "v3"]
+
+    # the live release is never installed into
+    v3 = release_dir
+    release_dir = releases.prepare(tmp_path, "v3")
+    assert release_dir != v3
+    assert v3.exists()
+    # a failed attempt is replaced
+    assert releases.prepare(tmp_path, "v3") != release_dir
+    assert not release_dir.exists()
+
+    v2 = releases.list(tmp_path)[0]
+    previous = releases.switch(tmp_path, v2)
+    assert previous == v3
+    assert releases.get_current(tmp_path) == v2
+
+
+def test_releases_order(tmp_path):
+    releases = Releases(logging.getLogger())
+    for version in ("1.10.0", "1.9.0", "2.0.0"):
+        release_dir = releases.prepare(tmp_path, version)
+        releases.switch(tmp_path, release_dir)
+    # the app changes files in its working directory, current
+    (release_dir / "app.pid").write_text("1")
+    os.utime(release_dir, (1000, 1000))
+
+    # in the order they were prepared in, not by mtime or version
+    assert [releases.get_version(d) for d in releases.list(tmp_path)] == [
+        "1.10.0",
+        "1.9.0",
+        "2.0.0",
+    ]
+    assert releases.get_version(releases.get_previous(tmp_path)) == "1.9.0"
@@ -0,0 +1,63 @@
+import logging
+import time
+import pytest
+from deployment_server.packages.deployer.stages import Stage, run_stages
+
+
+logger = logging.getLogger()
+
+
+def test_independent_stages_overlap():
+    def sleep(_):
+        time.sleep(0.3)
+        return True
+
+    started = time.monotonic()
+    results = run_stages(
+        [
+            Stage("os", lambda _: "os"),
+            Stage("secrets", sleep, depends_on=("os",)),
+            Stage("package", sleep, depends_on=("os",)),
+            Stage("units", sleep, depends_on=("os",)),
+            Stage(
+                "systemd",
+                lambda r: sorted(r.keys()),
+                depends_on=("units", "package"),
+            ),
+        ],
+        max_workers=4,
+        logger=logger,
+    )
+    assert time.monotonic() - started < 0.6
+    assert results["os"] == "os"
+    # stages only receive the results of their dependencies
+    assert results["systemd"] == ["package", "units"]
+
+
+def test_failed_stage_stops_dependents():
+    ran = []
+
+    def fail(_):
+        raise ValueError("pip failed")
+
+    with pytest.raises(ValueError, match="stage package failed. error: pip failed"):
+        run_stages(
+            [
+                Stage("package", fail),
+                Stage("systemd", lambda _: ran.append("systemd"), ("package",)),
+            ],
+            max_workers=2,
+            logger=logger,
+        )
+    assert ran == []
+
+
+def test_invalid_dependencies():
+    with pytest.raises(ValueError, match="unknown stage"):
+        run_stages([Stage("a", print, ("b",))], max_workers=1, logger=logger)
+    with pytest.raises(ValueError, match="cycles"):
+        run_stages(
+            [Stage("a", print, ("b",)), Stage("b", print, ("a",))],
+            max_workers=1,
+            logger=logger,
+        )
@@ -0,0 +1,382 @@
+import fnmatch
+import itertools
+import logging
+import pytest
+from collections import deque
+from jeepney import (
+    HeaderFields,
+    new_error,
+    new_method_return,
+    new_signal,
+)
+from deployment_server.models import Daemon, DaemonType
+from deployment_server.packages.deployer.base import Deployer, UnitFile, UnitKind
+from deployment_server.packages.deployer.systemd import (
+    SystemdBus,
+    UnitJob,
+    systemd_manager,
+)
+
+
+class FakeBus:
+    """
+    Answers the calls the deployer makes like the systemd manager would, and
+    keeps the active and unit file state of each unit in between. Finished
+    jobs are announced after all replies of a batch.
+    """
+
+    def __init__(self, failing_units=(), units=()):
+        self.outgoing_serial = itertools.count(1)
+        self.failing_units = failing_units
+        self.incoming = deque()
+        self.signals = deque()
+        self.calls = []
+        self.closed = False
+        self.job_ids = itertools.count(1)
+        # unit -> [active state, unit file state], the given ones run enabled
+        self.units = {unit: ["active", "enabled"] for unit in units}
+        self.paths = {}
+
+    def state(self, unit: str) -> list[str]:
+        return self.units.setdefault(unit, ["inactive", "disabled"])
+
+    def send(self, message, serial=None):
+        message.header.serial = serial
+        member = message.header.fields[HeaderFields.member]
+        self.calls.append((member, message.body))
+        if member in ("StartUnit", "StopUnit", "RestartUnit", "ReloadUnit"):
+            unit = message.body[0]
+            if unit == "missing.service":
+                self.incoming.append(
+                    new_error(
+                        message,
+                        "org.freedesktop.systemd1.NoSuchUnit",
+                        "s",
+                        (f"Unit {unit} not found.",),
+                    )
+                )
+                return
+            job_id = next(self.job_ids)
+            job = f"/org/freedesktop/systemd1/job/{job_id}"
+            self.incoming.append(new_method_return(message, "o", (job,)))
+            result = "failed" if unit in self.failing_units else "done"
+            if member == "StopUnit":
+                self.state(unit)[0] = "inactive"
+            elif member != "ReloadUnit":
+                self.state(unit)[0] = "active" if result == "done" else "failed"
+            self.signals.append(
+                new_signal(
+                    systemd_manager, "JobRemoved", "uoss", (job_id, job, unit, result)
+                )
+            )
+        elif member in ("EnableUnitFiles", "DisableUnitFiles"):
+            for unit in message.body[0]:
+                self.state(unit)[1] = (
+                    "enabled" if member == "EnableUnitFiles" else "disabled"
+                )
+            self.incoming.append(new_method_return(message))
+        elif member == "ListUnitsByPatterns":
+            loaded = [
+                (unit, "", "loaded", state[0], "", "", "/", 0, "", "/")
+                for unit, state in self.units.items()
+                if state != ["inactive", "disabled"]
+                and any(fnmatch.fnmatch(unit, p) for p in message.body[1])
+            ]
+            self.incoming.append(new_method_return(message, "a(ssssssouso)", (loaded,)))
+        elif member == "LoadUnit":
+            name = "".join(
+                c if c.isalnum() else f"_{ord(c):02x}" for c in message.body[0]
+            )
+            path = f"/org/freedesktop/systemd1/unit/{name}"
+            self.paths[path] = message.body[0]
+            self.incoming.append(new_method_return(message, "o", (path,)))
+        elif member == "GetAll":
+            active_state, unit_file_state = self.state(
+                self.paths[message.header.fields[HeaderFields.path]]
+            )
+            properties = {
+                "LoadState": ("s", "loaded"),
+                "ActiveState": ("s", active_state),
+                "SubState": ("s", "running" if active_state == "active" else "dead"),
+                "UnitFileState": ("s", unit_file_state),
+            }
+            self.incoming.append(new_method_return(message, "a{sv}", (properties,)))
+        elif member == "Get":
+            self.incoming.append(new_method_return(message, "v", (("u", 0),)))
+        else:
+            self.incoming.append(new_method_return(message))
+
+    def receive(self, timeout=None):
+        if len(self.incoming) > 0:
+            return self.incoming.popleft()
+        if len(self.signals) > 0:
+            return self.signals.popleft()
+        raise TimeoutError()
+
+    def close(self):
+        self.closed = True
+
+    def unit_calls(self, *members: str) -> list[tuple[str, str]]:
+        return [(m, body[0]) for m, body in self.calls if m in members]
+
+
+def create_deployer(tmp_path, bus: FakeBus) -> Deployer:
+    deployer = Deployer(logger=logging.getLogger())
+    deployer.systemd_root_dir = tmp_path
+    deployer.get_systemd = lambda: SystemdBus(bus, deployer.logger)
+    return deployer
+
+
+def create_units(tmp_path):
+    return [
+        UnitFile(
+            service_id="prod-p1-api",
+            kind=UnitKind.SOCKET,
+            path=tmp_path / "prod-p1-api.socket",
+            content="socket",
+        ),
+        UnitFile(
+            service_id="prod-p1-api",
+            kind=UnitKind.SOCKET_SERVICE,
+            path=tmp_path / "prod-p1-api.service",
+            content="service",
+        ),
+        UnitFile(
+            service_id="prod-p1-jobs",
+            kind=UnitKind.SERVICE,
+            path=tmp_path / "prod-p1-jobs.service",
+            content="service",
+        ),
+    ]
+
+
+def test_setup_new_systemd_units(tmp_path):
+    bus = FakeBus()
+    deployer = create_deployer(tmp_path, bus)
+    assert deployer.setup_systemd_units(create_units(tmp_path)) is True
+
+    assert bus.unit_calls("EnableUnitFiles") == [
+        ("EnableUnitFiles", ["prod-p1-api.socket", "prod-p1-jobs.service"])
+    ]
+    assert "Reload" in [member for member, _ in bus.calls]
+    # socket services are started by their sockets
+    assert bus.unit_calls("StartUnit", "RestartUnit", "ReloadUnit") == [
+        ("StartUnit", "prod-p1-api.socket"),
+        ("StartUnit", "prod-p1-jobs.service"),
+    ]
+    assert bus.closed
+
+
+def test_setup_existing_systemd_units(tmp_path):
+    units = create_units(tmp_path)
+    bus = FakeBus(units=["prod-p1-api.socket", "prod-p1-jobs.service"])
+    deployer = create_deployer(tmp_path, bus)
+    for unit in units:
+        unit.path.write_text(unit.content)
+    assert deployer.setup_systemd_units(units) is True
+
+    assert bus.unit_calls("StartUnit", "RestartUnit", "ReloadUnit") == [
+        ("RestartUnit", "prod-p1-api.service"),
+        ("ReloadUnit", "prod-p1-jobs.service"),
+    ]
+    assert "Reload" not in [member for member, _ in bus.calls]
+    assert "EnableUnitFiles" not in [member for member, _ in bus.calls]
+
+
+def test_setup_systemd_units_failing_job(tmp_path):
+    bus = FakeBus(failing_units=("prod-p1-jobs.service",))
+    deployer = create_deployer(tmp_path, bus)
+    with pytest.raises(ValueError, match=r"prod-p1-jobs\.service \(failed\)"):
+        deployer.setup_systemd_units(create_units(tmp_path))
+    assert bus.closed
+
+
+def test_run_jobs_with_error_reply():
+    bus = FakeBus()
+    systemd = SystemdBus(bus, logging.getLogger())
+    results = systemd.run_jobs(
+        [
+            UnitJob(method="StartUnit", unit="missing.service"),
+            UnitJob(method="StartUnit", unit="a.service"),
+        ]
+    )
+    assert [(r.unit, r.result) for r in results] == [
+        (
+            "missing.service",
+            "org.freedesktop.systemd1.NoSuchUnit Unit missing.service not found.",
+        ),
+        ("a.service", "done"),
+    ]
+
+
+def test_reconcile_changed_systemd_units(tmp_path):
+    units = create_units(tmp_path)
+    bus = FakeBus(units=["prod-p1-api.socket", "prod-p1-jobs.service"])
+    deployer = create_deployer(tmp_path, bus)
+    for unit in units:
+        unit.path.write_text(unit.content)
+    units[2].content = "service with a new module"
+    api_mtime = units[1].path.stat().st_mtime_ns
+    assert deployer.setup_systemd_units(units, release_changed=False) is True
+
+    assert units[2].path.read_text() == "service with a new module"
+    assert units[1].path.stat().st_mtime_ns == api_mtime
+    members = [member for member, _ in bus.calls]
+    assert members.count("Reload") == 1
+    assert bus.unit_calls("StartUnit", "RestartUnit", "ReloadUnit") == [
+        ("RestartUnit", "prod-p1-jobs.service")
+    ]
+
+
+def test_reconcile_unchanged_systemd_units(tmp_path):
+    units = create_units(tmp_path)
+    bus = FakeBus(units=["prod-p1-api.socket", "prod-p1-jobs.service"])
+    deployer = create_deployer(tmp_path, bus)
+    for unit in units:
+        unit.path.write_text(unit.content)
+    assert deployer.setup_systemd_units(units, release_changed=False) is True
+
+    members = [member for member, _ in bus.calls]
+    assert "Reload" not in members
+    assert (
+        bus.unit_calls(
+            "StartUnit", "StopUnit", "RestartUnit", "ReloadUnit", "EnableUnitFiles"
+        )
+        == []
+    )
+
+
+def test_reconcile_stopped_systemd_unit(tmp_path):
+    units = create_units(tmp_path)
+    bus = FakeBus(units=["prod-p1-api.socket", "prod-p1-jobs.service"])
+    bus.units["prod-p1-jobs.service"] = ["inactive", "enabled"]
+    deployer = create_deployer(tmp_path, bus)
+    for unit in units:
+        unit.path.write_text(unit.content)
+    assert deployer.setup_systemd_units(units, release_changed=False) is True
+
+    # the file is unchanged, the unit still has to run
+    assert bus.unit_calls("StartUnit", "RestartUnit", "ReloadUnit") == [
+        ("StartUnit", "prod-p1-jobs.service")
+    ]
+
+
+def create_api_units(deployer: Deployer, tmp_path, instances: int):
+    daemon = Daemon(
+        type=DaemonType.SYSTEMD,
+        name="api",
+        port=8001,
+        py_module_name="app",
+        instances=instances,
+    )
+    return deployer.render_systemd_units([daemon], "p1", "prod", "p1", "deployer")
+
+
+def test_setup_template_systemd_units(tmp_path):
+    bus = FakeBus()
+    deployer = create_deployer(tmp_path, bus)
+    units = [
+        UnitFile(
+            service_id="prod-p1-jobs",
+            kind=UnitKind.SERVICE,
+            path=tmp_path / "prod-p1-jobs@.service",
+            content="service",
+            instances=["1", "2"],
+        )
+    ]
+    assert deployer.setup_systemd_units(units) is True
+    assert bus.unit_calls("EnableUnitFiles") == [
+        ("EnableUnitFiles", ["prod-p1-jobs@1.service", "prod-p1-jobs@2.service"])
+    ]
+    assert bus.unit_calls("StartUnit") == [
+        ("StartUnit", "prod-p1-jobs@1.service"),
+        ("StartUnit", "prod-p1-jobs@2.service"),
+    ]
+
+
+def test_scale_systemd_units_from_one_to_many(tmp_path):
+    bus = FakeBus()
+    deployer = create_deployer(tmp_path, bus)
+    deployer.setup_systemd_units(create_api_units(deployer, tmp_path, 1))
+    # activated by a connection to its socket
+    bus.units["prod-p1-api.service"] = ["active", "disabled"]
+    bus.calls.clear()
+
+    units = create_api_units(deployer, tmp_path, 3)
+    assert deployer.setup_systemd_units(units, release_changed=False) is True
+
+    # the plain socket holds the base port, it goes before the instances start
+    assert bus.unit_calls("StopUnit", "StartUnit") == [
+        ("StopUnit", "prod-p1-api.socket"),
+        ("StopUnit", "prod-p1-api.service"),
+        ("StartUnit", "prod-p1-api@8001.socket"),
+        ("StartUnit", "prod-p1-api@8002.socket"),
+        ("StartUnit", "prod-p1-api@8003.socket"),
+    ]
+    assert bus.unit_calls("DisableUnitFiles") == [
+        ("DisableUnitFiles", ["prod-p1-api.socket", "prod-p1-api.service"])
+    ]
+    assert sorted(f.name for f in tmp_path.iterdir()) == [
+        "prod-p1-api@.service",
+        "prod-p1-api@.socket",
+    ]
+    assert {u: s for u, s in bus.units.items() if s[1] == "enabled"} == {
+        f"prod-p1-api@{port}.socket": ["active", "enabled"]
+        for port in (8001, 8002, 8003)
+    }
+
+
+def test_scale_systemd_units_up(tmp_path):
+    bus = FakeBus()
+    deployer = create_deployer(tmp_path, bus)
+    deployer.setup_systemd_units(create_api_units(deployer, tmp_path, 2))
+    bus.calls.clear()
+
+    # the template files stay the same, only the new instance is added
+    units = create_api_units(deployer, tmp_path, 4)
+    assert deployer.setup_systemd_units(units, release_changed=False) is True
+    assert bus.unit_calls("EnableUnitFiles") == [
+        ("EnableUnitFiles", ["prod-p1-api@8003.socket", "prod-p1-api@8004.socket"])
+    ]
+    assert bus.unit_calls("StopUnit", "StartUnit", "RestartUnit") == [
+        ("StartUnit", "prod-p1-api@8003.socket"),
+        ("StartUnit", "prod-p1-api@8004.socket"),
+    ]
+
+
+def test_scale_systemd_units_down(tmp_path):
+    bus = FakeBus()
+    deployer = create_deployer(tmp_path, bus)
+    deployer.setup_systemd_units(create_api_units(deployer, tmp_path, 3))
+    bus.units["prod-p1-api@8003.service"] = ["active", "disabled"]
+    bus.calls.clear()
+
+    units = create_api_units(deployer, tmp_path, 2)
+    assert deployer.setup_systemd_units(units, release_changed=False) is True
+    assert bus.unit_calls("StopUnit", "StartUnit", "RestartUnit") == [
+        ("StopUnit", "prod-p1-api@8003.socket"),
+        ("StopUnit", "prod-p1-api@8003.service"),
+    ]
+    assert bus.units["prod-p1-api@8003.socket"] == ["inactive", "disabled"]
+
+
+def test_scale_systemd_units_from_many_to_one(tmp_path):
+    bus = FakeBus()
+    deployer = create_deployer(tmp_path, bus)
+    deployer.setup_systemd_units(create_api_units(deployer, tmp_path, 2))
+    bus.calls.clear()
+
+    units = create_api_units(deployer, tmp_path, 1)
+    assert deployer.setup_systemd_units(units, release_changed=False) is True
+    assert bus.unit_calls("StopUnit", "StartUnit") == [
+        ("StopUnit", "prod-p1-api@8001.socket"),
+        ("StopUnit", "prod-p1-api@8002.socket"),
+        ("StartUnit", "prod-p1-api.socket"),
+    ]
+    assert sorted(f.name for f in tmp_path.iterdir()) == [
+        "prod-p1-api.service",
+        "prod-p1-api.socket",
+    ]
+    assert bus.unit_calls("EnableUnitFiles") == [
+        ("EnableUnitFiles", ["prod-p1-api.socket"])
+    ]
@@ -0,0 +1,158 @@
+import logging
+import pytest
+from pathlib import Path
+from pydantic import ValidationError
+from deployment_server.models import Daemon, DaemonType, SystemdUnit
+from deployment_server.packages.deployer.base import Deployer, UnitKind
+
+
+def create_deployer(tmp_path: Path) -> Deployer:
+    deployer = Deployer(logger=logging.getLogger())
+    deployer.systemd_root_dir = tmp_path
+    return deployer
+
+
+def test_render_systemd_units(tmp_path):
+    deployer = create_deployer(tmp_path)
+    daemons = [
+        Daemon(type=DaemonType.SYSTEMD, name="api", port=8001, py_module_name="app"),
+        Daemon(type=DaemonType.SYSTEMD, name="jobs", py_module_name="app.jobs"),
+    ]
+    units = deployer.render_systemd_units(daemons, "p1", "prod", "p1", "deployer")
+    assert [(u.path.name, u.kind) for u in units] == [
+        ("prod-p1-api.socket", UnitKind.SOCKET),
+        ("prod-p1-api.service", UnitKind.SOCKET_SERVICE),
+        ("prod-p1-jobs.service", UnitKind.SERVICE),
+    ]
+    assert "ListenStream=8001" in units[0].content
+    assert "ExecStart=/opt/prod-p1/current/.venv/bin/python -m app --port 8001" in (
+        units[1].content
+    )
+    assert (
+        "ExecStart=/opt/prod-p1/current/.venv/bin/python -m app.jobs"
+        in units[2].content
+    )
+    assert "WorkingDirectory=/opt/prod-p1/current" in units[2].content
+    assert "ReadWritePaths=/opt/prod-p1 " in units[2].content
+
+
+def test_render_systemd_template_units(tmp_path):
+    deployer = create_deployer(tmp_path)
+    daemons = [
+        Daemon(
+            type=DaemonType.SYSTEMD,
+            name="api",
+            port=8001,
+            py_module_name="app",
+            instances=2,
+        ),
+        Daemon(
+            type=DaemonType.SYSTEMD, name="jobs", py_module_name="app.jobs", instances=3
+        ),
+    ]
+    units = deployer.render_systemd_units(daemons, "p1", "prod", "p1", "deployer")
+    assert [(u.path.name, u.unit_names()) for u in units] == [
+        ("prod-p1-api@.socket", ["prod-p1-api@8001.socket", "prod-p1-api@8002.socket"]),
+        (
+            "prod-p1-api@.service",
+            ["prod-p1-api@8001.service", "prod-p1-api@8002.service"],
+        ),
+        (
+            "prod-p1-jobs@.service",
+            [
+                "prod-p1-jobs@1.service",
+                "prod-p1-jobs@2.service",
+                "prod-p1-jobs@3.service",
+            ],
+        ),
+    ]
+    assert "ListenStream=%i" in units[0].content
+    assert "PartOf=prod-p1-api@%i.service" in units[0].content
+    assert "-m app --port %i" in units[1].content
+    assert units[0].service_names() == [
+        "prod-p1-api@8001.service",
+        "prod-p1-api@8002.service",
+    ]
+
+
+def test_render_systemd_units_resource_controls(tmp_path):
+    deployer = create_deployer(tmp_path)
+    daemon = Daemon(
+        type=DaemonType.SYSTEMD,
+        name="api",
+        py_module_name="app",
+        cpu_quota=150,
+        memory_high="768M",
+        memory_max="1G",
+        nice=-5,
+        cpu_affinity="0-3",
+        numa_policy="bind",
+        numa_mask="0",
+    )
+    units = deployer.render_systemd_units([daemon], "p1", "prod", "p1", "deployer")
+    for line in (
+        "CPUQuota=150%",
+        "MemoryHigh=768M",
+        "MemoryMax=1G",
+        "TasksMax=50",
+        "Nice=-5",
+        "CPUAffinity=0-3",
+        "NUMAPolicy=bind",
+        "NUMAMask=0",
+    ):
+        assert f"\n{line}\n" in units[0].content
+    assert "CPUWeight" not in units[0].content
+
+
+def test_render_systemd_units_lift_resource_controls(tmp_path):
+    deployer = create_deployer(tmp_path)
+    daemon = Daemon(
+        type=DaemonType.SYSTEMD,
+        name="api",
+        py_module_name="app",
+        cpu_quota=0,
+        memory_max="infinity",
+        tasks_max=0,
+    )
+    units = deployer.render_systemd_units([daemon], "p1", "prod", "p1", "deployer")
+    assert "\nMemoryMax=infinity\nTasksMax=infinity\n" in units[0].content
+    assert "CPUQuota" not in units[0].content
+
+
+def test_systemd_unit_resource_controls_validation():
+    SystemdUnit(name="api", memory_max="2G", cpu_affinity="0,2-3")
+    SystemdUnit(name="api", cpu_quota=0, tasks_max=0, memory_max="infinity")
+    SystemdUnit(name="api", memory_high="1G", memory_max="infinity")
+    SystemdUnit(name="api", memory_high="256M")
+    for invalid in (
+        {"memory_max": "2 GB"},
+        {"cpu_affinity": "all"},
+        {"nice": 20},
+        # at or above memory_max, the default 512M one included
+        {"memory_high": "768M"},
+        {"memory_high": "2G", "memory_max": "1G"},
+        {"memory_high": "1G", "memory_max": "1024M"},
+    ):
+        with pytest.raises(ValidationError):
+            SystemdUnit(name="api", **invalid)
+
+
+def test_write_file_removes_tmp_file(tmp_path):
+    deployer = create_deployer(tmp_path)
+    target = tmp_path / "app.service"
+    success, _ = deployer.write_file(target, "[Unit]\n")
+    assert success
+    assert target.read_text() == "[Unit]\n"
+
+    # a directory in the way fails the rename
+    target = tmp_path / "other.service"
+    target.mkdir()
+    success, _ = deployer.write_file(target, "[Unit]\n")
+    assert not success
+    # an error while writing
+    with pytest.raises(UnicodeEncodeError):
+        deployer.write_file(tmp_path / "app.service", "\udc80")
+    assert sorted(f.name for f in tmp_path.iterdir()) == [
+        "app.service",
+        "other.service",
+    ]
@@ -0,0 +1,33 @@
+import logging
+import subprocess
+from deployment_server.packages.deployer.venv_template import VenvTemplate
+
+
+def test_clone_venv_template(tmp_path):
+    venv_template = VenvTemplate(tmp_path / "templates", logging.getLogger())
+    venv_template.upgrade_deps = False
+    template_dir = venv_template.build()
+    venv_dir = tmp_path / "app" / ".venv"
+    venv_dir.parent.mkdir()
+    venv_template.clone(venv_dir)
+
+    result = subprocess.run(
+        [str(venv_dir / "bin" / "python"), "-c", "import sys; print(sys.prefix)"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.stdout.strip() == str(venv_dir)
+    pip_script = (venv_dir / "bin" / "pip").read_text()
+    assert pip_script.startswith(f"#!{venv_dir}/bin/python")
+    assert str(venv_dir) not in (template_dir / "bin" / "pip").read_text()
+    assert str(venv_dir) not in (template_dir / "pyvenv.cfg").read_text()
+
+    result = subprocess.run(
+        [str(venv_dir / "bin" / "pip"), "--version"], capture_output=True, text=True
+    )
+    assert result.returncode == 0
+
+    # package files are shared with the template
+    template_pip = next(template_dir.glob("lib/python*/site-packages/pip/__init__.py"))
+    cloned_pip = venv_dir / template_pip.relative_to(template_dir)
+    assert template_pip.stat().st_ino == cloned_pip.stat().st_ino
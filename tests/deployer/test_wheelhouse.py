@@ -0,0 +1,90 @@
+import logging
+import os
+from types import SimpleNamespace
+from deployment_server.packages.deployer.base import Deployer
+from deployment_server.packages.deployer.wheelhouse import Wheelhouse
+
+
+def make_wheel(dir, name: str, size: int = 100):
+    f = dir / name
+    f.write_bytes(b"0" * size)
+    return f
+
+
+def test_wheelhouse_key():
+    assert Wheelhouse.key("Foo_Bar-1.0-py3-none-any.whl") == Wheelhouse.key(
+        "foo_bar-1.0-py3-none-any.whl"
+    )
+    assert Wheelhouse.key("foo-1.0-py3-none-any.whl") != Wheelhouse.key(
+        "foo-1.1-py3-none-any.whl"
+    )
+    assert Wheelhouse.key("foo-1.0-py3-none-any.whl") != Wheelhouse.key(
+        "foo-1.0-cp312-cp312-manylinux_2_17_x86_64.whl"
+    )
+
+
+def test_wheelhouse_add(tmp_path):
+    wheelhouse = Wheelhouse(tmp_path / "wh", 10_000, logging.getLogger())
+    wheelhouse.setup()
+    wheels_dir = tmp_path / "wheels"
+    wheels_dir.mkdir()
+    make_wheel(wheels_dir, "foo-1.0-py3-none-any.whl")
+    make_wheel(wheels_dir, "bar-2.0-py3-none-any.whl")
+
+    assert wheelhouse.add_all(wheels_dir) == 2
+    assert wheelhouse.add_all(wheels_dir) == 0
+    assert sorted(f.name for f in wheelhouse.links_dir.iterdir()) == [
+        "bar-2.0-py3-none-any.whl",
+        "foo-1.0-py3-none-any.whl",
+    ]
+
+
+def test_wheelhouse_prune(tmp_path):
+    wheelhouse = Wheelhouse(tmp_path / "wh", 250, logging.getLogger())
+    wheelhouse.setup()
+    names = [
+        "old-1.0-py3-none-any.whl",
+        "mid-1.0-py3-none-any.whl",
+        "new-1.0-py3-none-any.whl",
+    ]
+    for i, name in enumerate(names):
+        wheelhouse.add(make_wheel(tmp_path, name))
+        object_dir = wheelhouse.objects_dir / Wheelhouse.key(name)
+        os.utime(object_dir / name, (1000 + i, 1000 + i))
+        os.utime(object_dir, (1000 + i, 1000 + i))
+    # the oldest one is used again
+    wheelhouse.add(tmp_path / "old-1.0-py3-none-any.whl")
+
+    assert wheelhouse.prune() == 1
+    assert sorted(f.name for f in wheelhouse.links_dir.iterdir()) == [
+        "new-1.0-py3-none-any.whl",
+        "old-1.0-py3-none-any.whl",
+    ]
+
+
+def test_install_pip_package_online_pins_version(tmp_path):
+    deployer = Deployer(logger=logging.getLogger())
+    deployer.wheelhouse = Wheelhouse(tmp_path / "wh", 10_000, logging.getLogger())
+    deployer.wheelhouse.setup()
+    calls = []
+
+    def run(args, **kwargs):
+        calls.append(args)
+        return SimpleNamespace(returncode=0, stdout="", stderr="")
+
+    deployer.run = run
+    args = dict(
+        application_dir=tmp_path,
+        pip_exec=tmp_path / "pip",
+        pip_package_name="foo",
+        pip_index_url="https://pypi.example.com/simple",
+        pip_index_user="u",
+        pip_index_auth="p",
+    )
+    deployer.install_pip_package_online(**args, version="1.2.0")
+    # a wheelhouse miss still installs the deployment's version
+    assert [c[-1] for c in calls] == ["foo==1.2.0", "foo==1.2.0"]
+
+    calls.clear()
+    deployer.install_pip_package_online(**args)
+    assert [c[-1] for c in calls] == ["foo", "foo"]
@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+
+@pytest_asyncio.fixture(autouse=True, scope="module", loop_scope="session")
+async def setup_events(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+
+    async with session_factory() as session:
+        await session.execute(
+            text(
+                "insert into project (rid, name, code, secrets_provider) values ('events1', 'events1', 'events1', 'LOCAL')"
+            )
+        )
+        await session.execute(
+            text(
+                "insert into deployment (rid, project_rid, version, mode) values ('events1', 'events1', '0.1.0', 'prod')"
+            )
+        )
+        await session.commit()
+
+    yield
+
+    async with session_factory() as session:
+        await session.execute(text("delete from project where rid = 'events1'"))
+        await session.commit()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_status_changes_reach_all_subscribers(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+    event_hub = await app.container.event_hub()
+
+    async with event_hub.subscribe() as first, event_hub.subscribe() as second:
+        async with session_factory() as session:
+            await session.execute(
+                text(
+                    "insert into deployment_status_update (rid, deployment_rid, status) values ('events1', 'events1', 'READY')"
+                )
+            )
+            await session.execute(
+                text(
+                    "update deployment_status_update set status = 'RUNNING' where rid = 'events1'"
+                )
+            )
+            await session.commit()
+
+        for queue in (first, second):
+            statuses = []
+            for _ in range(2):
+                event = await asyncio.wait_for(queue.get(), 5)
+                assert event["deployment_rid"] == "events1"
+                assert event["status_rid"] == "events1"
+                statuses.append(event["status"])
+            assert statuses == ["READY", "RUNNING"]
+
+    assert len(event_hub.subscribers) == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_slow_subscriber_is_dropped(get_app):
+    event_hub = await get_app.container.event_hub()
+
+    async with event_hub.subscribe() as queue:
+        for i in range(event_hub.queue_size + 1):
+            event_hub.on_notify(None, 0, event_hub.channel, '{"n": %d}' % i)
+        assert queue not in event_hub.subscribers
+        assert queue.get_nowait() is None
@@ -0,0 +1,30 @@
+import asyncio
+import threading
+import pytest
+
+from deployment_server.modules.loop import EventLoopThread
+
+
+def test_event_loop_thread():
+    event_loop = EventLoopThread()
+
+    async def where():
+        await asyncio.sleep(0)
+        return threading.current_thread().name, asyncio.get_running_loop()
+
+    name, loop = event_loop.run(where())
+    assert name == "event-loop"
+    # the same loop serves every call
+    assert event_loop.run(where())[1] is loop
+
+    async def nested():
+        event_loop.run(where())
+
+    with pytest.raises(RuntimeError):
+        event_loop.run(nested())
+
+    event_loop.stop()
+    assert event_loop.loop is None
+    # started again on demand
+    assert event_loop.run(where())[0] == "event-loop"
+    event_loop.stop()
@@ -79,3 +79,11 @@ def test_setup_static_host(
     )
 
     mock_open.assert_called_once_with(f"{nginx_conf_dir}/{server_names[0]}.conf", "w")
+
+
+def test_get_upstream_servers():
+    assert nginx.get_upstream_servers(8001, 3) == (
+        "127.0.0.1:8001",
+        "127.0.0.1:8002",
+        "127.0.0.1:8003",
+    )
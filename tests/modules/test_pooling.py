@@ -0,0 +1,67 @@
+import pytest
+from httpx import ASGITransport, AsyncClient, BasicAuth
+from sqlalchemy import create_engine, text
+
+from deployment_server.modules import pooling
+
+
+def test_pool_options():
+    options = pooling.get_pool_options({})
+    assert options["pool_size"] == 5
+    assert options["max_overflow"] == 10
+    # sqlalchemy's own defaults
+    assert options["pool_recycle"] == -1
+    assert options["pool_pre_ping"] is False
+
+    options = pooling.get_pool_options(
+        {"db_pool_size": "20", "db_pool_recycle": "1800", "db_pool_pre_ping": "1"}
+    )
+    assert options["pool_size"] == 20
+    assert options["pool_recycle"] == 1800
+    assert options["pool_pre_ping"] is True
+
+    assert pooling.get_server_settings({"db_statement_timeout": ""}) == {}
+    assert pooling.get_server_settings(
+        {"db_statement_timeout": "5000", "db_idle_in_transaction_timeout": "60000"}
+    ) == {
+        "statement_timeout": "5000",
+        "idle_in_transaction_session_timeout": "60000",
+    }
+
+
+def test_pool_status():
+    engine = create_engine(
+        "sqlite://", poolclass=pooling.InstrumentedQueuePool, pool_size=2
+    )
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+        status = pooling.get_pool_status(engine.pool)
+        assert status["checked_out"] == 1
+        assert status["checkouts"] == 1
+    status = pooling.get_pool_status(engine.pool)
+    assert status["checked_out"] == 0
+    assert status["checked_in"] == 1
+    assert status["wait_seconds_max"] >= 0
+    engine.dispose()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_health_pool(get_app):
+    app = get_app
+    auth = BasicAuth(
+        username=app.container.config.api_user(),
+        password=app.container.config.api_secret(),
+    )
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test", follow_redirects=True
+    ) as client:
+        response = await client.get("/health/pool")
+        assert response.status_code == 401
+
+        response = await client.get("/health/pool", auth=auth)
+        assert response.status_code == 200
+        status = response.json()
+        assert status["size"] == 5
+        assert status["checkouts"] >= 1
+        assert "overflow" in status
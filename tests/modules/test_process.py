@@ -0,0 +1,27 @@
+import sys
+from deployment_server.modules import process
+
+
+def test_run_streams_lines():
+    script = "import sys\nfor i in range(5000): print(i)\nprint('oops', file=sys.stderr)\nsys.exit(3)"
+    lines = []
+    result = process.run([sys.executable, "-c", script], on_line=lines.append)
+    assert result.returncode == 3
+    assert len(lines) == 5001
+    assert lines[:3] == ["0", "1", "2"]
+    assert "oops" in lines
+    # only the tails are kept
+    assert result.stdout.splitlines() == [str(i) for i in range(4900, 5000)]
+    assert result.stderr == "oops"
+
+
+def test_run_splits_long_lines(monkeypatch):
+    monkeypatch.setattr(process, "max_line_size", 10)
+    lines = []
+    result = process.run(
+        [sys.executable, "-c", "print('a' * 25, end='')"],
+        on_line=lines.append,
+        merge_stderr=True,
+    )
+    assert result.returncode == 0
+    assert lines == ["a" * 10, "a" * 10, "a" * 5]
@@ -0,0 +1,169 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+
+# tables that must always be reached through an index by the hot queries
+indexed_tables = ("project", "deployment", "deployment_status_update", "daemon")
+
+
+@pytest_asyncio.fixture(autouse=True, scope="module", loop_scope="session")
+async def setup_query_plans(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+
+    async with session_factory() as session:
+        await session.execute(
+            text(
+                """
+insert into project (rid, name, code, git_url, secrets_provider)
+select 'plan' || i, 'plan' || i, 'plan' || i, 'git://github.com/plan/' || i || '.git', 'LOCAL'
+from generate_series(1, 200) i;
+"""
+            )
+        )
+        await session.execute(
+            text(
+                """
+insert into daemon (rid, type, project_rid, name)
+select 'plan' || i, 'SYSTEMD', 'plan' || i, 'api'
+from generate_series(1, 200) i;
+"""
+            )
+        )
+        await session.execute(
+            text(
+                """
+insert into deployment (rid, project_rid, version, mode)
+select 'plan' || i || '-' || v, 'plan' || i, '0.' || v || '.0', 'prod'
+from generate_series(1, 200) i, generate_series(1, 20) v;
+"""
+            )
+        )
+        await session.execute(
+            text(
+                """
+insert into deployment_status_update (rid, deployment_rid, status)
+select 'plan' || i || '-' || v, 'plan' || i || '-' || v,
+    (case when v = 20 and i % 50 = 0 then 'READY' else 'SUCCESS' end)::deployment_status
+from generate_series(1, 200) i, generate_series(1, 20) v;
+"""
+            )
+        )
+        await session.commit()
+        await session.execute(text("analyze"))
+
+    yield
+
+    async with session_factory() as session:
+        await session.execute(text("delete from project where rid like 'plan%'"))
+        await session.commit()
+
+
+def capture_statements():
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        captured.append((statement, parameters))
+
+    return captured, before_cursor_execute
+
+
+def find_seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan["Relation Name"] in indexed_tables:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+async def explain(session_factory, statements) -> list[str]:
+    seq_scans = []
+    async with session_factory() as session:
+        conn = await session.connection()
+        # with seq scans discouraged, any scan left means there is no usable index
+        await conn.exec_driver_sql("set local enable_seqscan = off")
+        for statement, parameters in statements:
+            if not statement.lstrip().lower().startswith("select"):
+                continue
+            result = await conn.exec_driver_sql(
+                f"explain (format json) {statement}", parameters
+            )
+            plan = result.scalar_one()[0]["Plan"]
+            seq_scans.extend(find_seq_scans(plan))
+        await session.rollback()
+    return seq_scans
+
+
+async def run_captured(coro_factory):
+    captured, listener = capture_statements()
+    event.listen(Engine, "before_cursor_execute", listener)
+    try:
+        await coro_factory()
+    finally:
+        event.remove(Engine, "before_cursor_execute", listener)
+    assert len(captured) > 0
+    return captured
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_query_plan_pick_deployments(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+    deployment_repo = await app.container.deployment_repo()
+
+    async def query():
+        async with session_factory() as session:
+            await session.execute(text(deployment_repo.query_latest_status))
+
+    captured = await run_captured(query)
+    assert await explain(session_factory, captured) == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_query_plan_get_latest_statuses(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+    deployment_repo = await app.container.deployment_repo()
+
+    captured = await run_captured(
+        lambda: deployment_repo.get_latest_statuses("plan7", "0.3.0")
+    )
+    assert await explain(session_factory, captured) == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_query_plan_get_project(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+    project_repo = await app.container.project_repo()
+
+    for column_name, value in (
+        ("rid", "plan7"),
+        ("code", "plan7"),
+        ("git_url", "git://github.com/plan/7.git"),
+    ):
+        captured = await run_captured(
+            lambda: project_repo.get_one_by(column_name, value)
+        )
+        assert await explain(session_factory, captured) == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_query_plan_get_page(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+    project_repo = await app.container.project_repo()
+    deployment_repo = await app.container.deployment_repo()
+
+    projects = await project_repo.get_page(10, expand={"daemons", "deployments"})
+    after = (projects[-1].created_at, projects[-1].rid)
+    for query in (
+        lambda: project_repo.get_page(10, after, {"daemons", "deployments"}),
+        lambda: deployment_repo.get_page(10, after, {"project", "status_updates"}),
+        lambda: deployment_repo.get_page(10, after, project_rid="plan7"),
+    ):
+        captured = await run_captured(query)
+        assert await explain(session_factory, captured) == []
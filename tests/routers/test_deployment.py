@@ -12,7 +12,7 @@ async def setup_deployment(get_app):
     async with session_factory() as session:
         await session.execute(
             text(
-                "insert into project (rid, name, code, git_url) values (:rid, :name, :code, :git_url)"
+                "insert into project (rid, name, code, git_url, secrets_provider) values (:rid, :name, :code, :git_url, 'LOCAL')"
             ),
             {
                 "rid": "rid1",
@@ -61,3 +61,89 @@ async def test_deployment(get_app):
         assert response2.status_code == 200
         response2_dict = response2.json()
         assert "rid" in response2_dict
+
+        body_scheduled = {
+            "git_url": "git://github.com/some/server.git",
+            "version": "0.2.0",
+            "scheduled_to_run_at": "2099-01-01T03:00:00+00:00",
+        }
+        response3 = await client.post(
+            "/deployment", json=body_scheduled, headers=headers, auth=auth
+        )
+        assert response3.status_code == 200
+        assert response3.json()["status"] == "SCHEDULED"
+
+        rid = response2_dict["rid"]
+        session_factory = await app.container.session_factory()
+        async with session_factory() as session:
+            await session.execute(
+                text(
+                    "insert into deployment_log (rid, deployment_rid, position, content) values ('log1', :rid, 0, 'one\ntwo\n'), ('log2', :rid, 8, 'three\n')"
+                ),
+                {"rid": rid},
+            )
+            await session.commit()
+
+        response4 = await client.get(f"/deployment/{rid}/log", auth=auth)
+        assert response4.status_code == 200
+        assert response4.json() == {
+            "content": "one\ntwo\nthree\n",
+            "offset": 0,
+            "next_offset": 14,
+        }
+
+        response5 = await client.get(f"/deployment/{rid}/log?offset=4", auth=auth)
+        assert response5.json()["content"] == "two\nthree\n"
+
+        response6 = await client.get(f"/deployment/{rid}/log?offset=14", auth=auth)
+        assert response6.json() == {"content": "", "offset": 14, "next_offset": 14}
+
+        response7 = await client.get("/deployment/nope/log", auth=auth)
+        assert response7.status_code == 404
+
+        async with session_factory() as session:
+            await session.execute(
+                text(
+                    "insert into deployment_status_update (rid, deployment_rid, status) values ('done1', :rid, 'SUCCESS')"
+                ),
+                {"rid": rid},
+            )
+            await session.commit()
+
+        # a finished deployment gets its final status and the stream ends
+        response8 = await client.get(f"/deployment/{rid}/events", auth=auth)
+        assert response8.status_code == 200
+        assert response8.headers["content-type"].startswith("text/event-stream")
+        assert response8.text.startswith("event: status\nid: done1\n")
+        assert '"status": "SUCCESS"' in response8.text
+
+        response9 = await client.get("/deployment/nope/events", auth=auth)
+        assert response9.status_code == 404
+
+        response10 = await client.get(
+            "/deployment/list",
+            params={"project_rid": "rid1", "limit": 1, "expand": "project"},
+            auth=auth,
+        )
+        assert response10.status_code == 200
+        page = response10.json()
+        assert len(page) == 1
+        assert page[0]["project"]["rid"] == "rid1"
+        assert "status_updates" not in page[0]
+        cursor = response10.headers["X-Next-Cursor"]
+
+        response11 = await client.get(
+            "/deployment/list",
+            params={
+                "project_rid": "rid1",
+                "cursor": cursor,
+                "expand": "status_updates",
+            },
+            auth=auth,
+        )
+        assert response11.status_code == 200
+        page2 = response11.json()
+        assert page[0]["rid"] not in [x["rid"] for x in page2]
+        assert all("project" not in x for x in page2)
+        assert all(isinstance(x["status_updates"], list) for x in page2)
+        assert "X-Next-Cursor" not in response11.headers
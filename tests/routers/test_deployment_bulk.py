@@ -0,0 +1,137 @@
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient, BasicAuth
+from sqlalchemy import text
+
+
+@pytest_asyncio.fixture(autouse=True, scope="module", loop_scope="session")
+async def setup_deployment_bulk(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+
+    async with session_factory() as session:
+        await session.execute(
+            text(
+                """
+insert into project (rid, name, code, git_url, secrets_provider) values
+('bulk1', 'bulk1', 'bulk1', 'git://github.com/bulk/1.git', 'LOCAL'),
+('bulk2', 'bulk2', 'bulk2', 'git://github.com/bulk/2.git', 'LOCAL'),
+('bulk3', 'bulk3', 'bulk3', null, 'LOCAL');
+"""
+            )
+        )
+        await session.execute(
+            text(
+                """
+insert into deployment (rid, project_rid, version, mode) values
+('bulk1', 'bulk1', '0.9.0', 'default'),
+('bulk2', 'bulk2', '0.9.0', 'default');
+"""
+            )
+        )
+        await session.execute(
+            text(
+                """
+insert into deployment_status_update (rid, deployment_rid, status) values
+('bulk1', 'bulk1', 'SUCCESS'),
+('bulk2', 'bulk2', 'FAILED');
+"""
+            )
+        )
+        await session.commit()
+
+    yield
+
+    async with session_factory() as session:
+        await session.execute(text("delete from project where rid like 'bulk%'"))
+        await session.commit()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_deployment_create_bulk(get_app):
+    app = get_app
+    auth = BasicAuth(
+        username=app.container.config.api_user(),
+        password=app.container.config.api_secret(),
+    )
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test", follow_redirects=True
+    ) as client:
+        response1 = await client.post(
+            "/deployment/bulk",
+            json={"items": [{"version": "1.0.0"}]},
+            auth=auth,
+        )
+        assert response1.status_code == 400
+
+        items = [
+            {"git_url": "git://github.com/bulk/1.git", "version": "1.0.0"},
+            # already deployed
+            {"git_url": "git://github.com/bulk/1.git", "version": "0.9.0"},
+            # failed before, can be deployed again
+            {"project_code": "bulk2", "version": "0.9.0", "mode": "prod"},
+            {"project_code": "bulk3", "version": "1.0.0"},
+            # the same version twice in the request
+            {"project_code": "bulk3", "version": "1.0.0"},
+            {"git_url": "git://github.com/bulk/none.git", "version": "1.0.0"},
+            {
+                "project_code": "bulk2",
+                "version": "1.0.0",
+                "scheduled_to_run_at": "2099-01-01T00:00:00Z",
+            },
+        ]
+        response2 = await client.post(
+            "/deployment/bulk", json={"items": items}, auth=auth
+        )
+        assert response2.status_code == 200
+        results = response2.json()
+        assert [x["error"] for x in results] == [
+            None,
+            "deployment_already_exists",
+            None,
+            None,
+            "deployment_already_exists",
+            "project_not_found",
+            None,
+        ]
+        created = [x["deployment"] for x in results if x["deployment"] is not None]
+        assert [(d["project_rid"], d["version"]) for d in created] == [
+            ("bulk1", "1.0.0"),
+            ("bulk2", "0.9.0"),
+            ("bulk3", "1.0.0"),
+            ("bulk2", "1.0.0"),
+        ]
+        assert created[1]["mode"] == "prod"
+        assert [d["status"] for d in created] == [
+            "READY",
+            "READY",
+            "READY",
+            "SCHEDULED",
+        ]
+
+        # the status rows are in place, a second request conflicts entirely
+        response3 = await client.post(
+            "/deployment/bulk", json={"items": items[:1]}, auth=auth
+        )
+        assert response3.json() == [
+            {"deployment": None, "error": "deployment_already_exists"}
+        ]
+
+        # project tokens only create deployments of their own project
+        response4 = await client.post(
+            "/project/bulk1/token", json={"name": "ci"}, auth=auth
+        )
+        bearer = {"Authorization": f"Bearer {response4.json()['token']}"}
+        response5 = await client.post(
+            "/deployment/bulk",
+            json={
+                "items": [
+                    {"project_code": "bulk1", "version": "1.1.0"},
+                    {"project_code": "bulk2", "version": "1.1.0"},
+                ]
+            },
+            headers=bearer,
+        )
+        assert response5.status_code == 200
+        assert [x["error"] for x in response5.json()] == [None, "forbidden"]
@@ -64,3 +64,77 @@ async def test_project(get_app):
             f"/project/{response2_dict['rid']}", auth=auth
         )
         assert response_remove.status_code == 204
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_project_list_pages(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+    async with session_factory() as session:
+        await session.execute(
+            text(
+                """
+insert into project (rid, name, code, secrets_provider, created_at)
+select 'page' || i, 'page' || i, 'page' || i, 'LOCAL', '2999-01-01'::timestamptz - i * interval '1 minute'
+from generate_series(1, 5) i;
+"""
+            )
+        )
+        await session.execute(
+            text(
+                "insert into daemon (rid, type, project_rid, name) values ('page1', 'SYSTEMD', 'page1', 'api')"
+            )
+        )
+        await session.commit()
+
+    auth = BasicAuth(
+        username=app.container.config.api_user(),
+        password=app.container.config.api_secret(),
+    )
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app),
+            base_url="http://test",
+            follow_redirects=True,
+        ) as client:
+            rids = []
+            cursor = None
+            for _ in range(3):
+                params = (
+                    {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+                )
+                response = await client.get("/project/list", params=params, auth=auth)
+                assert response.status_code == 200
+                page = response.json()
+                assert len(page) <= 2
+                assert all("daemons" not in x for x in page)
+                rids.extend(x["rid"] for x in page)
+                cursor = response.headers.get("X-Next-Cursor")
+            # newest first, no page repeats a project
+            assert rids[:5] == ["page1", "page2", "page3", "page4", "page5"]
+            assert len(rids) == len(set(rids))
+
+            response = await client.get(
+                "/project/list", params={"limit": 1, "expand": "daemons"}, auth=auth
+            )
+            page = response.json()
+            assert page[0]["rid"] == "page1"
+            assert [d["name"] for d in page[0]["daemons"]] == ["api"]
+            assert "deployments" not in page[0]
+
+            response = await client.get(
+                "/project/list", params={"expand": "secrets"}, auth=auth
+            )
+            assert response.status_code == 400
+            response = await client.get(
+                "/project/list", params={"cursor": "nope"}, auth=auth
+            )
+            assert response.status_code == 400
+            response = await client.get(
+                "/project/list", params={"limit": 1000}, auth=auth
+            )
+            assert response.status_code == 400
+    finally:
+        async with session_factory() as session:
+            await session.execute(text("delete from project where rid like 'page%'"))
+            await session.commit()
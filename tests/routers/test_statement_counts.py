@@ -0,0 +1,148 @@
+import pytest
+import pytest_asyncio
+from contextlib import contextmanager
+from httpx import ASGITransport, AsyncClient, BasicAuth
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+
+@pytest_asyncio.fixture(autouse=True, scope="module", loop_scope="session")
+async def setup_statement_counts(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+
+    async with session_factory() as session:
+        await session.execute(
+            text(
+                """
+insert into project (rid, name, code, git_url, secrets_provider)
+select 'count' || i, 'count' || i, 'count' || i, 'git://github.com/count/' || i || '.git', 'LOCAL'
+from generate_series(1, 5) i;
+"""
+            )
+        )
+        await session.execute(
+            text(
+                """
+insert into daemon (rid, type, project_rid, name)
+select 'count' || i, 'SYSTEMD', 'count' || i, 'api'
+from generate_series(1, 5) i;
+"""
+            )
+        )
+        await session.execute(
+            text(
+                """
+insert into deployment (rid, project_rid, version, mode)
+select 'count' || i || '-' || v, 'count' || i, '0.' || v || '.0', 'prod'
+from generate_series(1, 5) i, generate_series(1, 10) v;
+"""
+            )
+        )
+        await session.execute(
+            text(
+                """
+insert into deployment_status_update (rid, deployment_rid, status)
+select 'count' || i || '-' || v, 'count' || i || '-' || v, 'SUCCESS'
+from generate_series(1, 5) i, generate_series(1, 10) v;
+"""
+            )
+        )
+        await session.commit()
+
+    yield
+
+    async with session_factory() as session:
+        await session.execute(text("delete from project where rid like 'count%'"))
+        await session.commit()
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+
+# no endpoint may grow with the number of rows it touches
+expected_counts = (
+    ("GET", "/project/count1", 1),
+    ("GET", "/project/list", 1),
+    ("GET", "/project/list?expand=daemons", 2),
+    ("GET", "/project/list?expand=daemons,deployments", 3),
+    ("GET", "/deployment/list", 1),
+    ("GET", "/deployment/list?expand=project,status_updates", 3),
+    ("GET", "/deployment/count1-1/log", 2),
+)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("method,url,expected", expected_counts)
+async def test_statement_count(get_app, method, url, expected):
+    app = get_app
+    auth = BasicAuth(
+        username=app.container.config.api_user(),
+        password=app.container.config.api_secret(),
+    )
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test", follow_redirects=True
+    ) as client:
+        # warms up the pool so connection setup queries aren't counted
+        await client.get(url, auth=auth)
+        with count_statements() as statements:
+            response = await client.request(method, url, auth=auth)
+        assert response.status_code == 200
+        assert len(statements) == expected, statements
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_statement_count_deployment_create(get_app):
+    app = get_app
+    auth = BasicAuth(
+        username=app.container.config.api_user(),
+        password=app.container.config.api_secret(),
+    )
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test", follow_redirects=True
+    ) as client:
+        with count_statements() as statements:
+            response = await client.post(
+                "/deployment",
+                json={"git_url": "git://github.com/count/2.git", "version": "1.0.0"},
+                auth=auth,
+            )
+        assert response.status_code == 200
+        # project by git url, latest statuses, then the deployment and its status
+        assert len(statements) == 4, statements
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_statement_count_deployment_create_bulk(get_app):
+    app = get_app
+    auth = BasicAuth(
+        username=app.container.config.api_user(),
+        password=app.container.config.api_secret(),
+    )
+    items = [
+        {"project_code": f"count{i}", "version": f"2.{v}.0"}
+        for i in range(1, 6)
+        for v in range(8)
+    ]
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test", follow_redirects=True
+    ) as client:
+        with count_statements() as statements:
+            response = await client.post(
+                "/deployment/bulk", json={"items": items}, auth=auth
+            )
+        assert response.status_code == 200
+        assert all(x["error"] is None for x in response.json())
+        # projects, latest statuses, then the deployments and their statuses
+        assert len(statements) == 4, statements
@@ -0,0 +1,96 @@
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient, BasicAuth
+from sqlalchemy import text
+
+
+@pytest_asyncio.fixture(autouse=True, scope="module", loop_scope="session")
+async def setup_token(get_app):
+    app = get_app
+    session_factory = await app.container.session_factory()
+
+    async with session_factory() as session:
+        await session.execute(
+            text(
+                """
+insert into project (rid, name, code, git_url, secrets_provider) values
+('token1', 'token1', 'token1', 'git://github.com/token/1.git', 'LOCAL'),
+('token2', 'token2', 'token2', 'git://github.com/token/2.git', 'LOCAL');
+"""
+            )
+        )
+        await session.commit()
+
+    yield
+
+    async with session_factory() as session:
+        await session.execute(text("delete from project where rid like 'token%'"))
+        await session.commit()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_project_token(get_app):
+    app = get_app
+    auth = BasicAuth(
+        username=app.container.config.api_user(),
+        password=app.container.config.api_secret(),
+    )
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test", follow_redirects=True
+    ) as client:
+        response1 = await client.post(
+            "/project/token1/token", json={"name": "ci"}, auth=auth
+        )
+        assert response1.status_code == 200
+        created = response1.json()
+        assert created["token"].startswith(f"{created['rid']}.")
+        assert "secret_hash" not in created
+        token = created["token"]
+        bearer = {"Authorization": f"Bearer {token}"}
+
+        response2 = await client.get("/project/token1/token", auth=auth)
+        assert [x["rid"] for x in response2.json()] == [created["rid"]]
+        assert "token" not in response2.json()[0]
+
+        response3 = await client.post(
+            "/deployment",
+            json={"git_url": "git://github.com/token/1.git", "version": "0.1.0"},
+            headers=bearer,
+        )
+        assert response3.status_code == 200
+        # verified once, served from the cache afterwards
+        token_cache = app.container.token_cache()
+        assert token_cache.get(token) == "token1"
+
+        response4 = await client.post(
+            "/deployment",
+            json={"git_url": "git://github.com/token/2.git", "version": "0.1.0"},
+            headers=bearer,
+        )
+        assert response4.status_code == 403
+
+        response5 = await client.get("/deployment/list", headers=bearer)
+        assert response5.status_code == 200
+        assert {x["project_rid"] for x in response5.json()} == {"token1"}
+        response6 = await client.get(
+            "/deployment/list", params={"project_rid": "token2"}, headers=bearer
+        )
+        assert response6.status_code == 403
+
+        # projects are managed with the api credentials only
+        response7 = await client.get("/project/list", headers=bearer)
+        assert response7.status_code == 403
+
+        response8 = await client.get(
+            "/deployment/list", headers={"Authorization": f"Bearer {token}x"}
+        )
+        assert response8.status_code == 401
+
+        response9 = await client.delete(
+            f"/project/token1/token/{created['rid']}", auth=auth
+        )
+        assert response9.status_code == 204
+        assert token_cache.get(token) is None
+        response10 = await client.get("/deployment/list", headers=bearer)
+        assert response10.status_code == 401
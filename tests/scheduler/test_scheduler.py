@@ -0,0 +1,85 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from deployment_server.packages.scheduler.base import Scheduler
+
+
+def test_scheduler_fires_in_order():
+    now = datetime.now(timezone.utc)
+    fired = []
+    done = threading.Event()
+
+    def fire(deployment_rid: str, due_at: datetime):
+        fired.append(deployment_rid)
+        if len(fired) == 3:
+            done.set()
+
+    scheduler = Scheduler(
+        logger=logging.getLogger(),
+        load=lambda: [("two", now + timedelta(seconds=0.3))],
+        fire=fire,
+    )
+    scheduler.start()
+    scheduler.add("three", now + timedelta(seconds=0.5))
+    # added later but due earlier, wakes the sleeping scheduler up
+    scheduler.add("one", now + timedelta(seconds=0.1))
+    assert done.wait(3)
+    scheduler.stop()
+    assert fired == ["one", "two", "three"]
+
+
+def test_scheduler_ignores_duplicates():
+    when = datetime.now(timezone.utc) + timedelta(hours=1)
+    fired = []
+    scheduler = Scheduler(
+        logger=logging.getLogger(),
+        load=lambda: [("one", when)],
+        fire=lambda *args: fired.append(args),
+    )
+    scheduler.start()
+    scheduler.add("one", when)
+    assert len(scheduler.heap) == 1
+    scheduler.stop()
+    assert fired == []
+
+
+def test_scheduler_fires_with_the_due_instant():
+    when = datetime.now(timezone.utc) + timedelta(seconds=0.1)
+    fired = []
+    done = threading.Event()
+
+    def fire(deployment_rid: str, due_at: datetime):
+        fired.append((deployment_rid, due_at))
+        done.set()
+
+    scheduler = Scheduler(logger=logging.getLogger(), load=lambda: [], fire=fire)
+    scheduler.start()
+    scheduler.add("one", when)
+    assert done.wait(3)
+    scheduler.stop()
+    assert fired == [("one", when)]
+
+
+def test_scheduler_retries_failed_fires():
+    when = datetime.now(timezone.utc)
+    attempts = []
+    done = threading.Event()
+
+    def fire(deployment_rid: str, due_at: datetime):
+        attempts.append((deployment_rid, due_at))
+        if len(attempts) == 1:
+            raise ConnectionError("broker is down")
+        done.set()
+
+    scheduler = Scheduler(
+        logger=logging.getLogger(),
+        load=lambda: [("one", when)],
+        fire=fire,
+        retry_interval=timedelta(seconds=0.1),
+    )
+    scheduler.start()
+    assert done.wait(3)
+    scheduler.stop()
+    assert [rid for rid, _ in attempts] == ["one", "one"]
+    assert attempts[0][1] == when
+    assert attempts[1][1] >= when + timedelta(seconds=0.1)
@@ -0,0 +1,23 @@
+import logging
+from unittest.mock import MagicMock
+import pytest
+from deployment_server.services.dispatch import DispatchService
+
+
+@pytest.mark.asyncio
+async def test_dispatch_deployment():
+    task_queue = MagicMock()
+    service = DispatchService(task_queue=task_queue, logger=logging.getLogger())
+    assert await service.dispatch_deployment("rid1") is True
+    task_queue.send_task.assert_called_once_with(
+        "deployment_server.tasks.run_deployment.run_deployment",
+        kwargs={"deployment_rid": "rid1"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_dispatch_deployment_broker_down():
+    task_queue = MagicMock()
+    task_queue.send_task.side_effect = ConnectionError("broker is down")
+    service = DispatchService(task_queue=task_queue, logger=logging.getLogger())
+    assert await service.dispatch_deployment("rid1") is False
@@ -1,9 +1,13 @@
+import asyncio
+import threading
+from datetime import timedelta
 from time import sleep
 
 import pytest
 import pytest_asyncio
 from sqlalchemy import text
 
+from deployment_server.models import DeploymentStatus
 from deployment_server.repositories.deployment import LatestStatusType
 
 
@@ -14,7 +18,7 @@ async def setup_run_deployment(get_app):
     async with session_factory() as session:
         await session.execute(
             text(
-                "insert into project (rid, name, code, secrets_provider) values ('randone', 'one', 'one', 'LOCAL'), ('randtwo', 'two', 'two', 'LOCAL'), ('randthree', 'three', 'three', 'LOCAL');"
+                "insert into project (rid, name, code, secrets_provider) values ('randone', 'one', 'one', 'LOCAL'), ('randtwo', 'two', 'two', 'LOCAL'), ('randthree', 'three', 'three', 'LOCAL'), ('randfour', 'four', 'four', 'LOCAL');"
             )
         )
         await session.execute(
@@ -39,6 +43,16 @@ async def setup_run_deployment(get_app):
                 "insert into deployment_status_update (rid, deployment_rid, status) values ('randtwo', 'randtwo', 'READY'), ('randthree', 'randthree', 'FAILED');"
             )
         )
+        await session.execute(
+            text(
+                "insert into deployment (rid, project_rid, version, mode, scheduled_to_run_at) values ('randfour', 'randfour', '1.0.0', 'LOCAL', now() - interval '1 minute'), ('randfive', 'randfour', '1.0.1', 'LOCAL', now() + interval '1 day');"
+            )
+        )
+        await session.execute(
+            text(
+                "insert into deployment_status_update (rid, deployment_rid, status) values ('randfour', 'randfour', 'SCHEDULED'), ('randfive', 'randfive', 'SCHEDULED');"
+            )
+        )
         await session.commit()
 
     yield
@@ -46,18 +60,142 @@ async def setup_run_deployment(get_app):
     async with session_factory() as session:
         await session.execute(
             text(
-                "delete from project where rid = 'randone' or rid = 'randtwo' or rid = 'randthree';"
+                "delete from project where rid = 'randone' or rid = 'randtwo' or rid = 'randthree' or rid = 'randfour';"
             )
         )
         await session.commit()
 
 
-@pytest.mark.asyncio(loop_scope="session")
-async def test_run_deployment():
+@pytest.fixture(scope="module")
+def worker_container():
     from deployment_server.containers.worker import WorkerContainer
 
     container = WorkerContainer()
     container.init_resources()
-    rec = container.deployment_service().pick_deployment_sync()
+    yield container
+    container.shutdown_resources()
+
+
+def test_pick_deployments(worker_container):
+    event_loop = worker_container.event_loop()
+    recs = event_loop.run(worker_container.deployment_service().pick_deployments())
+    recs = [r for r in recs if r.project_rid == "randone"]
+    assert len(recs) == 1
+    assert isinstance(recs[0], LatestStatusType)
+    assert recs[0].version == "0.1.3"
+
+    # the older ready deployment of the same project and mode is skipped
+    async def get_status():
+        async with worker_container.session_factory()() as session:
+            result = await session.execute(
+                text("select status from deployment where rid = 'randone'")
+            )
+            return result.scalar_one()
+
+    assert event_loop.run(get_status()) == "SKIPPED"
+
+
+def test_claim_deployment(worker_container):
+    event_loop = worker_container.event_loop()
+    deployment_service = worker_container.deployment_service()
+    rec = event_loop.run(deployment_service.claim_deployment("randtwo"))
     assert isinstance(rec, LatestStatusType)
     assert rec.version == "0.1.3"
+    assert rec.status == DeploymentStatus.RUNNING
+
+    # the current status of the deployment follows its status updates
+    async def get_status():
+        async with worker_container.session_factory()() as session:
+            result = await session.execute(
+                text("select status from deployment where rid = 'randtwo'")
+            )
+            return result.scalar_one()
+
+    assert event_loop.run(get_status()) == "RUNNING"
+    # a second worker can't claim the same deployment
+    assert event_loop.run(deployment_service.claim_deployment("randtwo")) is None
+    # failed deployments can't be claimed
+    assert event_loop.run(deployment_service.claim_deployment("randthree")) is None
+
+
+def test_claim_superseded_deployment(worker_container):
+    event_loop = worker_container.event_loop()
+    deployment_service = worker_container.deployment_service()
+
+    async def setup():
+        async with worker_container.session_factory()() as session:
+            await session.execute(
+                text(
+                    "insert into deployment (rid, project_rid, version, mode, created_at) values ('randsix', 'randthree', '2.0.0', 'LOCAL', now() - interval '1 minute'), ('randseven', 'randthree', '2.0.1', 'LOCAL', now());"
+                )
+            )
+            await session.execute(
+                text(
+                    "insert into deployment_status_update (rid, deployment_rid, status) values ('randsix', 'randsix', 'READY'), ('randseven', 'randseven', 'READY');"
+                )
+            )
+            await session.commit()
+
+    async def get_status(rid: str):
+        async with worker_container.session_factory()() as session:
+            result = await session.execute(
+                text("select status from deployment where rid = :rid"), {"rid": rid}
+            )
+            return result.scalar_one()
+
+    event_loop.run(setup())
+    # the older one must not deploy after the newer one, it's skipped
+    assert event_loop.run(deployment_service.claim_deployment("randsix")) is None
+    assert event_loop.run(get_status("randsix")) == "SKIPPED"
+    rec = event_loop.run(deployment_service.claim_deployment("randseven"))
+    assert rec.version == "2.0.1"
+    assert event_loop.run(get_status("randseven")) == "RUNNING"
+
+
+def test_promote_scheduled_deployment(worker_container):
+    event_loop = worker_container.event_loop()
+    deployment_service = worker_container.deployment_service()
+    scheduled = dict(event_loop.run(deployment_service.get_scheduled()))
+    assert "randfour" in scheduled and "randfive" in scheduled
+    # only the due one is promoted
+    assert event_loop.run(deployment_service.promote_scheduled("randfive")) == []
+    assert event_loop.run(deployment_service.promote_scheduled("randfour")) == [
+        "randfour"
+    ]
+    assert event_loop.run(deployment_service.promote_scheduled("randfour")) == []
+    assert "randfour" not in dict(event_loop.run(deployment_service.get_scheduled()))
+
+    # the instant the scheduler had it due at counts, not the database clock
+    randfive_at = scheduled["randfive"]
+    assert (
+        event_loop.run(
+            deployment_service.promote_scheduled(
+                "randfive", randfive_at - timedelta(seconds=1)
+            )
+        )
+        == []
+    )
+    assert event_loop.run(
+        deployment_service.promote_scheduled("randfive", randfive_at)
+    ) == ["randfive"]
+
+
+def test_log_written_while_deploying(worker_container):
+    event_loop = worker_container.event_loop()
+    deployment_service = worker_container.deployment_service()
+    released = threading.Event()
+
+    def deploy():
+        # blocks like the deployer, until the loop has written the log
+        return released.wait(timeout=5)
+
+    async def run():
+        deploying = asyncio.create_task(asyncio.to_thread(deploy))
+        await deployment_service.append_log("randtwo", 0, "installing\n")
+        content, _ = await deployment_service.get_log("randtwo", 0)
+        assert not deploying.done()
+        released.set()
+        assert await deploying
+        return content
+
+    assert event_loop.run(run()) == "installing\n"
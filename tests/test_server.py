@@ -0,0 +1,25 @@
+import os
+import socket
+from deployment_server.server import get_server_socket
+
+
+def test_get_server_socket_from_inherited_fd():
+    listener = socket.create_server(("127.0.0.1", 0))
+    try:
+        sock = get_server_socket(os.dup(listener.fileno()), "0.0.0.0", 0)
+        assert sock.family == socket.AF_INET
+        assert sock.getsockname() == listener.getsockname()
+        sock.close()
+    finally:
+        listener.close()
+
+
+def test_get_server_socket_reuses_port():
+    first = get_server_socket(None, "127.0.0.1", 0)
+    port = first.getsockname()[1]
+    second = get_server_socket(None, "127.0.0.1", port)
+    try:
+        assert second.getsockname()[1] == port
+    finally:
+        first.close()
+        second.close()
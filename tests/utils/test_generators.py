@@ -41,3 +41,36 @@ def test_nginx_static_host():
     assert "root /var/www/abc.com;" in content
     assert "location ~* ^/(media|assets)/(.*)" in content
     assert "location ~* ^/(media|assets)/ {" in content
+
+
+def test_systemd_service_resource_controls():
+    args = dict(
+        service_id="prod-p1-jobs",
+        application_dir="/opt/prod-p1",
+        application_logs_dir="/var/log/prod-p1",
+        application_data_dir="/var/lib/prod-p1",
+        application_config_dir="/etc/prod-p1",
+        mode="prod",
+        exec_start="python -m app.jobs",
+        os_user="p1",
+        os_group="deployer",
+    )
+    content = generators.systemd_service(**args)
+    assert "MemoryMax=512M\nCPUQuota=50%\nTasksMax=50\n" in content
+
+    content = generators.systemd_service(
+        **args, resource_controls={"CPUQuota": "200%", "CPUWeight": "500"}
+    )
+    assert "MemoryMax=512M\nCPUQuota=200%\nTasksMax=50\nCPUWeight=500\n" in content
+
+    # None drops a default, infinity lifts a limit
+    content = generators.systemd_service(
+        **args,
+        resource_controls={
+            "CPUQuota": None,
+            "MemoryMax": "infinity",
+            "TasksMax": "infinity",
+        },
+    )
+    assert "MemoryMax=infinity\nTasksMax=infinity\n" in content
+    assert "CPUQuota" not in content
@@ -0,0 +1,54 @@
+import json
+from datetime import datetime, timezone
+from deployment_server.models import (
+    Project,
+    Deployment,
+    DeploymentStatus,
+    SecretsProvider,
+)
+from deployment_server.packages.utils import converters, serializers
+
+
+def make_project() -> Project:
+    project = Project(
+        rid="p1",
+        name="p1",
+        code="p1",
+        secrets_provider=SecretsProvider.LOCAL,
+        created_at=datetime(2026, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+    )
+    project.deployments = [
+        Deployment(
+            rid="d1",
+            project_rid="p1",
+            version="0.1.0",
+            status=DeploymentStatus.READY,
+            created_at=datetime(2026, 1, 2, tzinfo=timezone.utc),
+        )
+    ]
+    return project
+
+
+def test_serializer_matches_model_output():
+    project = make_project()
+    serializer = serializers.Serializer(
+        Project, relationships={"deployments": serializers.Serializer(Deployment)}
+    )
+    ProjectModel = converters.sqlalchemy_to_pydantic(Project, "ProjectModel")
+
+    body = serializers.FastJSONResponse(serializer.dump(project)).body
+    assert json.loads(body) == json.loads(
+        ProjectModel.model_validate(project).model_dump_json()
+    )
+
+    expanded = json.loads(
+        serializers.FastJSONResponse(serializer.dump(project, ("deployments",))).body
+    )
+    assert expanded["deployments"][0]["status"] == "READY"
+    assert expanded["deployments"][0]["created_at"] == "2026-01-02T00:00:00Z"
+
+
+def test_serializer_excludes_columns():
+    serializer = serializers.Serializer(Project, exclude=("pip_index_auth",))
+    assert "pip_index_auth" not in serializer.columns
+    assert "rid" in serializer.columns
@@ -0,0 +1,37 @@
+import time
+from deployment_server.packages.utils import tokens
+
+
+def test_hash_and_verify_secret():
+    token, secret = tokens.generate_token("abc")
+    assert token == f"abc.{secret}"
+    assert tokens.split_token(token) == ("abc", secret)
+    assert tokens.split_token("abc") is None
+
+    hashed = tokens.hash_secret(secret)
+    assert secret not in hashed
+    # salted, the same secret never hashes the same
+    assert hashed != tokens.hash_secret(secret)
+    assert tokens.verify_secret(secret, hashed) is True
+    assert tokens.verify_secret(secret + "x", hashed) is False
+    assert tokens.verify_secret(secret, "garbage") is False
+
+
+def test_token_cache():
+    cache = tokens.TokenCache(max_size=2, ttl=60)
+    cache.put("t1", "p1", "r1")
+    cache.put("t2", "p2", "r2")
+    assert cache.get("t1") == "p1"
+    # t2 is the least recently used now
+    cache.put("t3", "p3", "r3")
+    assert cache.get("t2") is None
+    assert cache.get("t1") == "p1"
+    assert cache.get("t3") == "p3"
+
+    cache.evict("r1")
+    assert cache.get("t1") is None
+
+    cache.ttl = 0.01
+    time.sleep(0.02)
+    assert cache.get("t3") is None
+    assert len(cache.entries) == 0